@@ -0,0 +1,251 @@
+'''
+Benchmarks of adding layers to a GoogleMapPlotter and drawing them.
+
+Each case is measured in a fresh process, for every size and output mode:
+the time taken to add the layers (ingest) and to draw them, the best of
+``--repeat`` runs; the peak memory allocated meanwhile, traced in one more
+run; and the size of the html file. Results are written as JSON, and
+compared with those of an earlier run with ``--baseline``::
+
+    python -m benchmarks.render --sizes 1000 100000 1000000 --output new.json
+    python -m benchmarks.render --baseline old.json --output new.json
+'''
+from __future__ import absolute_import
+
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import gmplot
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+SIZES = (1000, 10000, 100000)
+MODES = ('default', 'compact')
+
+# Measures compared by --baseline, higher being worse.
+MEASURES = ('ingest_seconds', 'draw_seconds', 'peak_bytes', 'output_bytes')
+
+# Differences of times shorter than this are noise rather than regressions.
+NOISE_SECONDS = 0.02
+
+
+def points(size, seed=0):
+    '''
+    :return: (lats, lngs, weights, timestamps) arrays of ``size`` points
+        around Stanford, spread over a year
+    '''
+    rng = np.random.RandomState(seed)
+    lats = 37.428 + rng.normal(0, 0.05, size)
+    lngs = -122.145 + rng.normal(0, 0.05, size)
+    weights = rng.uniform(0, 10, size)
+    timestamps = np.datetime64('2020-01-01', 's') + rng.randint(0, 366 * 86400, size).astype('timedelta64[s]')
+    return lats, lngs, weights, timestamps
+
+
+def add_markers(gmap, lats, lngs, weights, timestamps):
+    for lat, lng in zip(lats.tolist(), lngs.tolist()):
+        gmap.marker(lat, lng, 'cornflowerblue')
+
+
+def add_scatter_markers(gmap, lats, lngs, weights, timestamps):
+    gmap.scatter(lats, lngs, 'r', marker=True)
+
+
+def add_scatter_symbols(gmap, lats, lngs, weights, timestamps):
+    gmap.scatter(lats, lngs, weights, size=20, marker=False)
+
+
+def add_plot(gmap, lats, lngs, weights, timestamps):
+    gmap.plot(lats, lngs, 'plum', edge_width=2)
+
+
+def add_polygon(gmap, lats, lngs, weights, timestamps):
+    gmap.polygon(lats, lngs, 'plum')
+
+
+def add_heatmap(gmap, lats, lngs, weights, timestamps):
+    gmap.heatmap(lats, lngs, weights)
+
+
+def add_timeline(gmap, lats, lngs, weights, timestamps):
+    gmap.heatmap_timeseries(lats, lngs, weights, timestamps, freq='W')
+
+
+def add_circles(gmap, lats, lngs, weights, timestamps):
+    gmap.circle(lats, lngs, weights * 10, 'b')
+
+
+def add_grid(gmap, lats, lngs, weights, timestamps):
+    # As many lines as points, half of them along each axis.
+    step = 1.0 / max(len(lats) // 2, 1)
+    gmap.grid(37.0, 38.0, step, -122.5, -121.5, step)
+
+
+# Cases by name: function adding the layers of a given number of points,
+# and the largest size worth measuring it at.
+CASES = {
+    'marker': (add_markers, 10 ** 5),
+    'scatter_markers': (add_scatter_markers, 10 ** 7),
+    'scatter_symbols': (add_scatter_symbols, 10 ** 7),
+    'plot': (add_plot, 10 ** 7),
+    'polygon': (add_polygon, 10 ** 7),
+    'heatmap': (add_heatmap, 10 ** 7),
+    'timeline': (add_timeline, 10 ** 7),
+    'circles': (add_circles, 10 ** 7),
+    'grid': (add_grid, 10 ** 6),
+}
+
+
+def run_case(case, size, mode, directory):
+    '''
+    :return: (ingest_seconds, draw_seconds, output_bytes) of one run
+    '''
+    add = CASES[case][0]
+    data = points(size)
+    path = os.path.join(directory, '%s-%d-%s.html' % (case, size, mode))
+    start = time.perf_counter()
+    gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 12)
+    add(gmap, *data)
+    ingest = time.perf_counter() - start
+    # draw() reports the file it writes, which would garble the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        gmap.draw(path, compact=mode == 'compact')
+        draw = time.perf_counter() - start
+    return ingest, draw, os.path.getsize(path)
+
+
+def measure(case, size, mode, repeat=3):
+    '''
+    Measure one case, in this process.
+
+    :return: dict of the measures of the case
+    '''
+    directory = tempfile.mkdtemp()
+    try:
+        runs = [run_case(case, size, mode, directory) for _ in range(repeat)]
+        tracemalloc.start()
+        try:
+            run_case(case, size, mode, directory)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(directory)
+    result = {
+        'case': case,
+        'size': size,
+        'mode': mode,
+        'ingest_seconds': min(run[0] for run in runs),
+        'draw_seconds': min(run[1] for run in runs),
+        'peak_bytes': peak,
+        'output_bytes': runs[-1][2],
+    }
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS.
+        scale = 1 if sys.platform == 'darwin' else 1024
+        result['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return result
+
+
+def measure_isolated(case, size, mode, repeat=3):
+    '''
+    Measure one case in a fresh process, so that cases do not share caches
+    or memory peaks.
+    '''
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measure, case, size, mode, repeat).result()
+
+
+def compare(results, baseline, tolerance=0.25):
+    '''
+    :param results: list of measures, as returned by measure()
+    :param baseline: list of measures of an earlier run
+    :param tolerance: relative increase of a measure tolerated
+    :return: list of (case, size, mode, measure, before, after) of the
+        measures of ``results`` higher than in ``baseline`` beyond
+        ``tolerance``, times also by more than NOISE_SECONDS
+    '''
+    before = dict(((result['case'], result['size'], result['mode']), result) for result in baseline)
+    regressions = []
+    for result in results:
+        key = (result['case'], result['size'], result['mode'])
+        if key not in before:
+            continue
+        for name in MEASURES:
+            if name.endswith('_seconds') and result[name] - before[key][name] < NOISE_SECONDS:
+                continue
+            if result[name] > before[key][name] * (1 + tolerance):
+                regressions.append(key + (name, before[key][name], result[name]))
+    return regressions
+
+
+def environment():
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', nargs='+', default=sorted(CASES), choices=sorted(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmarks.json', help='JSON file of the results')
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative increase of a measure reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for case in args.cases:
+        for size in args.sizes:
+            if size > CASES[case][1]:
+                print('%-16s %9d  skipped, above %d' % (case, size, CASES[case][1]))
+                continue
+            for mode in args.modes:
+                result = measure_isolated(case, size, mode, args.repeat)
+                results.append(result)
+                print('%-16s %9d %-8s ingest %8.3fs  draw %8.3fs  peak %7.1f MB  output %8.1f MB' % (
+                    case, size, mode, result['ingest_seconds'], result['draw_seconds'],
+                    result['peak_bytes'] / 1e6, result['output_bytes'] / 1e6))
+                sys.stdout.flush()
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for case, size, mode, name, before, after in regressions:
+            print('Regression: %s %d %s %s %g -> %g' % (case, size, mode, name, before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,2 @@
 from .gmplot import GoogleMapPlotter
+from .batch import render_many
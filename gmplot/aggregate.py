@@ -0,0 +1,126 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+from gmplot.layers import as_column
+from gmplot.projection import TILE_SIZE, world_coordinates
+
+
+CELLS_PER_RADIUS = 4
+
+
+def _group(column, row):
+    '''
+    Group points by cell.
+
+    When the cells spanned by the points are not many more than the points,
+    cells are numbered densely and counted with bincount, without sorting.
+
+    :return: sorted array of the keys of the occupied cells, and the index in
+        it of the cell of each point
+    '''
+    left, top = column.min(), row.min()
+    width, height = column.max() - left + 1, row.max() - top + 1
+    if width * height > max(4 * len(column), 1 << 20):
+        keys, inverse = np.unique((column << 32) | row, return_inverse=True)
+        return keys, inverse.reshape(-1)
+    dense = (column - left) * height + (row - top)
+    occupied = np.flatnonzero(np.bincount(dense, minlength=width * height))
+    index = np.zeros(width * height, dtype=np.int64)
+    index[occupied] = np.arange(len(occupied))
+    keys = ((occupied // height + left) << 32) | (occupied % height + top)
+    return keys, index[dense]
+
+
+class GridAggregator(object):
+    '''
+    Sum weighted points into the cells of a grid.
+
+    Points can be added in any number of batches, as when reading a file
+    chunk by chunk: each batch is binned and merged into the per-cell totals,
+    so memory grows with the number of occupied cells rather than the number
+    of points. An aggregated cell sits at the mean position of its points
+    and carries the sum of their weights.
+
+    :param cell_size: size of a cell, in pixels at ``zoom`` when a zoom level
+        is given (cells are then squares on the map), otherwise in degrees
+    :param zoom: zoom level the grid is laid out for
+    '''
+
+    def __init__(self, cell_size, zoom=None):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive, got %r" % cell_size)
+        self.cell_size = cell_size
+        self.zoom = zoom
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts, self.lat_sums, self.lng_sums, self.weights = (np.empty(0) for _ in range(4))
+
+    def cells(self, lats, lngs):
+        '''
+        :return: (columns, rows) arrays of the cell of each point
+        '''
+        if self.zoom is None:
+            column = np.floor((as_column(lngs) + 180.0) / self.cell_size)
+            row = np.floor((as_column(lats) + 90.0) / self.cell_size)
+        else:
+            x, y = world_coordinates(lats, lngs)
+            cells = TILE_SIZE * 2 ** self.zoom / float(self.cell_size)
+            column = np.minimum(x * cells, cells - 1)
+            row = np.minimum(y * cells, cells - 1)
+        return column.astype(np.int64), row.astype(np.int64)
+
+    def add(self, lats, lngs, weights=1):
+        '''
+        :param weights: weight of each point, or a single weight for all of them
+        :return: self
+        '''
+        lats, lngs = as_column(lats), as_column(lngs)
+        weights = np.broadcast_to(as_column(weights), lats.shape)
+        if not len(lats):
+            return self
+        column, row = self.cells(lats, lngs)
+        keys, inverse = _group(column, row)
+        sums = [np.bincount(inverse, values, len(keys)) for values in (None, lats, lngs, weights)]
+
+        keys, inverse = np.unique(np.r_[self.keys, keys], return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.counts, self.lat_sums, self.lng_sums, self.weights = (
+            np.bincount(inverse, np.r_[total, batch]) for total, batch in
+            zip((self.counts, self.lat_sums, self.lng_sums, self.weights), sums))
+        self.keys = keys
+        return self
+
+    def result(self):
+        '''
+        :return: (lats, lngs, weights) arrays of the occupied cells
+        '''
+        return self.lat_sums / self.counts, self.lng_sums / self.counts, self.weights
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def heatmap_grid(cell_size=None, zoom=None, radius=10):
+    '''
+    :param cell_size: size of a cell, in pixels at ``zoom`` or, without a
+        zoom level, in degrees. Defaults to a quarter of ``radius``, in
+        pixels at ``zoom``: no point then moves by more than about a third
+        of the radius of a heatmap point, which does not show once blurred.
+    :param zoom: zoom level the grid is laid out for
+    :param radius: radius of a heatmap point, in pixels
+    :return: an empty GridAggregator
+    '''
+    if cell_size is None:
+        if zoom is None:
+            raise ValueError("A zoom level is needed to derive the cell size from the radius")
+        cell_size = max(radius / float(CELLS_PER_RADIUS), 1.0)
+    return GridAggregator(cell_size, zoom)
+
+
+def aggregate_points(lats, lngs, weights=1, cell_size=None, zoom=None, radius=10):
+    '''
+    Aggregate weighted points on a grid, laid out as by ``heatmap_grid``.
+
+    :return: (lats, lngs, weights) arrays of the occupied cells
+    '''
+    return heatmap_grid(cell_size, zoom, radius).add(lats, lngs, weights).result()
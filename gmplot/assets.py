@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+
+import gzip
+import hashlib
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIONS = {'gzip': '.gz', 'br': '.br'}
+
+_BLOCK_SIZE = 1 << 20
+
+
+def write_asset(path, chunks, compress=(), hashed=False):
+    '''
+    Write an output file from string chunks, streaming.
+
+    :param path: path of the file, a string or path-like object. With
+        ``hashed``, a digest of the content is inserted before the extension,
+        as in ``map.data.3f2a9c0d1b7e4a65.js``, so the file can be served
+        with a long cache lifetime.
+    :param chunks: iterable of strings, encoded as UTF-8
+    :param compress: encoding, or list of encodings ('gzip', 'br'), to also
+        write a precompressed copy of the file in, next to it (``.gz`` / ``.br``)
+    :return: list of the paths written, the uncompressed file first
+    '''
+    if isinstance(compress, str):
+        compress = (compress,)
+    for encoding in compress:
+        if encoding not in COMPRESSIONS:
+            raise ValueError("Unknown compression '%s', expected one of %s" % (encoding, sorted(COMPRESSIONS)))
+    if 'br' in compress and brotli is None:
+        raise ImportError("Brotli compression requires the 'brotli' package")
+
+    path = os.fspath(path)
+    digest = hashlib.sha256()
+    partial = path + '.part'
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                digest.update(data)
+                f.write(data)
+        if hashed:
+            root, ext = os.path.splitext(path)
+            path = '%s.%s%s' % (root, digest.hexdigest()[:16], ext)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    written = [path]
+    for encoding in compress:
+        written.append(compress_file(path, encoding))
+    return written
+
+
+def compress_file(path, encoding):
+    '''
+    Write a precompressed copy of ``path``, as ``path.gz`` or ``path.br``.
+
+    Gzip output carries no timestamp, so identical content always gives
+    identical bytes.
+
+    :return: path of the compressed copy
+    '''
+    path = os.fspath(path)
+    target = path + COMPRESSIONS[encoding]
+    with open(path, 'rb') as source:
+        if encoding == 'gzip':
+            with open(target, 'wb') as raw:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0) as f:
+                    shutil.copyfileobj(source, f, _BLOCK_SIZE)
+        else:
+            compressor = brotli.Compressor()
+            with open(target, 'wb') as f:
+                for block in iter(lambda: source.read(_BLOCK_SIZE), b''):
+                    f.write(compressor.process(block))
+                f.write(compressor.finish())
+    return target
@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+import concurrent.futures
+import contextlib
+import copy
+import io
+import os
+import time
+import traceback
+
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from gmplot.layers import LayerStore
+
+
+# Plotters holding fewer bytes of layer data than this are simply pickled.
+MIN_SHARED_SIZE = 1 << 20
+
+RenderResult = namedtuple('RenderResult', ['name', 'paths', 'seconds', 'error'])
+
+
+def share_layers(gmap):
+    '''
+    Move the layer data of a plotter to a shared memory block, which worker
+    processes map rather than receiving it pickled.
+
+    :return: (shared, block) where ``shared`` is a copy of ``gmap`` whose
+        stores are left empty, to be restored by attach_layers(), and
+        ``block`` the SharedMemory to unlink once the worker is done, or
+        (gmap, None) for plotters with little data
+    '''
+    stores = sorted((name, store) for name, store in vars(gmap).items() if isinstance(store, LayerStore))
+    size = sum(store.size * len(store.columns) for _, store in stores) * 8
+    if size < MIN_SHARED_SIZE:
+        return gmap, None
+    block = shared_memory.SharedMemory(create=True, size=size)
+    shared, layout, offset = copy.copy(gmap), [], 0
+    for name, store in stores:
+        empty = copy.copy(store)
+        empty._data = {}
+        for column in store.columns:
+            values = store.column(column)
+            np.ndarray(len(values), np.float64, block.buf, offset)[:] = values
+            layout.append((name, column, offset, len(values)))
+            offset += values.nbytes
+        setattr(shared, name, empty)
+    shared._shared_layers = (block.name, layout)
+    return shared, block
+
+
+def attach_layers(gmap):
+    '''
+    Copy the layer data of a plotter from its shared memory block, in the
+    worker process, undoing share_layers().
+    '''
+    name, layout = gmap.__dict__.pop('_shared_layers', (None, None))
+    if name is None:
+        return gmap
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        for store, column, offset, length in layout:
+            getattr(gmap, store)._data[column] = np.ndarray(length, np.float64, block.buf, offset).copy()
+    finally:
+        block.close()
+    return gmap
+
+
+def render_map(task):
+    '''
+    Draw one map, in a worker process.
+
+    :param task: (name, spec, path, draw_kwargs) tuple, ``spec`` being a
+        plotter or a callable building one
+    :return: RenderResult of the map; errors are returned, not raised
+    '''
+    name, spec, path, draw_kwargs = task
+    start = time.perf_counter()
+    try:
+        gmap = spec() if callable(spec) else attach_layers(spec)
+        # draw() reports every file it writes, which is noise for thousands of maps.
+        with contextlib.redirect_stdout(io.StringIO()):
+            written = gmap.draw(path, **draw_kwargs)
+        return RenderResult(name, written, time.perf_counter() - start, None)
+    except Exception:
+        return RenderResult(name, [], time.perf_counter() - start, traceback.format_exc())
+
+
+def render_many(specs, workers=None, out_dir='.', **draw_kwargs):
+    '''
+    Draw many maps, each to ``out_dir/<name>.html``, across a pool of worker
+    processes.
+
+    Maps are handed to the workers a few at a time, so that only those being
+    drawn are held in memory twice, and the layer data of large plotters
+    reaches the workers through shared memory rather than pickles.
+
+    :param specs: iterable of (name, spec) pairs, where ``spec`` is a
+        GoogleMapPlotter, or a picklable callable returning one which is then
+        called in the worker, sparing the transfer of its data altogether
+    :param workers: number of worker processes, by default one per CPU; with
+        1, maps are drawn in this process
+    :param out_dir: directory of the html files, made if missing
+    :param draw_kwargs: arguments of GoogleMapPlotter.draw()
+    :return: list of a RenderResult(name, paths, seconds, error) per map, in
+        the order of ``specs``, ``error`` being the traceback of the failure
+        of the map or None, and ``seconds`` the time taken to build and draw it
+    '''
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    tasks = ((name, spec, os.path.join(out_dir, '%s.html' % name), draw_kwargs) for name, spec in specs)
+    if workers == 1:
+        return [render_map(task) for task in tasks]
+
+    results, pending = [], {}
+    # Maps in flight: enough to keep every worker busy.
+    window = 2 * (workers or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, (name, spec, path, kwargs) in enumerate(tasks):
+            if not callable(spec):
+                spec, block = share_layers(spec)
+            else:
+                block = None
+            pending[executor.submit(render_map, (name, spec, path, kwargs))] = (index, name, block)
+            if len(pending) >= window:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                results.extend(_collect(pending, done))
+        results.extend(_collect(pending, list(pending)))
+    return [result for _, result in sorted(results, key=lambda item: item[0])]
+
+
+def _collect(pending, done):
+    for future in done:
+        index, name, block = pending.pop(future)
+        try:
+            result = future.result()
+        except Exception:
+            # The map could not be sent to the worker, or the worker died.
+            result = RenderResult(name, [], 0.0, traceback.format_exc())
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+        yield index, result
@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+from gmplot.layers import as_column
+from gmplot.projection import TILE_SIZE, world_coordinates
+
+
+def cluster_levels(lats, lngs, min_zoom=0, max_zoom=15, cell_size=60):
+    '''
+    Cluster points on a screen-aligned grid, for every zoom level.
+
+    Points are binned in square cells of ``cell_size`` pixels at
+    ``max_zoom``; each coarser level merges 2x2 cells of the level above it,
+    so the work shrinks with the number of clusters rather than the number of
+    points. A cluster sits at the mean position of its points.
+
+    :param lats: latitudes of the points
+    :param lngs: longitudes of the points
+    :param min_zoom: coarsest zoom level to cluster for
+    :param max_zoom: finest zoom level to cluster for; above it, points are
+        shown individually
+    :param cell_size: size of a cluster cell, in pixels
+    :return: dict mapping each zoom level to a (lats, lngs, counts) tuple of
+        arrays describing its clusters
+    '''
+    if not 0 <= min_zoom <= max_zoom <= 22:
+        raise ValueError("Expected 0 <= min_zoom <= max_zoom <= 22, got %r and %r" % (min_zoom, max_zoom))
+    lats, lngs = as_column(lats), as_column(lngs)
+    x, y = world_coordinates(lats, lngs)
+    cells = TILE_SIZE * 2 ** max_zoom / float(cell_size)
+    column = np.minimum(x * cells, cells - 1).astype(np.int64)
+    row = np.minimum(y * cells, cells - 1).astype(np.int64)
+
+    counts, lat_sums, lng_sums = np.ones(len(lats)), lats, lngs
+    levels = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        keys, inverse = np.unique((column << 32) | row, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, counts)
+        lat_sums = np.bincount(inverse, lat_sums)
+        lng_sums = np.bincount(inverse, lng_sums)
+        levels[zoom] = (lat_sums / counts, lng_sums / counts, counts)
+        column, row = keys >> 33, (keys & 0xFFFFFFFF) >> 1
+    return levels
@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+from gmplot.layers import as_column
+
+
+# Colors evenly spaced from the lowest value to the highest.
+COLORMAPS = {
+    'hot': ['#800000', '#ff0000', '#ff8000', '#ffff00', '#ffffff'],
+    'magma': ['#000004', '#3b0f70', '#8c2981', '#de4968', '#fe9f6d', '#fcfdbf'],
+    'viridis': ['#440154', '#3b528b', '#21918c', '#5ec962', '#fde725'],
+    'blues': ['#c6dbef', '#6baed6', '#2171b5', '#08306b'],
+}
+
+NORMS = {
+    'linear': lambda values: values,
+    'sqrt': np.sqrt,
+    'log': np.log10,
+}
+
+# Number of colors numbers are mapped to, by color_groups.
+LEVELS = 256
+
+
+def colormap(colors, size=256):
+    '''
+    :param colors: name of one of COLORMAPS, or sequence of colors as
+        '#rrggbb' strings or (r, g, b) tuples, from low to high values
+    :return: (size, 3) uint8 array of colors interpolated between ``colors``
+    '''
+    if isinstance(colors, str):
+        if colors not in COLORMAPS:
+            raise ValueError("Unknown colormap '%s', expected one of %s" % (colors, ', '.join(sorted(COLORMAPS))))
+        colors = COLORMAPS[colors]
+    rgb = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] if isinstance(color, str) else color[:3]
+                    for color in colors], dtype=np.float64)
+    stops = np.linspace(0, 1, len(rgb))
+    positions = np.linspace(0, 1, size)
+    return np.column_stack([np.interp(positions, stops, rgb[:, channel]) for channel in range(3)]).round().astype(np.uint8)
+
+
+def normalize(values, vmin=None, vmax=None, norm='linear'):
+    '''
+    :param values: array-like of finite numbers
+    :param vmin: value mapped to 0, by default the lowest of ``values``
+    :param vmax: value mapped to 1, by default the highest of ``values``
+    :param norm: 'linear', 'sqrt' or 'log' scaling of the values, the last
+        two needing values that are positive, or at least non-negative
+    :return: float array of the scaled values, clipped to [0, 1]
+    '''
+    if norm not in NORMS:
+        raise ValueError("Unknown norm '%s', expected one of %s" % (norm, ', '.join(sorted(NORMS))))
+    values = as_column(values)
+    if not np.isfinite(values).all():
+        raise ValueError("Expected finite values to map to colors")
+    if len(values) and ((norm == 'log' and values.min() <= 0) or (norm == 'sqrt' and values.min() < 0)):
+        raise ValueError("Expected %s values for a '%s' norm" % ('positive' if norm == 'log' else 'non-negative', norm))
+    if not len(values):
+        return values
+    scaled = NORMS[norm]
+    low = scaled(float(values.min() if vmin is None else vmin))
+    high = scaled(float(values.max() if vmax is None else vmax))
+    if not high > low:
+        return np.zeros(len(values))
+    return np.clip((scaled(values) - low) / (high - low), 0, 1)
+
+
+def hex_codes(rgb):
+    '''
+    :param rgb: (n, 3) array of 0-255 colors
+    :return: list of '#RRGGBB' strings
+    '''
+    return ['#%02X%02X%02X' % tuple(color) for color in np.asarray(rgb, dtype=np.int64).tolist()]
+
+
+def color_groups(colors, resolve, cmap='viridis', vmin=None, vmax=None, norm='linear'):
+    '''
+    Group points by color, resolving each distinct color once.
+
+    :param colors: one color per point: color names or codes, or numbers
+        mapped to the ``LEVELS`` colors of ``cmap`` after normalize()
+    :param resolve: function returning the hex code of a color name
+    :param cmap: colormap, as for colormap()
+    :return: (palette, rows) where ``palette`` is the list of the hex codes
+        of the colors of the points and ``rows`` the list of the arrays of
+        the indices of the points of each color, in order
+    '''
+    colors = np.asarray(colors)
+    if colors.dtype.kind in 'biuf':
+        levels = (normalize(colors, vmin, vmax, norm) * (LEVELS - 1)).round().astype(np.int64)
+        used, inverse = np.unique(levels, return_inverse=True)
+        palette = hex_codes(colormap(cmap, LEVELS)[used])
+    else:
+        used, inverse = np.unique(colors.astype(str).reshape(-1), return_inverse=True)
+        palette = [resolve(color) for color in used.tolist()]
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    stops = np.cumsum(np.bincount(inverse, minlength=len(palette)))
+    return palette, np.split(order, stops[:-1])
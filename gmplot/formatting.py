@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+from gmplot.layers import as_column
+
+
+CHUNK_SIZE = 65536
+
+# Values at least this large are formatted one by one: their scaled value
+# would lose the precision needed to round like '%f' does.
+_FAST_PATH_LIMIT = 1e6
+
+_ZERO, _DOT, _MINUS = ord('0'), ord('.'), ord('-')
+
+
+def _fixed_field(values, precision, trim=False):
+    '''
+    Format a column of numbers like ``'%.<precision>f' % value`` would, in
+    bulk, as a (n, width) matrix of ASCII codes padded with NUL bytes.
+
+    Values are scaled to integers and split into digits with array
+    operations. The few values whose rounding is ambiguous after scaling
+    (close to a half, non-finite or very large) are formatted with ``%`` so
+    the output is identical to the per-value formatting. With ``trim``,
+    trailing zeros of the fraction (and a bare decimal point) are dropped.
+    '''
+    scale = 10 ** precision
+    magnitude = np.abs(values)
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = magnitude * scale
+        rounded = np.rint(scaled)
+        slow = ~(magnitude < _FAST_PATH_LIMIT) | (np.abs(np.abs(scaled - rounded) - 0.5) < 1e-3)
+    rounded[slow] = 0
+    whole, fraction = np.divmod(rounded.astype(np.int64), scale)
+    # Digits are peeled off with scalar divisions, which numpy does fastest
+    # on 32-bit integers.
+    whole = whole.astype(np.int32)
+    fraction = fraction.astype(np.int32) if scale < 2 ** 31 else fraction
+
+    fallback = [('%.*f' % (precision, value)) for value in values[slow].tolist()]
+    if trim and precision:
+        fallback = [text.rstrip('0').rstrip('.') if '.' in text else text for text in fallback]
+    fallback = [text.encode('ascii') for text in fallback]
+    digits = len(str(int(whole.max()))) if len(whole) else 1
+    width = 1 + digits + (1 + precision if precision else 0)
+    width = max([width] + [len(text) for text in fallback])
+
+    # Built column by column in a transposed buffer, so every write is
+    # contiguous; the caller's hstack does the single transposing copy.
+    field = np.zeros((width, len(values)), dtype=np.uint8)
+    field[0] = np.where(np.signbit(values), _MINUS, 0)
+    for column in range(digits, 0, -1):
+        exhausted = whole == 0
+        whole, digit = np.divmod(whole, 10)
+        field[column] = digit
+        field[column] += _ZERO
+        if column < digits:
+            field[column, exhausted] = 0
+    if precision:
+        field[1 + digits] = _DOT
+        for column in range(1 + digits + precision, 1 + digits, -1):
+            fraction, digit = np.divmod(fraction, 10)
+            field[column] = digit
+            field[column] += _ZERO
+        if trim:
+            trailing = np.ones(len(values), dtype=bool)
+            for column in range(1 + digits + precision, digits, -1):
+                trailing &= (field[column] == _ZERO) | (column == 1 + digits)
+                field[column, trailing] = 0
+
+    rows = np.flatnonzero(slow)
+    field[:, rows] = 0
+    for row, text in zip(rows.tolist(), fallback):
+        field[:len(text), row] = np.frombuffer(text, dtype=np.uint8)
+    return field.T
+
+
+def format_rows(template, *columns, **kwargs):
+    '''
+    Format one line per row of ``columns`` with a ``%f`` template, in chunks.
+
+    Each chunk is assembled as a single byte matrix (template literals plus
+    one fixed-width field per column) and joined once, so no Python object is
+    created per value. The result is identical to ``template % row`` for
+    every row.
+
+    :param template: string with one ``%f`` placeholder per column, such as
+        ``'new google.maps.LatLng(%f, %f),\\n'``
+    :param columns: equally long array-likes of numbers
+    :param precision: number of decimals, 6 (like ``%f``) by default
+    :param trim: drop trailing zeros of the decimals, as in ``1.5`` rather
+        than ``1.500000``
+    :return: generator of strings, each holding up to ``CHUNK_SIZE`` rows,
+        suitable for ``f.writelines``
+    '''
+    precision = kwargs.pop('precision', 6)
+    trim = kwargs.pop('trim', False)
+    pieces = [np.frombuffer(piece.encode('ascii'), dtype=np.uint8) for piece in template.split('%f')]
+    if len(pieces) != len(columns) + 1:
+        raise ValueError("Template expects %d columns, got %d" % (len(pieces) - 1, len(columns)))
+    columns = [as_column(column) for column in columns]
+    size = len(columns[0]) if columns else 0
+
+    for start in range(0, size, CHUNK_SIZE):
+        n = min(CHUNK_SIZE, size - start)
+        blocks = [np.broadcast_to(pieces[0], (n, len(pieces[0])))]
+        for column, piece in zip(columns, pieces[1:]):
+            blocks.append(_fixed_field(column[start:start + n], precision, trim))
+            blocks.append(np.broadcast_to(piece, (n, len(piece))))
+        rows = np.hstack(blocks)
+        yield rows[rows != 0].tobytes().decode('ascii')
+
+
+def format_array(*columns, **kwargs):
+    '''
+    Format the rows of ``columns`` as the body of a flat JSON array, such as
+    ``lat0,lng0,lat1,lng1`` for a latitude and a longitude column, with
+    trailing zeros trimmed.
+
+    :param precision: number of decimals, 6 by default
+    :return: generator of strings, suitable for ``f.writelines``
+    '''
+    template = ',%f' * len(columns)
+    first = True
+    for chunk in format_rows(template, *columns, trim=True, **kwargs):
+        yield chunk[1:] if first else chunk
+        first = False
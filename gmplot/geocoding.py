@@ -0,0 +1,253 @@
+from __future__ import absolute_import
+
+import csv
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+GOOGLE_GEOCODE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+# Cached results older than this many seconds are looked up again.
+CACHE_TTL = 30 * 24 * 3600
+
+# Entries kept by a GeocodeCache, the oldest being evicted beyond them.
+CACHE_SIZE = 100000
+
+
+class GeocodeError(Exception):
+    pass
+
+
+def normalize_address(address):
+    '''
+    :return: ``address`` in lower case with its runs of white space reduced to
+        single spaces, under which its result is looked up and cached
+    '''
+    return ' '.join(address.split()).lower()
+
+
+class GoogleBackend(object):
+    '''
+    Geocodes addresses with the Google Geocoding API, over one pooled HTTP
+    session shared by the threads of a batch.
+
+    :param apikey: key of the Geocoding API
+    :param url: URL of the API, or of a stand-in server answering alike
+    :param timeout: seconds to wait for a response
+    :param session: requests.Session to send the requests with
+    '''
+
+    # Requests per second allowed by the API.
+    rate = 50
+
+    def __init__(self, apikey='', url=GOOGLE_GEOCODE_URL, timeout=10, session=None):
+        self.apikey = apikey
+        self.url = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.name = 'google:%s' % url
+
+    def geocode(self, address):
+        '''
+        :return: (lat, lng) of the first result for ``address``, or None when
+            there is no result
+        '''
+        params = {'address': address}
+        if self.apikey:
+            params['key'] = self.apikey
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            answer = response.json()
+        except (requests.RequestException, ValueError) as error:
+            raise GeocodeError("Could not geocode %r: %s" % (address, error))
+        status = answer.get('status')
+        if status == 'ZERO_RESULTS':
+            return None
+        if status != 'OK' or not answer.get('results'):
+            raise GeocodeError("Could not geocode %r: %s %s" % (address, status, answer.get('error_message', '')))
+        location = answer['results'][0]['geometry']['location']
+        return float(location['lat']), float(location['lng'])
+
+
+class GazetteerBackend(object):
+    '''
+    Geocodes addresses offline, from a CSV file of known places, matched by
+    normalize_address().
+
+    :param path: path of the CSV file, with a header row
+    :param address: column of the addresses
+    :param lat: column of the latitudes
+    :param lng: column of the longitudes
+    '''
+
+    rate = None
+
+    def __init__(self, path, address='address', lat='lat', lng='lng'):
+        self.places = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                self.places.setdefault(normalize_address(row[address]), (float(row[lat]), float(row[lng])))
+        self.name = 'gazetteer:%s' % path
+
+    def geocode(self, address):
+        return self.places.get(normalize_address(address))
+
+
+class GeocodeCache(object):
+    '''
+    Results of geocoding, kept in an SQLite database, including addresses
+    without a result. Entries expire after ``ttl`` seconds, and the oldest
+    are evicted once there are more than ``size``.
+
+    :param path: path of the database file, by default kept in memory
+    '''
+
+    def __init__(self, path=':memory:', ttl=CACHE_TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS geocodes '
+                             '(key TEXT PRIMARY KEY, lat REAL, lng REAL, time REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS geocodes_time ON geocodes (time)')
+        # Number of entries, kept to evict as soon as there are too many.
+        self._count = 0
+        self.evict()
+
+    def get(self, key):
+        '''
+        :return: (found, location) where ``location`` is the cached (lat, lng)
+            of ``key``, or None for a cached miss
+        '''
+        with self._lock:
+            row = self._db.execute('SELECT lat, lng, time FROM geocodes WHERE key = ?', (key,)).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return False, None
+        return True, None if row[0] is None else (row[0], row[1])
+
+    def put(self, key, location):
+        lat, lng = location if location is not None else (None, None)
+        with self._lock, self._db:
+            if self._db.execute('SELECT 1 FROM geocodes WHERE key = ?', (key,)).fetchone() is None:
+                self._count += 1
+            self._db.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)', (key, lat, lng, time.time()))
+            full = self._count > self.size
+        if full:
+            self.evict()
+
+    def evict(self):
+        '''
+        Delete the expired entries, and the oldest beyond ``size``. Called
+        when the cache is opened, and once a put() makes it hold too many.
+
+        :return: number of entries deleted
+        '''
+        with self._lock, self._db:
+            deleted = self._db.execute('DELETE FROM geocodes WHERE time < ?', (time.time() - self.ttl,)).rowcount
+            deleted += self._db.execute('DELETE FROM geocodes WHERE key IN (SELECT key FROM geocodes '
+                                        'ORDER BY time DESC LIMIT -1 OFFSET ?)', (self.size,)).rowcount
+            self._count = self._db.execute('SELECT COUNT(*) FROM geocodes').fetchone()[0]
+        return deleted
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM geocodes').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class RateLimiter(object):
+    '''
+    Spaces out calls of wait() from any thread to at most ``rate`` per second.
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Geocoder(object):
+    '''
+    Geocodes addresses with a backend, through a cache, at most ``rate``
+    lookups per second.
+
+    :param backend: object with a ``geocode(address)`` method returning
+        (lat, lng) or None, and a ``name`` to tell its cached results apart,
+        such as GoogleBackend or GazetteerBackend
+    :param cache: GeocodeCache, by default one in memory
+    :param rate: lookups per second, by default the ``rate`` of the
+        backend; None for no limit
+    :param workers: threads looking addresses up in geocode_many()
+    '''
+
+    def __init__(self, backend=None, cache=None, rate=None, workers=8):
+        self.backend = backend if backend is not None else GoogleBackend()
+        self.cache = cache if cache is not None else GeocodeCache()
+        rate = rate if rate is not None else getattr(self.backend, 'rate', None)
+        self.limiter = RateLimiter(rate) if rate else None
+        self.workers = workers
+
+    def _lookup(self, address):
+        key = '%s|%s' % (self.backend.name, normalize_address(address))
+        found, location = self.cache.get(key)
+        if not found:
+            if self.limiter is not None:
+                self.limiter.wait()
+            location = self.backend.geocode(address)
+            self.cache.put(key, location)
+        return location
+
+    def geocode(self, address):
+        '''
+        :return: (lat, lng) of ``address``
+        '''
+        location = self._lookup(address)
+        if location is None:
+            raise GeocodeError("No results for %r" % address)
+        return location
+
+    def geocode_many(self, addresses):
+        '''
+        Geocode addresses concurrently, each distinct address once.
+
+        :return: list of the (lat, lng) of ``addresses``, in order, with None
+            for those without a result
+        '''
+        addresses = list(addresses)
+        distinct = list(dict.fromkeys(addresses))
+        if self.workers > 1 and len(distinct) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(distinct))) as executor:
+                locations = dict(zip(distinct, executor.map(self._lookup, distinct)))
+        else:
+            locations = dict((address, self._lookup(address)) for address in distinct)
+        return [locations[address] for address in addresses]
+
+
+_geocoders = {}
+
+
+def default_geocoder(apikey=''):
+    '''
+    :return: the Geocoder of the Google API with ``apikey``, made once and
+        caching its results in memory
+    '''
+    if apikey not in _geocoders:
+        _geocoders[apikey] = Geocoder(GoogleBackend(apikey))
+    return _geocoders[apikey]
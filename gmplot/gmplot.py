@@ -1,19 +1,65 @@
 from __future__ import absolute_import
 
+import copy
+import functools
+import io
 import json
 # import math
 import os
-import requests
+import numpy as np
 import warnings
-import datetime
 
-from collections import namedtuple
 
+from gmplot.aggregate import heatmap_grid
+from gmplot.assets import write_asset
+from gmplot.cluster import cluster_levels
+from gmplot.colors import color_groups
 from gmplot.color_dicts import mpl_color_map, html_color_codes
-from gmplot.google_maps_templates import SYMBOLS, CIRCLE
-
-
-Symbol = namedtuple('Symbol', ['symbol', 'lat', 'long', 'size'])
+from gmplot.google_maps_templates import SYMBOLS, FACTORY_RUNTIME, COMPACT_RUNTIME
+from gmplot.formatting import format_array, format_rows
+from gmplot.geocoding import default_geocoder
+from gmplot.icons import icon_data_uri
+from gmplot.instrument import Instrument
+from gmplot.layers import LayerStore, PointStore, as_column, as_coords, layer_changes
+from gmplot.polyline import encode_polyline, encode_polylines
+from gmplot.simplify import simplify as simplify_path, simplify_levels
+from gmplot.sources import CHUNK_ROWS, PointSource
+from gmplot.projection import viewport_bounds, world_coordinates
+from gmplot.raster import Raster, RasterImage
+from gmplot.tiles import write_tiles
+from gmplot.spatial import BoundedSource, StoreIndex
+from gmplot.styles import StyleTable, intern_settings
+from gmplot.timeseries import DATE_LENGTHS, parse_freq, slices
+
+
+
+# Default ``coloricon``: the icons shipped in gmplot/markers, which are
+# drawn as data URIs of icons made for any color instead.
+MARKER_ICONS = os.path.join(os.path.dirname(__file__), 'markers/%s.png')
+
+# Most lines a grid() may have.
+MAX_GRID_LINES = 10 ** 6
+
+# Size of the map assumed by draw(crop=True), in pixels.
+VIEWPORT_SIZE = (1280, 800)
+
+# Layers queried by rows, and by whole layers.
+ROW_LAYERS = ('points', 'circles', 'symbols', 'heatmap_points', 'heatmap_slices')
+PATH_LAYERS = ('paths', 'shapes')
+
+# Layers drawn by each stage of draw(), whose rows, or paths, it counts.
+STAGE_LAYERS = {
+    'write_points': ('points',),
+    'write_paths': ('paths',),
+    'write_circles': ('circles',),
+    'write_symbols': ('symbols',),
+    'write_shapes': ('shapes',),
+    'write_heatmap': ('heatmap_points',),
+    'write_timeline': ('heatmap_slices',),
+    'write_timeline_data': ('heatmap_slices',),
+    'write_compact_layers': ROW_LAYERS[:-1] + PATH_LAYERS,
+    'write_compact_data': ROW_LAYERS[:-1] + PATH_LAYERS,
+}
 
 
 class InvalidSymbolError(Exception):
@@ -27,6 +73,66 @@ def safe_iter(var):
         return [var]
 
 
+class _Points(object):
+    '''Stand-in for a GridAggregator that keeps the points as they are.'''
+
+    def add(self, lats, lngs, weights):
+        self.columns = (lats, lngs, weights)
+
+    def result(self):
+        return self.columns
+
+
+class _LineBuffer(list):
+    '''List usable as the file of the write_* methods.'''
+    write = list.append
+    writelines = list.extend
+
+
+def _as_instrument(instrument):
+    ''' returns the Instrument of the ``instrument`` argument of a draw: a
+        new one for True, and None for None or False.
+    '''
+    if instrument is True:
+        return Instrument()
+    return instrument or None
+
+
+def _instrumented(chunks, instrument):
+    ''' yields the chunks of GoogleMapPlotter.iterdraw, timing the whole
+        document with ``instrument``.
+    '''
+    instrument.start()
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        instrument.finish()
+
+
+class _LazyWriter(object):
+    '''
+    File-like sink of GoogleMapPlotter.iterdraw. ``writelines`` keeps the
+    iterable it is given unconsumed, so large layers are only formatted when
+    ``drain`` gets to them.
+    '''
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, text):
+        self._parts.append((text,))
+
+    def writelines(self, lines):
+        self._parts.append(lines)
+
+    def drain(self):
+        parts, self._parts = self._parts, []
+        for lines in parts:
+            for text in lines:
+                yield text
+
+
 class GoogleMapPlotter(object):
 
     def __init__(self, center_lat, center_lng, zoom, apikey=''):
@@ -34,61 +140,157 @@ class GoogleMapPlotter(object):
         self.zoom = int(zoom)
         self.apikey = str(apikey)
         self.grids = None
-        self.paths = []
-        self.shapes = []
-        self.points = []
-        self.circles = []
-        self.symbols = []
-        self.heatmap_points = []
+        self.paths = LayerStore()
+        self.shapes = LayerStore()
+        self.points = PointStore()
+        self.circles = LayerStore(columns=('radius',))
+        self.symbols = LayerStore(columns=('size',))
+        self.heatmap_points = LayerStore(columns=('weight',))
+        self.heatmap_sources = []
+        self.heatmap_slices = LayerStore(columns=('weight',))
         self.ground_overlays = []
+        self.tile_layers = []
         self.radpoints = []
         self.gridsetting = None
-        self.coloricon = os.path.join(os.path.dirname(__file__), 'markers/%s.png')
+        self.clustering = None
+        self.live = None
+        self._drawn = None
+        self._version = 0
+        self._indexes = {}
+        self._settings = {}
+        self._kwargs_settings = {}
+        self._colors = {}
+        self.coloricon = MARKER_ICONS
         self.color_dict = mpl_color_map
         self.html_color_codes = html_color_codes
 
+    def __getstate__(self):
+        # The color tables are shared by every plotter, so pickles of plotters
+        # (as sent to worker processes) leave them out; spatial indexes hold
+        # locks, and are rebuilt on demand.
+        state = self.__dict__.copy()
+        state['_indexes'] = {}
+        for name, table in (('color_dict', mpl_color_map), ('html_color_codes', html_color_codes)):
+            if state.get(name) is table:
+                del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(color_dict=mpl_color_map, html_color_codes=html_color_codes)
+        self.__dict__.update(state)
+
     @classmethod
-    def from_geocode(cls, location_string, zoom=13):
-        lat, lng = cls.geocode(location_string)
-        return cls(lat, lng, zoom)
+    def from_geocode(cls, location_string, zoom=13, apikey='', geocoder=None):
+        lat, lng = cls.geocode(location_string, apikey, geocoder)
+        return cls(lat, lng, zoom, apikey)
 
     @classmethod
-    def geocode(self, location_string):
-        geocode = requests.get(
-            'http://maps.googleapis.com/maps/api/geocode/json?address="%s"' % location_string)
-        geocode = json.loads(geocode.text)
-        latlng_dict = geocode['results'][0]['geometry']['location']
-        return latlng_dict['lat'], latlng_dict['lng']
+    def geocode(cls, location_string, apikey='', geocoder=None):
+        '''
+        :param geocoder: gmplot.geocoding.Geocoder to look the location up
+            with, by default one of the Google Geocoding API with ``apikey``,
+            whose results are cached
+        :return: (lat, lng) of the location
+        '''
+        return (geocoder or default_geocoder(apikey)).geocode(location_string)
 
     def grid(self, slat, elat, latin, slng, elng, lngin):
-        self.gridsetting = [slat, elat, latin, slng, elng, lngin]
+        '''
+        Draw a grid of lines ``latin`` degrees of latitude apart from
+        ``slat`` to ``elat``, and ``lngin`` degrees of longitude apart from
+        ``slng`` to ``elng``, offset by half their spacing.
+        '''
+        setting = [float(value) for value in (slat, elat, latin, slng, elng, lngin)]
+        if not np.isfinite(setting).all():
+            raise ValueError("Expected finite grid bounds and spacings, got %r" % (setting,))
+        slat, elat, latin, slng, elng, lngin = setting
+        if not (latin > 0 and lngin > 0):
+            raise ValueError("Expected positive grid spacings, got %r and %r" % (latin, lngin))
+        if elat < slat or elng < slng:
+            raise ValueError("Expected slat <= elat and slng <= elng, got %r" % (setting,))
+        lines = int((elat - slat) / latin) + int((elng - slng) / lngin)
+        if lines > MAX_GRID_LINES:
+            raise ValueError("Grid of %d lines, more than %d: expected larger spacings" % (lines, MAX_GRID_LINES))
+        self.gridsetting = setting
 
     def marker(self, lat, lng, color='#FF0000', c=None, title="no implementation"):
         if c:
             color = c
-        color = self.color_dict.get(color, color)
-        color = self.html_color_codes.get(color, color)
-        self.points.append((lat, lng, color[1:], title))
+        self._add_markers(lat, lng, self._color(color), title)
 
-    def scatter(self, lats, lngs, color=None, size=None, marker=True, c=None, s=None, symbol='o', **kwargs):
-        color = color or c
-        size = size or s or 40
+    def _color(self, color):
+        '''
+        :return: hex code of a color name such as 'r' or 'plum', or ``color``
+            itself when it is not a name. Each name is looked up once.
+        '''
+        try:
+            return self._colors[color]
+        except KeyError:
+            code = self._colors[color] = self.html_color_codes.get(self.color_dict.get(color, color), color)
+            return code
+
+    def _add_markers(self, lats, lngs, color, title="no implementation"):
+        self.points.add({'color': color, 'title': title}, merge=True, lat=lats, lng=lngs)
+
+    def cluster_markers(self, max_zoom=15, min_zoom=0, cell_size=60):
+        '''
+        Draw the markers of marker() and scatter() as clusters, precomputed
+        per zoom level on a grid of cells of ``cell_size`` pixels. Only the
+        clusters of the current zoom level inside the visible part of the map
+        are shown; above ``max_zoom``, markers are shown individually.
+        '''
+        if not 0 <= min_zoom <= max_zoom <= 22:
+            raise ValueError("Expected 0 <= min_zoom <= max_zoom <= 22, got %r and %r" % (min_zoom, max_zoom))
+        self.clustering = {'min_zoom': min_zoom, 'max_zoom': max_zoom, 'cell_size': cell_size}
+
+    def scatter(self, lats, lngs, color=None, size=None, marker=True, c=None, s=None, symbol='o',
+                colormap='viridis', vmin=None, vmax=None, norm='linear', **kwargs):
+        '''
+        :param color: color of the points, or one color per point: color
+            names or codes, or numbers mapped to colors by ``colormap``. The
+            points are then drawn in one layer per color.
+        :param size: size of the symbols, in meters, or one size per point
+        :param colormap: colormap of numeric colors, the name of one of
+            gmplot.colors.COLORMAPS or a sequence of colors from low to high
+        :param vmin: value of the first color of ``colormap``, by default
+            the lowest of ``color``
+        :param vmax: value of the last color of ``colormap``, by default the
+            highest of ``color``
+        :param norm: 'linear', 'sqrt' or 'log' mapping of numeric colors
+        '''
+        color = c if color is None or (isinstance(color, str) and not color) else color
+        if np.ndim(size) == 0:
+            size = size or s or 40
+        if color is None or isinstance(color, str):
+            self._add_scatter(lats, lngs, color, size, marker, symbol, kwargs)
+            return
+
+        if not isinstance(colormap, str):
+            colormap = [self._color(name) for name in colormap]
+        palette, groups = color_groups(color, self._color, colormap, vmin, vmax, norm)
+        lats, lngs = as_column(lats), as_column(lngs)
+        if sum(len(rows) for rows in groups) != len(lats):
+            raise ValueError("Expected one color per point, got %d colors for %d points"
+                             % (sum(len(rows) for rows in groups), len(lats)))
+        sizes = np.broadcast_to(as_column(size), lats.shape)
+        for code, rows in zip(palette, groups):
+            self._add_scatter(lats[rows], lngs[rows], code, sizes[rows], marker, symbol, dict(kwargs))
+
+    def _add_scatter(self, lats, lngs, color, size, marker, symbol, kwargs):
         kwargs["color"] = color
-        kwargs["size"] = size
         settings = self._process_kwargs(kwargs)
-        for lat, lng in zip(lats, lngs):
-            if marker:
-                self.marker(lat, lng, settings['color'])
-            else:
-                self._add_symbol(Symbol(symbol, lat, lng, size), **settings)
+        if marker:
+            self._add_markers(lats, lngs, settings['color'])
+        else:
+            self._add_symbols(symbol, lats, lngs, size, **settings)
 
-    def _add_symbol(self, symbol, color=None, c=None, **kwargs):
+    def _add_symbols(self, symbol, lats, lngs, size, color=None, c=None, **kwargs):
         color = color or c
         kwargs.setdefault('face_alpha', 0.5)
         kwargs.setdefault('face_color', "#000000")
         kwargs.setdefault("color", color)
-        settings = self._process_kwargs(kwargs)
-        self.symbols.append((symbol, settings))
+        settings = intern_settings(self._settings, dict(self._process_kwargs(kwargs), symbol=symbol))
+        self.symbols.add(settings, lat=lats, lng=lngs, size=size)
 
     def circle(self, lat, lng, radius, color=None, c=None, **kwargs):
         color = color or c
@@ -96,9 +298,21 @@ class GoogleMapPlotter(object):
         kwargs.setdefault('face_color', "#000000")
         kwargs.setdefault("color", color)
         settings = self._process_kwargs(kwargs)
-        self.circles.append(((lat, lng, radius), settings))
+        self.circles.add(settings, lat=lat, lng=lng, radius=radius)
 
     def _process_kwargs(self, kwargs):
+        '''
+        :return: the style settings of a layer drawn with ``kwargs``, interned
+            (see gmplot.styles.intern_settings): they are shared, and must not
+            be modified.
+        '''
+        try:
+            cache_key = tuple(sorted(kwargs.items()))
+            return self._kwargs_settings[cache_key]
+        except TypeError:
+            cache_key = None
+        except KeyError:
+            pass
         settings = dict()
         settings["edge_color"] = kwargs.get("color", None) or \
                                  kwargs.get("edge_color", None) or \
@@ -129,29 +343,145 @@ class GoogleMapPlotter(object):
         # Need to replace "plum" with "#DDA0DD" and "c" with "#00FFFF" (cyan).
         for key, color in settings.items():
             if 'color' in key:
-                color = self.color_dict.get(color, color)
-                color = self.html_color_codes.get(color, color)
-                settings[key] = color
+                settings[key] = self._color(color)
 
         settings["closed"] = kwargs.get("closed", None)
+        settings = intern_settings(self._settings, settings)
+        if cache_key is not None:
+            self._kwargs_settings[cache_key] = settings
         return settings
 
-    def plot(self, lats, lngs, color=None, c=None, **kwargs):
+    def plot(self, lats, lngs, color=None, c=None, simplify=None, simplify_method='douglas-peucker', **kwargs):
+        '''
+        :param simplify: drop the vertices that do not visibly change the
+            path before drawing it. True simplifies to a tolerance of one
+            pixel at the zoom level of the map, a number to that tolerance
+            in meters, and a list of zoom levels makes one level of detail
+            per zoom level, each shown from its zoom up to the next one.
+        :param simplify_method: 'douglas-peucker' or 'visvalingam'
+        '''
         color = color or c
         kwargs.setdefault("color", color)
         settings = self._process_kwargs(kwargs)
-        path = zip(lats, lngs)
-        self.paths.append((path, settings))
+        self._add_path(self.paths, settings, lats, lngs, simplify, simplify_method)
+
+    def _add_path(self, store, settings, lats, lngs, simplify, method):
+        if simplify is None or simplify is False:
+            store.add(settings, lat=lats, lng=lngs)
+        elif simplify is True:
+            lats, lngs = simplify_path(lats, lngs, 1.0, self.zoom, method)
+            store.add(settings, lat=lats, lng=lngs)
+        elif hasattr(simplify, '__iter__'):
+            for lats, lngs, zooms in simplify_levels(lats, lngs, simplify, method=method):
+                store.add(intern_settings(self._settings, dict(settings, zooms=zooms)), lat=lats, lng=lngs)
+        else:
+            lats, lngs = simplify_path(lats, lngs, simplify, method=method)
+            store.add(settings, lat=lats, lng=lngs)
 
-    def heatmap(self, lats, lngs, weight, threshold=10, radius=10, gradient=None, opacity=0.6, maxIntensity=1, dissipating=True):
+    def heatmap(self, lats, lngs, weight, threshold=10, radius=10, gradient=None, opacity=0.6, maxIntensity=1, dissipating=True,
+                aggregate=False):
         '''
-        :param lats: list of latitudes
-        :param lngs: list of longitudes
+        :param lats: list, array or Series of latitudes
+        :param lngs: list, array or Series of longitudes
+        :param weight: list, array or Series of weights, or a single weight for all points
         :param maxIntensity:(int) max frequency to use when plotting. Default (None) uses max value on map domain.
         :param threshold:
         :param radius: The hardest param. Example (string):
+        :param aggregate: sum the weights of nearby points into one point per
+            cell of a grid, and only draw the occupied cells. True sizes the
+            cells from the radius and the zoom level of the map, so the
+            heatmap looks the same at that zoom; a number sets the size of
+            the cells in degrees.
         :return:
         '''
+        settings = self._heatmap_settings(threshold, radius, gradient, opacity, maxIntensity, dissipating)
+        grid = self._heatmap_grid(aggregate, radius)
+        if grid is not None:
+            lats, lngs, weight = grid.add(lats, lngs, weight).result()
+        self.heatmap_points.add(settings, lat=lats, lng=lngs, weight=weight)
+
+    def heatmap_timeseries(self, lats, lngs, weights, timestamps, freq='M', aggregate=False, **kwargs):
+        '''
+        Draw a heatmap per time slice, picked with a slider under the map.
+        Only the heatmap of the picked slice is built in the browser.
+
+        :param lats: list, array or Series of latitudes
+        :param lngs: list, array or Series of longitudes
+        :param weights: list, array or Series of weights, or a single weight for all points
+        :param timestamps: time of each point: datetime64 values, datetime
+            objects, ISO 8601 strings or seconds since the epoch
+        :param freq: length of a slice, a NumPy datetime unit ('Y', 'M', 'W',
+            'D', 'h', 'm' or 's') with an optional multiple, as in '3M' or
+            '15m'. Slices are aligned on the calendar, in UTC.
+        :param aggregate: aggregate the points of each slice, as for heatmap()
+        :param kwargs: heatmap() options (radius, opacity, gradient...)
+        '''
+        settings = self._heatmap_settings(**kwargs)
+        lats, lngs = as_column(lats), as_column(lngs)
+        weights = np.broadcast_to(as_column(weights), lats.shape)
+        grids = {}
+        for start, indices in slices(timestamps, freq):
+            grids[start] = self._heatmap_grid(aggregate, settings['radius'])
+            if grids[start] is None:
+                grids[start] = _Points()
+            grids[start].add(lats[indices], lngs[indices], weights[indices])
+        self._add_slices(settings, freq, grids)
+
+    def heatmap_from_source(self, source, lat='lat', lng='lng', weight=None, time=None, aggregate=True,
+                            chunk_size=CHUNK_ROWS, freq='M', **kwargs):
+        '''
+        Draw a heatmap of points read chunk by chunk from a file or array,
+        which never needs to fit in memory.
+
+        :param source: path of a CSV (with a header row), Parquet (needs the
+            pyarrow package) or .npy file, or an array such as a
+            ``numpy.memmap``: a 2-D array, a structured array or a mapping
+            of column names to arrays
+        :param lat: name (or index) of the latitude column
+        :param lng: name (or index) of the longitude column
+        :param weight: name (or index) of the weight column, if any
+        :param time: name (or index) of a column of timestamps: datetime64
+            values, ISO 8601 strings in CSV files (such as
+            ``2020-01-05T12:00:00``), or seconds since the epoch. Points are
+            then drawn as a timeline, one heatmap per ``freq`` slice, as by
+            heatmap_timeseries().
+        :param aggregate: aggregate the points as they are read, as for
+            heatmap(). When False, the source is read again, chunk by chunk,
+            when the map is drawn.
+        :param chunk_size: number of rows read at a time
+        :param freq: length of a time slice, as for heatmap_timeseries()
+        :param kwargs: heatmap() options (radius, opacity, gradient...)
+        '''
+        source = PointSource(source, lat, lng, weight, time, chunk_size)
+        settings = self._heatmap_settings(**kwargs)
+        grid = self._heatmap_grid(aggregate, settings['radius'])
+        if grid is None:
+            if time is not None:
+                raise ValueError("Timeline heatmaps are aggregated, expected aggregate to be set")
+            self.heatmap_sources.append((source, settings))
+            return
+        if time is None:
+            for lats, lngs, weights, _ in source:
+                grid.add(lats, lngs, weights)
+            lats, lngs, weights = grid.result()
+            self.heatmap_points.add(settings, lat=lats, lng=lngs, weight=weights)
+            return
+
+        grids = {}
+        for lats, lngs, weights, times in source:
+            for start, indices in slices(times, freq):
+                if start not in grids:
+                    grids[start] = self._heatmap_grid(aggregate, settings['radius'])
+                grids[start].add(lats[indices], lngs[indices], weights[indices])
+        self._add_slices(settings, freq, grids)
+
+    def _add_slices(self, settings, freq, grids):
+        settings['date_length'] = DATE_LENGTHS[parse_freq(freq)[1]]
+        for start in sorted(grids):
+            lats, lngs, weights = grids[start].result()
+            self.heatmap_slices.add(dict(settings, time=start), lat=lats, lng=lngs, weight=weights)
+
+    def _heatmap_settings(self, threshold=10, radius=10, gradient=None, opacity=0.6, maxIntensity=1, dissipating=True):
         settings = {}
         # Try to give anyone using threshold a heads up.
         if threshold != 10:
@@ -162,12 +492,14 @@ class GoogleMapPlotter(object):
         settings['opacity'] = opacity
         settings['maxIntensity'] = maxIntensity
         settings['dissipating'] = dissipating
-        settings = self._process_heatmap_kwargs(settings)
+        return settings
 
-        heatmap_points = []
-        for lat, lng, weight in zip(lats, lngs, weight):
-            heatmap_points.append((lat, lng, weight))
-        self.heatmap_points.append((heatmap_points, settings))
+    def _heatmap_grid(self, aggregate, radius):
+        if aggregate is True:
+            return heatmap_grid(zoom=self.zoom, radius=radius)
+        if aggregate:
+            return heatmap_grid(cell_size=aggregate)
+        return None
 
     def _process_heatmap_kwargs(self, settings_dict):
         settings_string = ''
@@ -210,6 +542,103 @@ class GoogleMapPlotter(object):
         bounds_string = self._process_ground_overlay_image_bounds(bounds_dict)
         self.ground_overlays.append((url, bounds_string))
 
+    def density_overlay(self, lats=(), lngs=(), weights=1, paths=(), bounds=None, zoom=None, max_size=2048,
+                        colormap='hot', scale='log', vmax=None, opacity=0.8):
+        '''
+        Draw the density of points, and optionally of paths, as an image laid
+        over the map, rasterized here rather than drawn by the browser: the
+        map costs the same to show whatever the number of points.
+
+        The image is written as a PNG next to the html file by draw(), or
+        embedded in the page otherwise, and drawn as by ground_overlay().
+
+        :param lats: latitudes of the points
+        :param lngs: longitudes of the points
+        :param weights: weight of each point, or a single weight for all
+        :param paths: sequence of (lats, lngs) pairs of paths, sampled about
+            once per pixel along their segments
+        :param bounds: (south, west, north, east) bounds of the image, by
+            default those of the points and paths
+        :param zoom: zoom level whose pixels the image has, by default the
+            zoom level of the map
+        :param max_size: largest width or height of the image, in pixels
+        :param colormap: name of a colormap of gmplot.colors.COLORMAPS, or
+            sequence of colors from low to high density
+        :param scale: 'linear', 'sqrt' or 'log' scaling of the density
+        :param vmax: density of the last color, by default the highest
+        :param opacity: opacity of the pixels with some density
+        '''
+        lats, lngs = as_column(lats), as_column(lngs)
+        paths = [(as_column(path_lats), as_column(path_lngs)) for path_lats, path_lngs in paths]
+        if bounds is None:
+            all_lats = np.concatenate([lats] + [path[0] for path in paths])
+            all_lngs = np.concatenate([lngs] + [path[1] for path in paths])
+            if not len(all_lats):
+                raise ValueError("Expected points or paths to draw the density of")
+            bounds = (all_lats.min(), all_lngs.min(), all_lats.max(), all_lngs.max())
+        if not isinstance(colormap, str):
+            colormap = [self._color(color) for color in colormap]
+
+        raster = Raster(bounds, self.zoom if zoom is None else zoom, max_size)
+        raster.add_points(lats, lngs, weights)
+        for path_lats, path_lngs in paths:
+            raster.add_path(path_lats, path_lngs)
+        south, west, north, east = raster.bounds
+        self.ground_overlay(RasterImage(raster.image(colormap, scale, vmax, opacity)),
+                            {'north': north, 'south': south, 'west': west, 'east': east})
+
+    def tile_layer(self, url, min_zoom=0, max_zoom=22, bounds=None, opacity=1.0):
+        '''
+        Draw z/x/y map tiles over the map, as a google.maps.ImageMapType.
+
+        :param url: url of the tiles, with {z}, {x} and {y} in place of the
+            zoom level and tile coordinates, such as 'tiles/{z}/{x}/{y}.png'
+        :param min_zoom: lowest zoom level with tiles
+        :param max_zoom: highest zoom level with tiles
+        :param bounds: (south, west, north, east) bounds outside of which no
+            tile is requested, not crossing the antimeridian
+        :param opacity: opacity of the tiles
+        '''
+        if bounds is None:
+            box = [0, 0, 1, 1]
+        else:
+            south, west, north, east = bounds
+            (left, right), (bottom, top) = world_coordinates([south, north], [west, east])
+            box = [left, top, right, bottom]
+        self.tile_layers.append((url, int(min_zoom), int(max_zoom), box, float(opacity)))
+
+    def tile_overlay(self, directory, lats=(), lngs=(), weights=1, paths=(), zooms=range(0, 13), url=None,
+                     workers=None, colormap='hot', scale='log', vmax=None, opacity=0.8):
+        '''
+        Draw the density of points, and optionally of paths, as a pyramid of
+        pre-rendered map tiles: the map then shows any number of points down
+        to street level, loading only the tiles in view.
+
+        The tiles are written under ``directory`` by worker processes, see
+        gmplot.tiles.write_tiles(), and drawn as by tile_layer().
+
+        :param directory: directory the tiles are written under
+        :param url: url of the tiles in the page, by default
+            ``directory/{z}/{x}/{y}.png``, for a relative ``directory``
+            relative to the html file
+        :param zooms: zoom levels to write the tiles of
+        :param workers: number of worker processes, by default one per CPU
+        :return: sorted list of the paths of the tiles written
+
+        Other arguments are those of density_overlay().
+        '''
+        paths = [(as_column(path_lats), as_column(path_lngs)) for path_lats, path_lngs in paths]
+        written = write_tiles(directory, lats, lngs, weights, paths, zooms, workers, colormap, scale, vmax, opacity)
+        all_lats = np.concatenate([as_column(lats)] + [path[0] for path in paths])
+        all_lngs = np.concatenate([as_column(lngs)] + [path[1] for path in paths])
+        bounds = None
+        if len(all_lats):
+            bounds = (all_lats.min(), all_lngs.min(), all_lats.max(), all_lngs.max())
+        if url is None:
+            url = directory.replace(os.sep, '/').rstrip('/') + '/{z}/{x}/{y}.png'
+        self.tile_layer(url, min(zooms), max(zooms), bounds)
+        return written
+
     def _process_ground_overlay_image_bounds(self, bounds_dict):
         bounds_string = 'var imageBounds = {'
         bounds_string += "north:  %.4f,\n" % bounds_dict['north']
@@ -219,18 +648,218 @@ class GoogleMapPlotter(object):
 
         return bounds_string
 
-    def polygon(self, lats, lngs, color=None, c=None, **kwargs):
+    def polygon(self, lats, lngs, color=None, c=None, simplify=None, simplify_method='douglas-peucker', **kwargs):
+        '''
+        :param simplify: as for plot()
+        :param simplify_method: as for plot()
+        '''
         color = color or c
         kwargs.setdefault("color", color)
         settings = self._process_kwargs(kwargs)
-        shape = zip(lats, lngs)
-        self.shapes.append((shape, settings))
+        self._add_path(self.shapes, settings, lats, lngs, simplify, simplify_method)
 
-    def draw(self, htmlfile):
-        """Create the html file which include one google map and all points and paths. If 
-        no string is provided, return the raw html.
+    def live_updates(self, url, interval=30):
+        '''
+        Make the map fetch a delta (see delta()) from ``url`` every
+        ``interval`` seconds and apply it to the objects on the map, instead
+        of being drawn again. Maps that missed a delta reload the page.
+        Needs the map to be drawn in the compact format.
+        '''
+        self.live = {'url': url, 'interval': interval}
+
+    def delta(self, encoded=False):
+        '''
+        Return the changes to the layers of markers, paths, circles, symbols,
+        polygons and heatmaps since the map was last drawn in the compact
+        format, or since the last delta, as the JSON text of an object that
+        the compact runtime applies to the map with
+        ``gmplotApplyDelta(googleMap, delta)``: the ids of the layers removed,
+        and the rows added, per kind of layer, in the compact format.
+
+        :param encoded: write paths and polygons as encoded polylines
+        '''
+        f = io.StringIO()
+        self.write_delta(f, encoded)
+        return f.getvalue()
+
+    def draw(self, htmlfile, compact=False, external=False, compress=(), hashed=False, encoded=False, crop=None,
+             instrument=None):
+        """Create the html file which include one google map and all points and paths.
+
+        :param htmlfile: path of the file to create, or a writable text or
+            binary stream (an open file, a gzip stream, an HTTP response...)
+            which the document is streamed to as it is produced.
+        :param compact: serialize each layer once as flat data arrays plus a
+            shared style table, and let a small fixed JavaScript runtime build
+            the map objects in a loop, instead of emitting code for every
+            object.
+        :param external: write the layer data (in the compact format) and
+            timeline heatmap data to a separate script next to the html file,
+            named after it (``my_map.data.js``), which the html loads.
+        :param compress: also write precompressed copies of every file,
+            ``'gzip'`` (``.gz``) and/or ``'br'`` (``.br``, needs the brotli
+            package), for a server or CDN to serve directly.
+        :param hashed: put a digest of its content in the name of the data
+            script, so it can be cached for long and refreshed without
+            invalidating the html.
+        :param encoded: write paths and polygons in Google's encoded
+            polyline format, decoded by the Maps geometry library, at a
+            precision of about a meter.
+        :param crop: only draw the markers, circles, symbols and heatmap
+            points inside these (south, west, north, east) bounds, and the
+            paths and polygons crossing them. True crops to the view of the
+            map when it opens, as by viewport().
+        :param instrument: gmplot.instrument.Instrument measuring each stage
+            of the draw, reporting them to its hook as they are done, or True
+            for one without a hook
+        :return: list of the paths written, when ``htmlfile`` is a path; with
+            ``instrument``, the RenderStats of the draw instead, holding them
+        """
+        instrument = _as_instrument(instrument)
+        if instrument is not None:
+            instrument.start()
+        try:
+            written = self._draw(htmlfile, compact, external, compress, hashed, encoded, crop, instrument)
+        finally:
+            if instrument is not None:
+                instrument.finish()
+        if instrument is None:
+            return written
+        instrument.stats.paths = written or []
+        return instrument.stats
+
+    def _draw(self, htmlfile, compact, external, compress, hashed, encoded, crop, instrument):
+        if hasattr(htmlfile, 'write'):
+            if external or compress:
+                raise ValueError("External data and compressed copies need htmlfile to be a path")
+            binary = isinstance(htmlfile, (io.RawIOBase, io.BufferedIOBase))
+            document = functools.partial(self._view(crop)._write_document, compact=compact, encoded=encoded)
+            for chunk in self._chunks(document, instrument=instrument):
+                htmlfile.write(chunk.encode('utf-8') if binary else chunk)
+            return
+
+        htmlfile = os.fspath(htmlfile)
+        gmap = self._view(crop)
+        root = os.path.splitext(htmlfile)[0]
+        written, data_src = [], None
+        if external:
+            data = functools.partial(gmap._write_data, encoded=encoded)
+            written = write_asset(root + '.data.js', gmap._chunks(data, instrument=instrument), compress, hashed)
+            data_src = os.path.basename(written[0])
+        images = [url for url, _ in gmap.ground_overlays if isinstance(url, RasterImage)]
+        if instrument is not None and images:
+            instrument.begin()
+        size, image_urls = 0, {}
+        for i, image in enumerate(images):
+            path = '%s.overlay%d.png' % (root, i)
+            with open(path, 'wb') as f:
+                size += f.write(image.png())
+            written.append(path)
+            image_urls[id(image)] = os.path.basename(path)
+        if instrument is not None and images:
+            instrument.end('overlay_images', len(images), size)
+        document = functools.partial(gmap._write_document, compact=compact or external, data_src=data_src,
+                                     encoded=encoded, image_urls=image_urls)
+        written = write_asset(htmlfile, gmap._chunks(document, instrument=instrument), compress) + written
+        print("File creation completed!")
+        return written
+
+    def render(self, compact=False, encoded=False, crop=None, instrument=None):
+        """Return the html document of the map as a string.
+
+        With ``instrument``, its ``stats`` are the RenderStats of the render.
+        """
+        return ''.join(self.iterdraw(compact, encoded=encoded, crop=crop, instrument=instrument))
+
+    def iterdraw(self, compact=False, chunk_size=65536, encoded=False, crop=None, instrument=None):
+        """Generate the html document of the map piece by piece.
+
+        Large layers are only formatted as the generator is consumed, so a
+        server can start sending the map before it is fully built without
+        ever holding the whole document in memory.
+
+        :param instrument: gmplot.instrument.Instrument measuring each stage,
+            whose ``stats`` are complete once the generator is exhausted, or
+            True for one without a hook, as for draw()
+        :return: generator of strings of ``chunk_size`` characters, the last
+            one shorter
+        """
+        instrument = _as_instrument(instrument)
+        gmap = self._view(crop)
+        document = functools.partial(gmap._write_document, compact=compact, encoded=encoded)
+        if instrument is None:
+            return gmap._chunks(document, chunk_size)
+        return _instrumented(gmap._chunks(document, chunk_size, instrument), instrument)
+
+    def _chunks(self, write, chunk_size=65536, instrument=None):
+        """Run the generator function ``write(f)``, yielding what it wrote in
+        chunks of ``chunk_size`` characters (the last one shorter) each time
+        it yields. Texts longer than a chunk are split between chunks.
+
+        ``write`` yields the name of each stage of the document it is done
+        with, which ``instrument`` records, with the size of what it wrote.
         """
-        f = open(htmlfile, 'w')
+        f = _LazyWriter()
+        chunk, size = [], 0
+        if instrument is not None:
+            instrument.begin()
+        for stage in write(f):
+            for text in f.drain():
+                if instrument is not None:
+                    instrument.count(text)
+                # Slices by offset, not copying the rest of a long text each time.
+                start = 0
+                while size + len(text) - start >= chunk_size:
+                    stop = start + chunk_size - size
+                    chunk.append(text[start:stop])
+                    start = stop
+                    if instrument is None:
+                        yield ''.join(chunk)
+                    else:
+                        instrument.pause()
+                        yield ''.join(chunk)
+                        instrument.resume()
+                    chunk, size = [], 0
+                if start < len(text):
+                    chunk.append(text[start:] if start else text)
+                    size += len(text) - start
+            if instrument is not None:
+                instrument.end(stage, self._stage_items(stage))
+        if chunk:
+            yield ''.join(chunk)
+
+    def _stage_items(self, stage):
+        '''
+        :return: number of the objects a stage of a draw drew: markers,
+            circles, symbols and heatmap points, and paths and polygons, or
+            None for the stages that draw no layer
+        '''
+        if stage == 'write_grids':
+            return len(self.grids) if self.gridsetting is not None else 0
+        if stage not in STAGE_LAYERS:
+            return None
+        return sum(self._store_items(name) for name in STAGE_LAYERS[stage])
+
+    def _store_items(self, name):
+        if isinstance(self.heatmap_points, dict) and name in ('heatmap_points', 'heatmap_slices'):
+            # A timeline dict is drawn, and counted, as the time slices.
+            if name == 'heatmap_points':
+                return 0
+            return sum(len(points) for points in self.heatmap_points.values())
+        store = getattr(self, name)
+        return len(store.layers) if name in PATH_LAYERS else store.size
+
+    def _write_document(self, f, compact, data_src=None, encoded=False, data_url=None, image_urls=None):
+        """Write the html document to ``f``, yielding after each part of it.
+
+        With ``data_src``, the layer and timeline data are not inlined but
+        loaded from that script, written by _write_data. With ``data_url``,
+        the layers in view are fetched from that URL instead. ``image_urls``
+        maps the ids of the raster images written next to the html file to
+        their file names, see write_ground_overlay().
+        """
+        if self.live and not compact:
+            raise ValueError("Live updates need a map drawn with compact=True")
         f.write('<html>\n')
         f.write('<head>\n')
         f.write(self.indent()+
@@ -240,40 +869,60 @@ class GoogleMapPlotter(object):
         f.write(self.indent()+'<title>Google Maps - gmplot </title>\n')
         f.write(self.indent())
 
-        try:
-            if self.data_external is True:
-                f.write('{0}<script type="text/javascript" src="data.js"></script>\n'.format(self.indent()))
-        except:
-            pass
+        if data_src is not None:
+            f.write('{0}<script type="text/javascript" src="{1}"></script>\n'.format(self.indent(), data_src))
         
+        libraries = 'visualization,geometry' if encoded else 'visualization'
         if self.apikey:
-            f.write('<script type="text/javascript" src="https://maps.googleapis.com/maps/api/js?libraries=visualization&sensor=true_or_false&key=%s"></script>\n' % self.apikey )
+            f.write('<script type="text/javascript" src="https://maps.googleapis.com/maps/api/js?libraries=%s&sensor=true_or_false&key=%s"></script>\n' % (libraries, self.apikey) )
         else:
-            f.write('<script type="text/javascript" src="https://maps.googleapis.com/maps/api/js?libraries=visualization&sensor=true_or_false"></script>\n' )
+            f.write('<script type="text/javascript" src="https://maps.googleapis.com/maps/api/js?libraries=%s&sensor=true_or_false"></script>\n' % libraries )
         
         f.write(self.indent()+'<script type="text/javascript">\n')
         # Make global scope variables
         self.write_global_vars(f)
+        if self._uses_runtime(compact):
+            f.write(COMPACT_RUNTIME)
+        elif self.gridsetting is not None or any(store.layers for store in
+                                                 (self.paths, self.shapes, self.circles, self.symbols)):
+            f.write(FACTORY_RUNTIME)
         # Document.onload() function
         f.write(self.indent(2)+'function initialize() {\n')
         self.write_map(f)
         f.write(self.indent(3)+'googleMap = map;\n')    # set global var
-        self.write_grids(f)
-        self.write_points(f)
-        self.write_paths(f)
-        self.write_circles(f)
-        self.write_symbols(f)
-        self.write_shapes(f)
-        if isinstance(self.heatmap_points, dict):
-            self.write_heatmap_from_dictionary(f)
+        yield 'head'
+        if data_url:
+            writers = [functools.partial(self.write_served_layers, url=data_url)]
+        elif compact:
+            writers = [self.write_compact_draw if data_src else
+                       functools.partial(self.write_compact_layers, encoded=encoded)]
         else:
-            self.write_heatmap(f)
-        self.write_ground_overlay(f)
-        self.write_final_initialization(f)
+            # The objects refer to a single table of their styles, and markers
+            # to one of their icons, written once they are.
+            styles, icons = StyleTable(), {}
+            writers = [functools.partial(self.write_grids, styles=styles),
+                       functools.partial(self.write_points, icons=icons),
+                       functools.partial(self.write_paths, encoded=encoded, styles=styles),
+                       functools.partial(self.write_circles, styles=styles),
+                       functools.partial(self.write_symbols, styles=styles),
+                       functools.partial(self.write_shapes, encoded=encoded, styles=styles)]
+        if not compact and not isinstance(self.heatmap_points, dict):
+            writers.append(self.write_heatmap)
+        if self._has_timeline():
+            writers.append(functools.partial(self.write_timeline, data=not data_src))
+        if self.live:
+            writers.append(self.write_live_updates)
+        for write in writers:
+            write(f)
+            yield getattr(write, 'func', write).__name__
+        self.write_ground_overlay(f, image_urls)
+        self.write_tile_layers(f)
         f.write(self.indent(2)+'}\n')
+        if not compact and len(styles):
+            f.write('{0}var gmplotStyles = {1};\n'.format(self.indent(2), styles.json()))
+        if not compact and icons:
+            f.write('{0}var gmplotIcons = {1};\n'.format(self.indent(2), json.dumps(icons, sort_keys=True)))
         f.write('{0}</script>\n'.format(self.indent()))
-        # specialized script
-        self.write_event_handlers(f)
         f.write('</head>\n')
         f.write(
             '<body style="margin:0px; padding:0px;" onload="initialize()">\n')
@@ -282,8 +931,20 @@ class GoogleMapPlotter(object):
             '\t<div id="map_canvas" style="width: 100%; height: 100%;"></div>\n')
         f.write('</body>\n')
         f.write('</html>\n')
-        f.close()
-        print("File creation completed!")
+        yield 'tail'
+
+    def _uses_runtime(self, compact):
+        if compact or self.clustering or self._has_timeline():
+            return True
+        return any(layer.settings.get('zooms') for store in (self.paths, self.shapes) for layer in store.layers)
+
+    def _write_data(self, f, encoded=False):
+        """Write the data script of an external draw to ``f``, yielding after each part of it."""
+        self.write_compact_data(f, encoded)
+        yield 'write_compact_data'
+        if self._has_timeline():
+            self.write_timeline_data(f)
+            yield 'write_timeline_data'
 
     def indent(self, tab_level=1):
         one_tab = ' ' * 4      # 4 spaces = 1 tab
@@ -299,52 +960,70 @@ class GoogleMapPlotter(object):
     # # # # # # Low level Map Drawing # # # # # #
     #############################################
 
-    def write_grids(self, f):
+    def write_grids(self, f, styles=None):
+        ''' writes the grid lines as one array of the coordinates of their
+            ends, drawn by the gmplotGrid loop of FACTORY_RUNTIME.
+        '''
         if self.gridsetting is None:
             return
-        slat = self.gridsetting[0]
-        elat = self.gridsetting[1]
-        latin = self.gridsetting[2]
-        slng = self.gridsetting[3]
-        elng = self.gridsetting[4]
-        lngin = self.gridsetting[5]
-        self.grids = []
-
-        r = [
-            slat + float(x) * latin for x in range(0, int((elat - slat) / latin))]
-        for lat in r:
-            self.grids.append(
-                [(lat + latin / 2.0, slng + lngin / 2.0), (lat + latin / 2.0, elng + lngin / 2.0)])
-
-        r = [
-            slng + float(x) * lngin for x in range(0, int((elng - slng) / lngin))]
-        for lng in r:
-            self.grids.append(
-                [(slat + latin / 2.0, lng + lngin / 2.0), (elat + latin / 2.0, lng + lngin / 2.0)])
-
-        for line in self.grids:
-            settings = self._process_kwargs({"color": "#000000"})
-            self.write_polyline(f, line, settings)
-
-    def write_points(self, f):
-        for point in self.points:
-            self.write_point(f, point[0], point[1], point[2], point[3])
+        self._compute_grids()
+        settings = self._process_kwargs({"color": "#000000"})
+        f.write('{0}var gridStyle = {1};\n'.format(
+            self.indent(2), self._style_js(styles, self._polyline_options, settings)))
+        f.write('{0}gmplotGrid(map, gridStyle, ['.format(self.indent(2)))
+        f.writelines(format_array(self.grids[:, :, 0].ravel(), self.grids[:, :, 1].ravel()))
+        f.write(']);\n')
+
+    def _compute_grids(self):
+        ''' sets ``grids`` to the (n, 2, 2) array of the (lat, lng) of the
+            ends of each grid line: lines of latitude, then of longitude.
+        '''
+        slat, elat, latin, slng, elng, lngin = self.gridsetting
+        lats = slat + np.arange(int((elat - slat) / latin)) * latin + latin / 2.0
+        lngs = slng + np.arange(int((elng - slng) / lngin)) * lngin + lngin / 2.0
+        self.grids = np.empty((len(lats) + len(lngs), 2, 2))
+        self.grids[:len(lats), :, 0] = lats[:, None]
+        self.grids[:len(lats), :, 1] = [slng + lngin / 2.0, elng + lngin / 2.0]
+        self.grids[len(lats):, :, 0] = [slat + latin / 2.0, elat + latin / 2.0]
+        self.grids[len(lats):, :, 1] = lngs[:, None]
+
+    def write_points(self, f, icons=None):
+        if self.clustering and self.points.layers:
+            styles = StyleTable()
+            f.write('var gmplotClusters = {\n')
+            self.write_compact_clusters(f, styles)
+            f.write('"icons": %s,\n' % self._icon_table(self.points))
+            f.write('"styles": %s\n' % styles.json())
+            f.write('};\n')
+            f.write('gmplotDraw(map, gmplotClusters);\n')
+            return
+        f.writelines(self._item_lines(functools.partial(self.write_point, icons=icons), self.points))
 
-    def write_circles(self, f):
-        for circle, settings in self.circles:
-            self.write_circle(f, circle[0], circle[1], circle[2], settings)
+    def write_circles(self, f, styles=None):
+        for layer in self.circles.layers:
+            self.write_symbol_layer(f, self.circles, layer, 'o', 'radius', styles)
 
-    def write_symbols(self, f):
-        for symbol, settings in self.symbols:
-            self.write_symbol(f, symbol, settings)
+    def write_symbols(self, f, styles=None):
+        for layer in self.symbols.layers:
+            self.write_symbol_layer(f, self.symbols, layer, layer.settings['symbol'], 'size', styles)
 
-    def write_paths(self, f):
+    def _item_lines(self, write, items):
+        ''' lazily yields what write(f, *item) writes for each item.
+        '''
+        buffer = _LineBuffer()
+        for item in items:
+            write(buffer, *item)
+            for line in buffer:
+                yield line
+            del buffer[:]
+
+    def write_paths(self, f, encoded=False, styles=None):
         for path, settings in self.paths:
-            self.write_polyline(f, path, settings)
+            self.write_polyline(f, path, settings, encoded, styles)
 
-    def write_shapes(self, f):
+    def write_shapes(self, f, encoded=False, styles=None):
         for shape, settings in self.shapes:
-            self.write_polygon(f, shape, settings)
+            self.write_polygon(f, shape, settings, encoded, styles)
 
     # TODO: Add support for mapTypeId: google.maps.MapTypeId.SATELLITE
     def write_map(self,  f):
@@ -359,11 +1038,22 @@ class GoogleMapPlotter(object):
         f.write(
             '{0}var map = new google.maps.Map(document.getElementById("map_canvas"), myOptions);\n'.format(self.indent(3)))
 
-    def write_point(self, f, lat, lon, color, title):
+    def write_point(self, f, lat, lon, color, title, icons=None):
+        '''
+        :param color: hex code of the color of the marker, without the '#'
+        :param icons: dict of the URLs of the icons of the document by color,
+            written as ``gmplotIcons`` after the markers; without one, the
+            URL of the icon is written inline
+        '''
+        if icons is None:
+            icon = json.dumps(self._icon_url(color))
+        else:
+            if color not in icons:
+                icons[color] = self._icon_url(color)
+            icon = 'gmplotIcons[%s]' % json.dumps(color)
         f.write('\t\tvar latlng = new google.maps.LatLng(%f, %f);\n' %
                 (lat, lon))
-        f.write('\t\tvar img = new google.maps.MarkerImage(\'%s\');\n' %
-                (self.coloricon % color))
+        f.write('\t\tvar img = new google.maps.MarkerImage(%s);\n' % icon)
         f.write('\t\tvar marker = new google.maps.Marker({\n')
         f.write('\t\ttitle: "%s",\n' % title)
         f.write('\t\ticon: img,\n')
@@ -372,142 +1062,495 @@ class GoogleMapPlotter(object):
         f.write('\t\tmarker.setMap(map);\n')
         f.write('\n')
 
-    def write_symbol(self, f, symbol, settings):
-        strokeColor = settings.get('color') or settings.get('edge_color')
-        strokeOpacity = settings.get('edge_alpha')
-        strokeWeight = settings.get('edge_width')
-        fillColor = settings.get('face_color')
-        fillOpacity = settings.get('face_alpha')
-        try:
-            template = SYMBOLS[symbol.symbol]
-        except KeyError:
-            raise InvalidSymbolError("Symbol %s is not implemented" % symbol.symbol)
-
-        f.write(template.format(lat=symbol.lat, long=symbol.long, size=symbol.size, strokeColor=strokeColor,
-                                strokeOpacity=strokeOpacity, strokeWeight=strokeWeight,
-                                fillColor=fillColor, fillOpacity=fillOpacity))
-
-    def write_circle(self, f, lat, long, size, settings):
-        strokeColor = settings.get('color') or settings.get('edge_color')
-        strokeOpacity = settings.get('edge_alpha')
-        strokeWeight = settings.get('edge_width')
-        fillColor = settings.get('face_color')
-        fillOpacity = settings.get('face_alpha')
-        f.write(CIRCLE.format(lat=lat, long=long, size=size, strokeColor=strokeColor,
-                              strokeOpacity=strokeOpacity, strokeWeight=strokeWeight,
-                              fillColor=fillColor, fillOpacity=fillOpacity))
-
-    def write_polyline(self, f, path, settings):
-        clickable = False
-        geodesic = True
-        strokeColor = settings.get('color') or settings.get('edge_color')
-        strokeOpacity = settings.get('edge_alpha')
-        strokeWeight = settings.get('edge_width')
-
-        f.write('var PolylineCoordinates = [\n')
-        for coordinate in path:
-            f.write('new google.maps.LatLng(%f, %f),\n' %
-                    (coordinate[0], coordinate[1]))
-        f.write('];\n')
-        f.write('\n')
+    def write_symbol_layer(self, f, store, layer, symbol, size, styles=None):
+        '''
+        Write one call of the gmplotSymbol factory of FACTORY_RUNTIME per row
+        of ``layer``, after its style.
 
-        f.write('var Path = new google.maps.Polyline({\n')
-        f.write('clickable: %s,\n' % (str(clickable).lower()))
-        f.write('geodesic: %s,\n' % (str(geodesic).lower()))
-        f.write('path: PolylineCoordinates,\n')
-        f.write('strokeColor: "%s",\n' % (strokeColor))
-        f.write('strokeOpacity: %f,\n' % (strokeOpacity))
-        f.write('strokeWeight: %d\n' % (strokeWeight))
-        f.write('});\n')
-        f.write('\n')
-        f.write('Path.setMap(map);\n')
-        f.write('\n\n')
-
-    def write_polygon(self, f, path, settings):
-        clickable = False
-        geodesic = True
-        strokeColor = settings.get('edge_color') or settings.get('color')
-        strokeOpacity = settings.get('edge_alpha')
-        strokeWeight = settings.get('edge_width')
-        fillColor = settings.get('face_color') or settings.get('color')
-        fillOpacity= settings.get('face_alpha')
-        f.write('var coords = [\n')
-        for coordinate in path:
-            f.write('new google.maps.LatLng(%f, %f),\n' %
-                    (coordinate[0], coordinate[1]))
-        f.write('];\n')
-        f.write('\n')
+        :param symbol: 'o' (circle), 'x' or '+'
+        :param size: column of ``store`` holding the size of the symbols
+        :param styles: StyleTable of the document, see _style_js()
+        '''
+        if symbol not in SYMBOLS:
+            raise InvalidSymbolError("Symbol %s is not implemented" % symbol)
+        f.write('{0}var symbolStyle = {1};\n'.format(
+            self.indent(2), self._style_js(styles, self._circle_options, layer.settings)))
+        template = "%sgmplotSymbol(map, symbolStyle, '%s', %%f, %%f, %%f);\n" % (self.indent(2), symbol)
+        f.writelines(format_rows(template, store.column('lat', layer), store.column('lng', layer),
+                                 store.column(size, layer), trim=True))
+
+    def _style_js(self, styles, options, settings):
+        '''
+        :param styles: StyleTable of the document, written as ``gmplotStyles``
+            after the objects; without one, styles are written inline
+        :return: JavaScript expression of the Maps options of ``settings``
+        '''
+        if styles is None:
+            return json.dumps(options(settings), sort_keys=True)
+        return 'gmplotStyles[%d]' % styles.index(options, settings)
 
-        f.write('var polygon = new google.maps.Polygon({\n')
-        f.write('clickable: %s,\n' % (str(clickable).lower()))
-        f.write('geodesic: %s,\n' % (str(geodesic).lower()))
-        f.write('fillColor: "%s",\n' % (fillColor))
-        f.write('fillOpacity: %f,\n' % (fillOpacity))
-        f.write('paths: coords,\n')
-        f.write('strokeColor: "%s",\n' % (strokeColor))
-        f.write('strokeOpacity: %f,\n' % (strokeOpacity))
-        f.write('strokeWeight: %d\n' % (strokeWeight))
-        f.write('});\n')
-        f.write('\n')
-        f.write('polygon.setMap(map);\n')
-        f.write('\n\n')
+    def write_polyline(self, f, path, settings, encoded=False, styles=None):
+        path = as_coords(path)
+
+        if encoded:
+            f.write('var PolylineCoordinates = %s;\n' % self._decode_path_js(path))
+            lines = []
+        else:
+            f.write('var PolylineCoordinates = [\n')
+            f.writelines(format_rows('new google.maps.LatLng(%f, %f),\n', path[:, 0], path[:, 1]))
+            lines = ['];\n']
+        lines.append('\n')
+
+        lines.append('var Path = new google.maps.Polyline(gmplotOptions(%s, {\n'
+                     % self._style_js(styles, self._polyline_options, settings))
+        lines.append('clickable: false,\n')
+        lines.append('geodesic: true,\n')
+        lines.append('path: PolylineCoordinates\n')
+        lines.append('}));\n')
+        lines.append('\n')
+        lines.append('Path.setMap(map);\n')
+        if settings.get('zooms'):
+            lines.append('gmplotZoomRange(map, Path, [%d, %d]);\n' % settings['zooms'])
+        lines.append('\n\n')
+        f.write(''.join(lines))
+
+    def write_polygon(self, f, path, settings, encoded=False, styles=None):
+        path = as_coords(path)
+
+        if encoded:
+            f.write('var coords = %s;\n' % self._decode_path_js(path))
+            lines = []
+        else:
+            f.write('var coords = [\n')
+            f.writelines(format_rows('new google.maps.LatLng(%f, %f),\n', path[:, 0], path[:, 1]))
+            lines = ['];\n']
+        lines.append('\n')
+
+        lines.append('var polygon = new google.maps.Polygon(gmplotOptions(%s, {\n'
+                     % self._style_js(styles, self._polygon_options, settings))
+        lines.append('clickable: false,\n')
+        lines.append('geodesic: true,\n')
+        lines.append('paths: coords\n')
+        lines.append('}));\n')
+        lines.append('\n')
+        lines.append('polygon.setMap(map);\n')
+        if settings.get('zooms'):
+            lines.append('gmplotZoomRange(map, polygon, [%d, %d]);\n' % settings['zooms'])
+        lines.append('\n\n')
+        f.write(''.join(lines))
+
+    def _decode_path_js(self, path):
+        return 'google.maps.geometry.encoding.decodePath(%s)' % json.dumps(encode_polyline(path[:, 0], path[:, 1]))
 
     def write_heatmap(self, f):
-        for heatmap_points, settings_string in self.heatmap_points:
-            f.write('var heatmap_points = [\n')
-            for heatmap_lat, heatmap_lng, heatmap_weight in heatmap_points:
-                f.write('{location: new google.maps.LatLng(%f, %f),weight:%f},\n' %
-                        (heatmap_lat, heatmap_lng, heatmap_weight))
-            f.write('];\n')
-            f.write('\n')
-            f.write('var pointArray = new google.maps.MVCArray(heatmap_points);' + '\n')
-            f.write('var heatmap;' + '\n')
-            f.write('heatmap = new google.maps.visualization.HeatmapLayer({' + '\n')
-            f.write('\n')
-            f.write('data: pointArray' + '\n')
-            f.write('});' + '\n')
-            f.write('heatmap.setMap(map);' + '\n')
-            f.write(settings_string)
+        template = '{location: new google.maps.LatLng(%f, %f),weight:%f},\n'
+        for layer in self.heatmap_points.layers:
+            columns = [self.heatmap_points.column(name, layer) for name in ('lat', 'lng', 'weight')]
+            self.write_heatmap_layer(f, format_rows(template, *columns), layer.settings)
+        for source, settings in self.heatmap_sources:
+            # Sources are read chunk by chunk as the output is written.
+            rows = (row for lats, lngs, weights, _ in source for row in format_rows(template, lats, lngs, weights))
+            self.write_heatmap_layer(f, rows, settings)
+
+    def write_heatmap_layer(self, f, rows, settings):
+        f.write('var heatmap_points = [\n')
+        f.writelines(rows)
+        lines = ['];\n']
+        lines.append('\n')
+        lines.append('var pointArray = new google.maps.MVCArray(heatmap_points);' + '\n')
+        lines.append('var heatmap;' + '\n')
+        lines.append('heatmap = new google.maps.visualization.HeatmapLayer({' + '\n')
+        lines.append('\n')
+        lines.append('data: pointArray' + '\n')
+        lines.append('});' + '\n')
+        lines.append('heatmap.setMap(map);' + '\n')
+        lines.append(self._process_heatmap_kwargs(settings))
+        f.write(''.join(lines))
+
+    def write_compact_layers(self, f, encoded=False):
+        ''' writes every layer as one data object, gmplotData, drawn by the
+            COMPACT_RUNTIME loops. Styles are de-duplicated into a single
+            table that layers reference by index.
+        '''
+        self.write_compact_data(f, encoded)
+        self.write_compact_draw(f)
+
+    def write_compact_draw(self, f):
+        f.write('gmplotDraw(map, gmplotData);\n')
 
-    def write_heatmap_from_dictionary(self, f):
-        ''' creates multiple heatmap variables per key provided
-            where the value is an array of point dictionaries.
-            A point dictionary has 3 keys:
-             1. Latitude, 2. Longitude, 3. weight
+    def write_served_layers(self, f, url):
+        ''' makes the map fetch the layers in view from ``url`` (see
+            gmplot.serve) every time it comes to rest.
         '''
-        if not isinstance(self.heatmap_points, dict):
-            raise TypeError('Heatmap Points is not a dictionary.')
-        
-        try:
-            if self.data_external is not True:
-                raise Error('go to exception')
-        except:
-            f.write('var dataPointsByMonth = '+json.dumps(self.heatmap_points, indent=4)+';\n')
-
-        # Generate Heatmaps with indexing that matches range values, in numerical order
-        f.write(self.indent(3)+'var timestamps = Object.keys(dataPointsByMonth).sort((a, b) => Number(a) < Number(b));\n')
-        f.write(self.indent(3)+'for (var i = 0; i < timestamps.length; i++) {\n')
-        f.write(self.indent(4) + 'var monthData = dataPointsByMonth[timestamps[i]];\n')
-        f.write(self.indent(4) + 'var heatmap_points = new Array();\n')
-        f.write('\n')
-        f.write(self.indent(4) + 'for ( var p in monthData ) {\n')
-        f.write(self.indent(5)  +  'var datapt = monthData[p];\n')
-        f.write(self.indent(5)  +  'heatmap_points.push({\n')
-        f.write(self.indent(6)   +   'location: new google.maps.LatLng(datapt.Latitude, datapt.Longitude),\n')
-        f.write(self.indent(6)   +   'weight: datapt.weight\n')
-        f.write(self.indent(5)  +  '})\n')
-        f.write(self.indent(4) + '}\n')
-        f.write('\n')
-        f.write(self.indent(4) + 'var heatmap = new google.maps.visualization.HeatmapLayer({\n')
-        f.write(self.indent(5)   +   'data: new google.maps.MVCArray(heatmap_points)\n')
-        f.write(self.indent(4) + '});\n')
-        f.write(self.settings_string if self.settings_string is not None else '\n')
-        f.write('\n')
-        f.write(self.indent(4) + 'heatmapStorage[i] = { "timestamp": timestamps[i], "kml": heatmap };\n')
-        f.write(self.indent(3)+'}\n')
+        f.write(self.indent(3) + 'gmplotServe(map, %s);\n' % json.dumps(url))
+
+    def write_compact_data(self, f, encoded=False):
+        f.write('var gmplotData = ')
+        self.write_compact_json(f, encoded)
+        f.write(';\n')
+
+    def write_compact_json(self, f, encoded=False):
+        styles = StyleTable()
+        self._mark_drawn()
+        f.write('{\n')
+        if self.gridsetting is not None:
+            self._compute_grids()
+            settings = self._process_kwargs({"color": "#000000"})
+            f.write('"grids": {"style": %d, "coords": [' % styles.index(self._polyline_options, settings))
+            f.writelines(format_array(self.grids[:, :, 0].ravel(), self.grids[:, :, 1].ravel()))
+            f.write(']},\n')
+        if self.clustering:
+            self.write_compact_clusters(f, styles)
+        for kind, store, options, values in self._delta_stores():
+            if kind == 'heatmaps':
+                self.write_compact_heatmaps(f, styles)
+            elif store is not None:
+                self.write_compact_store(f, kind, store, styles, options, values,
+                                         encoded and kind in ('paths', 'shapes'), store.ids)
+        if self.points.layers:
+            f.write('"icons": %s,\n' % self._icon_table(self.points))
+        f.write('"version": %d,\n' % self._version)
+        f.write('"styles": %s\n' % styles.json())
+        f.write('}')
+
+    def write_compact_clusters(self, f, styles):
+        if not self.points.layers:
+            return
+        zooms = range(self.clustering['min_zoom'], self.clustering['max_zoom'] + 1)
+        levels = [LayerStore(columns=('count',)) for zoom in zooms]
+        for layer in self.points.layers:
+            clusters = cluster_levels(self.points.column('lat', layer), self.points.column('lng', layer),
+                                      **self.clustering)
+            for zoom, level in zip(zooms, levels):
+                lats, lngs, counts = clusters[zoom]
+                level.add(layer.settings, lat=lats, lng=lngs, count=counts)
+
+        f.write('"clusters": {"minZoom": %d, "levels": [\n' % zooms[0])
+        for level in levels:
+            self.write_compact_object(f, level, styles, self._point_options, 'count')
+            f.write(',\n')
+        self.write_compact_object(f, self.points, styles, self._point_options)
+        f.write(']},\n')
+
+    def write_compact_heatmaps(self, f, styles):
+        store = self.heatmap_points
+        if isinstance(store, dict):
+            return
+        if not self.heatmap_sources:
+            self.write_compact_store(f, 'heatmaps', store, styles, self._heatmap_options, 'weight', ids=store.ids)
+            return
+        # Sources are read once for the coordinates, counting their points,
+        # and once more for the weights; the layers come last, once counted.
+        layers = [[layer.stop - layer.start, styles.index(self._heatmap_options, layer.settings)]
+                  for layer in store.layers]
+        sources = [styles.index(self._heatmap_options, settings) for _, settings in self.heatmap_sources]
+        counts = []
+
+        def records():
+            yield json.dumps(layers + [[count, style] for count, style in zip(counts, sources)], separators=(',', ':'))
+
+        f.write('"heatmaps": {"coords": [')
+        f.writelines(self._heatmap_array(('lat', 'lng'), counts))
+        f.write('], "values": [')
+        f.writelines(self._heatmap_array(('weight',)))
+        f.write('], "layers": ')
+        f.writelines(records())
+        f.write('},\n')
+
+    def _heatmap_array(self, names, counts=None):
+        '''Yield the heatmap columns ``names`` as the body of one flat array,
+        the in-memory layers first, then every source read chunk by chunk,
+        appending the number of points of each source to ``counts``.
+        '''
+        store, separator = self.heatmap_points, ''
+        if store.size:
+            for text in format_array(*[store.column(name) for name in names]):
+                yield text
+            separator = ','
+        for source, _ in self.heatmap_sources:
+            count = 0
+            for lats, lngs, weights, _ in source:
+                columns = {'lat': lats, 'lng': lngs, 'weight': weights}
+                if len(lats):
+                    yield separator
+                    for text in format_array(*[columns[name] for name in names]):
+                        yield text
+                    separator = ','
+                count += len(lats)
+            if counts is not None:
+                counts.append(count)
+
+    def write_compact_store(self, f, name, store, styles, options, values=None, encoded=False, ids=None):
+        if not store.layers:
+            return
+        f.write('"%s": ' % name)
+        self.write_compact_object(f, store, styles, options, values, encoded, ids)
+        f.write(',\n')
+
+    def write_compact_object(self, f, store, styles, options, values=None, encoded=False, ids=None):
+        layers = []
+        for layer in store.layers:
+            record = [layer.stop - layer.start, styles.index(options, layer.settings)]
+            if 'symbol' in layer.settings:
+                if layer.settings['symbol'] not in SYMBOLS:
+                    raise InvalidSymbolError("Symbol %s is not implemented" % layer.settings['symbol'])
+                record.append(layer.settings['symbol'])
+            if layer.settings.get('zooms'):
+                record.append(list(layer.settings['zooms']))
+            if 'time' in layer.settings:
+                record.append(layer.settings['time'])
+            layers.append(record)
+
+        f.write('{"layers": %s, ' % json.dumps(layers, separators=(',', ':')))
+        if ids is not None:
+            f.write('"ids": %s, ' % json.dumps(ids, separators=(',', ':')))
+        if encoded:
+            stops = [layer.stop for layer in store.layers]
+            f.write('"encoded": %s}' % json.dumps(encode_polylines(store.column('lat'), store.column('lng'), stops)))
+            return
+        f.write('"coords": [')
+        f.writelines(format_array(store.column('lat'), store.column('lng')))
+        if values is not None:
+            f.write('], "values": [')
+            f.writelines(format_array(store.column(values)))
+        f.write(']}')
+
+    def _delta_stores(self):
+        '''
+        :return: list of (kind, store, options, values) tuples of the layers
+            that deltas update, ``store`` being None for clustered markers and
+            timeline dicts, which are not
+        '''
+        heatmaps = None if isinstance(self.heatmap_points, dict) else self.heatmap_points
+        return [('points', None if self.clustering else self.points, self._point_options, None),
+                ('paths', self.paths, self._polyline_options, None),
+                ('circles', self.circles, self._circle_options, 'radius'),
+                ('symbols', self.symbols, self._circle_options, 'size'),
+                ('shapes', self.shapes, self._polygon_options, None),
+                ('heatmaps', heatmaps, self._heatmap_options, 'weight')]
+
+    def _layer_state(self):
+        '''
+        :return: dict of the number of rows of each layer, by id, per kind of
+            layer, along with what deltas cannot update
+        '''
+        def rows(store):
+            return dict((key, layer.stop - layer.start) for key, layer in zip(store.ids, store.layers))
+
+        state = {'clusters': self.clustering and rows(self.points), 'heatmap_sources': len(self.heatmap_sources)}
+        for kind, store, _, _ in self._delta_stores():
+            if store is not None:
+                state[kind] = rows(store)
+        return state
+
+    def _spatial_index(self, name):
+        store = getattr(self, name)
+        index = self._indexes.get(name)
+        if index is None or index.store is not store:
+            index = self._indexes[name] = StoreIndex(store)
+        return index
+
+    def _view(self, crop):
+        if crop is None or crop is False:
+            return self
+        return self.crop(self.viewport() if crop is True else crop)
+
+    def viewport(self, width=VIEWPORT_SIZE[0], height=VIEWPORT_SIZE[1]):
+        '''
+        :param width: width of the map, in pixels
+        :param height: height of the map, in pixels
+        :return: (south, west, north, east) bounds of the map when it opens,
+            around its center at its zoom level
+        '''
+        return viewport_bounds(self.center[0], self.center[1], self.zoom, width, height)
+
+    def query(self, name, bbox=None, near=None):
+        '''
+        Find what was plotted in an area, using a spatial index of the layers
+        built on the first query and kept up to date as they change.
+
+        :param name: kind of layer: 'points' (markers), 'circles',
+            'symbols', 'heatmap_points' or 'heatmap_slices' (timelines), of
+            which the rows in the area are returned, or 'paths' or 'shapes'
+            (polygons), of which the whole layers crossing it are returned
+        :param bbox: (south, west, north, east) bounds of the area
+        :param near: (lat, lng, radius in meters) circle of the area
+        :return: store of the same class as ``getattr(self, name)``
+        '''
+        if (bbox is None) == (near is None):
+            raise ValueError("Expected one of bbox and near")
+        if name not in ROW_LAYERS + PATH_LAYERS:
+            raise ValueError("Unknown layer '%s', expected one of %s" % (name, ', '.join(ROW_LAYERS + PATH_LAYERS)))
+        index = self._spatial_index(name)
+        if name in ROW_LAYERS:
+            return index.rows(bbox) if near is None else index.rows_near(*near)
+        return index.layers(bbox) if near is None else index.layers_near(*near)
+
+    def crop(self, bbox, zoom=None):
+        '''
+        :param bbox: (south, west, north, east) bounds, crossing the
+            antimeridian when west is greater than east
+        :param zoom: zoom level the map is shown at, if known: levels of
+            detail of paths and polygons, and clusters, of other zoom levels
+            are then left out
+        :return: copy of the plotter holding only the rows of markers,
+            circles, symbols and heatmaps inside ``bbox``, and the paths and
+            polygons crossing it
+        '''
+        cropped = copy.copy(self)
+        cropped._indexes = {}
+        for name in ROW_LAYERS:
+            if not isinstance(getattr(self, name), dict):
+                setattr(cropped, name, self._spatial_index(name).rows(bbox))
+        for name in PATH_LAYERS:
+            setattr(cropped, name, self._spatial_index(name).layers(bbox, zoom))
+        cropped.heatmap_sources = [(BoundedSource(source, bbox), settings) for source, settings in self.heatmap_sources]
+        if self.clustering and zoom is not None:
+            # Only the clusters of the zoom level shown are needed.
+            zoom = max(zoom, self.clustering['min_zoom'])
+            cropped.clustering = None if zoom > self.clustering['max_zoom'] else \
+                dict(self.clustering, min_zoom=zoom, max_zoom=zoom)
+        return cropped
+
+    def _mark_drawn(self):
+        state = self._layer_state()
+        if state != self._drawn:
+            self._version += 1
+            self._drawn = state
+
+    def write_delta(self, f, encoded=False):
+        if self._drawn is None:
+            raise ValueError("A delta needs a map drawn with compact=True to compare to")
+        state = self._layer_state()
+        for key in ('clusters', 'heatmap_sources'):
+            if state[key] != self._drawn[key]:
+                raise ValueError("Clustered markers and heatmap sources cannot be updated by a delta, "
+                                 "expected the map to be drawn again")
+        if self.heatmap_sources and state.get('heatmaps') != self._drawn.get('heatmaps'):
+            raise ValueError("Heatmaps drawn along with heatmap sources cannot be updated by a delta, "
+                             "expected the map to be drawn again")
+
+        styles, removed = StyleTable(), {}
+        f.write('{"from": %d, "to": %d,\n' % (self._version, self._version + 1))
+        for kind, store, options, values in self._delta_stores():
+            if store is None:
+                continue
+            removed[kind], added = layer_changes(store, self._drawn[kind])
+            if added.layers:
+                self.write_compact_store(f, kind, added, styles, options, values,
+                                         encoded and kind in ('paths', 'shapes'), added.ids)
+                if kind == 'points':
+                    f.write('"icons": %s,\n' % self._icon_table(added))
+        f.write('"remove": %s,\n' % json.dumps(dict((kind, ids) for kind, ids in removed.items() if ids),
+                                                  sort_keys=True))
+        f.write('"styles": %s}\n' % styles.json())
+        self._version += 1
+        self._drawn = state
+
+    def _icon_url(self, color):
+        '''
+        :param color: hex code of a color, without the '#'
+        :return: data URI of the marker icon of ``color``, or its URL after
+            ``coloricon`` when set to the URLs of other icons
+        '''
+        if self.coloricon == MARKER_ICONS:
+            return icon_data_uri(color)
+        return self.coloricon % color
+
+    def _point_options(self, settings):
+        # The icon is named by its color, in the icon table of the document.
+        return {'icon': settings['color'][1:], 'title': settings['title']}
+
+    def _icon_table(self, store):
+        '''
+        :return: JSON text of the URLs of the icons of the markers of
+            ``store`` by color, which compact styles name their icon by
+        '''
+        colors = set(layer.settings['color'][1:] for layer in store.layers)
+        return json.dumps(dict((color, self._icon_url(color)) for color in colors), sort_keys=True)
+
+    def _polyline_options(self, settings):
+        return {'strokeColor': settings.get('color') or settings.get('edge_color'),
+                'strokeOpacity': settings.get('edge_alpha'),
+                'strokeWeight': int(settings.get('edge_width'))}
+
+    def _polygon_options(self, settings):
+        return {'strokeColor': settings.get('edge_color') or settings.get('color'),
+                'strokeOpacity': settings.get('edge_alpha'),
+                'strokeWeight': int(settings.get('edge_width')),
+                'fillColor': settings.get('face_color') or settings.get('color'),
+                'fillOpacity': settings.get('face_alpha')}
+
+    def _circle_options(self, settings):
+        return {'strokeColor': settings.get('color') or settings.get('edge_color'),
+                'strokeOpacity': settings.get('edge_alpha'),
+                'strokeWeight': settings.get('edge_width'),
+                'fillColor': settings.get('face_color'),
+                'fillOpacity': settings.get('face_alpha')}
+
+    def _heatmap_options(self, settings):
+        options = dict((key, settings[key]) for key in
+                       ('threshold', 'radius', 'maxIntensity', 'opacity', 'dissipating'))
+        if settings['gradient']:
+            options['gradient'] = ['rgba(%d, %d, %d, %d)' % tuple(color) for color in settings['gradient']]
+        return options
+
+    def _has_timeline(self):
+        if isinstance(self.heatmap_points, dict):
+            return bool(self.heatmap_points)
+        return bool(self.heatmap_slices.layers)
 
-    def write_ground_overlay(self, f):
+    def _timeline_store(self):
+        '''
+        :return: the LayerStore of the time slices, one layer per slice.
+            Timelines set up by assigning ``heatmap_points`` a dict of
+            ``{timestamp in ms: [{"Latitude":, "Longitude":, "weight":}]}``
+            are converted, as daily slices.
+        '''
+        if not isinstance(self.heatmap_points, dict):
+            return self.heatmap_slices
+        store = LayerStore(columns=('weight',))
+        settings = self._heatmap_settings()
+        settings['date_length'] = DATE_LENGTHS['D']
+        for timestamp in sorted(self.heatmap_points, key=float):
+            points = self.heatmap_points[timestamp]
+            store.add(dict(settings, time=int(float(timestamp))), lat=[point['Latitude'] for point in points],
+                      lng=[point['Longitude'] for point in points], weight=[point['weight'] for point in points])
+        return store
+
+    def _timeline_times(self):
+        return sorted(set(layer.settings['time'] for layer in self._timeline_store().layers))
+
+    def write_live_updates(self, f):
+        f.write(self.indent(3) + 'gmplotPoll(map, %s, %d);\n' % (json.dumps(self.live['url']),
+                                                                 self.live['interval'] * 1000))
+
+    def write_timeline(self, f, data=True):
+        ''' draws the heatmap of the time slice picked with the timeline
+            slider. The slices are written once, as flat arrays (unless data
+            is false, when they are loaded from the data script), and a
+            slice's heatmap is only built when it is picked.
+        '''
+        if data:
+            self.write_timeline_data(f)
+        f.write(self.indent(3) + 'gmplotTimeline(map, gmplotTimelineData);\n')
+
+    def write_timeline_data(self, f):
+        store, styles = self._timeline_store(), StyleTable()
+        f.write('var gmplotTimelineData = {"slices": ')
+        self.write_compact_object(f, store, styles, self._heatmap_options, 'weight')
+        date_length = max([layer.settings['date_length'] for layer in store.layers] or [DATE_LENGTHS['D']])
+        f.write(', "dateLength": %d, "styles": %s};\n' % (date_length, styles.json()))
+
+    def write_ground_overlay(self, f, image_urls=None):
+        '''
+        :param image_urls: dict of the URLs of raster images by their id,
+            those of the images written for this draw; other images are
+            embedded as data URIs
+        '''
         for url, bounds_string in self.ground_overlays:
+            if isinstance(url, RasterImage):
+                url = (image_urls or {}).get(id(url)) or url.data_uri()
             f.write(bounds_string)
             f.write('var groundOverlay;' + '\n')
             f.write('groundOverlay = new google.maps.GroundOverlay(' + '\n')
@@ -516,79 +1559,53 @@ class GoogleMapPlotter(object):
             f.write('imageBounds);' + '\n')
             f.write('groundOverlay.setMap(map);' + '\n')
 
+    def write_tile_layers(self, f):
+        for url, min_zoom, max_zoom, box, opacity in self.tile_layers:
+            f.write(self.indent(3) + 'map.overlayMapTypes.push(new google.maps.ImageMapType({\n')
+            f.write(self.indent(4) + 'getTileUrl: function(coord, zoom) {\n')
+            f.write(self.indent(5) + 'var tiles = 1 << zoom, x = (coord.x %% tiles + tiles) %% tiles, box = %s;\n'
+                    % json.dumps(box))
+            f.write(self.indent(5) + 'if (zoom < %d || zoom > %d || x < Math.floor(box[0] * tiles) || '
+                    'coord.y < Math.floor(box[1] * tiles) || x > Math.floor(box[2] * tiles) || '
+                    'coord.y > Math.floor(box[3] * tiles)) return null;\n' % (min_zoom, max_zoom))
+            f.write(self.indent(5) + 'return %s.replace("{z}", zoom).replace("{x}", x).replace("{y}", coord.y);\n'
+                    % json.dumps(url))
+            f.write(self.indent(4) + '},\n')
+            f.write(self.indent(4) + 'tileSize: new google.maps.Size(256, 256),\n')
+            f.write(self.indent(4) + 'opacity: %s\n' % opacity)
+            f.write(self.indent(3) + '}));\n')
+
     def write_global_vars(self, f):
         f.write(self.indent(2)+'var googleMap;\n')
-        f.write(self.indent(2)+'var heatmapStorage = [];\n')
-        f.write(self.indent(2)+'var currentHeatMap;\n')
-
-    def write_final_initialization(self, f):
-        '''
-        '''
-        # Finally set the initial heatmap visual by automatically calling event propogation
-        f.write(self.indent(3)+'var timelineElement = document.getElementById("timeline-date-selector");\n')
-        # Set event handler
-        f.write(self.indent(3)+'timelineElement.addEventListener("input", onTimelineInputChange);\n')
-        # default
-        f.write(self.indent(3)+'timelineElement.value = Math.floor(heatmapStorage.length / 2)\n')
-        # create input event
-        f.write(self.indent(3)+'timelineElement.dispatchEvent(\n')
-        f.write(self.indent(4) + 'new Event("input", {\n')
-        f.write(self.indent(5)  +  '"bubbles": true,\n')
-        f.write(self.indent(5)  +  '"cancelable": true\n')
-        f.write(self.indent(4) + '})\n')
-        f.write(self.indent(3)+');\n')
 
     def write_timeline_element(self, f):
         '''
         '''
-        if not isinstance(self.heatmap_points, dict):
+        if not self._has_timeline():
             return()
 
+        times = self._timeline_times()
         f.write(self.indent(1)+'<div style="text-align: center; padding: 0.5em 1em;">\n')
-        f.write(self.indent(2)+'<div style="font-weight: bold;" id="timeline-selected-date">Feb 1, 1980</div>\n')
+        f.write(self.indent(2)+'<div style="font-weight: bold;" id="timeline-selected-date"></div>\n')
         f.write(self.indent(2)+'<input id="timeline-date-selector"\n')
         f.write(self.indent(3) + 'type="range"\n')
         f.write(self.indent(3) + 'min="0"\n')
-        f.write(self.indent(3) + 'max="{0}"\n'.format(len(self.heatmap_points.keys())-1))
+        f.write(self.indent(3) + 'max="{0}"\n'.format(len(times)-1))
         f.write(self.indent(3) + 'step="1"\n')
         f.write(self.indent(3) + 'list="timelineTickmarks"\n')
         f.write(self.indent(3) + 'style="width:100%; display:block;"\n')
         f.write(self.indent(2)+'/>\n')
         f.write(self.indent(2)+'<datalist id="timelineTickmarks" style="display: inline-flex;">\n')
-        t = 0
-        while t < len(self.heatmap_points.keys()):
+        for t, timestamp in enumerate(times):
             if t % 120 == 0:
-                timestamp = list(self.heatmap_points.keys())[t]
-                f.write(self.indent(3)+'<option value="{0}" label="{1}"></option>\n'.format(t, datetime.datetime.fromtimestamp(int(float(timestamp))/1000).strftime('%Y')))
+                year = str(np.datetime64(timestamp, 'ms').astype('datetime64[Y]'))
+                f.write(self.indent(3)+'<option value="{0}" label="{1}"></option>\n'.format(t, year))
             elif t % 12 == 0:
                 f.write(self.indent(3)+'<option value="{0}"></option>\n'.format(t))
-            else:
-                pass
-            t += 1
-        
+
         f.write(self.indent(2)+'</datalist>\n')
         f.write(self.indent()+'</div>\n')
 
-    def write_event_handlers(self, f):
-        '''
-        '''
-        f.write(self.indent()+'<script type="text/javascript">\n')
-        f.write(self.indent(2)+'function onTimelineInputChange(e) {\n')
-        f.write(self.indent(3) + 'changeHeatMap(e);\n')
-        f.write(self.indent(3) + 'updateSelectedDate(e);\n')
-        f.write(self.indent(2)+'}\n')
-        f.write(self.indent(2)+'function updateSelectedDate(e) {\n')
-        f.write(self.indent(3) + 'var dateDisplay = document.getElementById("timeline-selected-date");\n')
-        f.write(self.indent(3) + 'var dateObj = new Date(Number(heatmapStorage[Number(e.target.value)].timestamp));\n')
-        f.write(self.indent(3) + 'dateDisplay.innerText = dateObj.toDateString().replace(/^[^ ]*[ ]/, "").replace(/^([A-Za-z]* [0-9]+) ([0-9]{4})$/,"$1, $2");\n')
-        f.write(self.indent(2)+'}\n')
-        f.write(self.indent(2)+'function changeHeatMap(e) {\n')
-        f.write(self.indent(3) + 'if (currentHeatMap != null) currentHeatMap.setMap();		    // Reset previous map reference\n')
-        f.write(self.indent(3) + 'currentHeatMap = heatmapStorage[Number(e.target.value)].kml;	// Change to new heatmap\n')
-        f.write(self.indent(3) + 'currentHeatMap.setMap(googleMap);								// apply to Maps window\n')
-        f.write(self.indent(2)+'}\n')
-        f.write(self.indent()+'</script>\n')
-
 if __name__ == "__main__":
 
     mymap = GoogleMapPlotter(37.428, -122.145, 16)
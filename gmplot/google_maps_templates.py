@@ -1,102 +1,294 @@
 EARTH_RADIUS = 6378.8  # in KM
 
 
-CIRCLE = """
-var center = new google.maps.LatLng({lat}, {long});
-var radius = {size};
-var circle = new google.maps.Circle({{
-    strokeColor: '{strokeColor}',
-    strokeOpacity: {strokeOpacity},
-    strokeWeight: {strokeWeight},
-    fillColor: '{fillColor}',
-    fillOpacity: {fillOpacity},
-    map: map,
-    center: center,
-    radius: radius
-  }});
+SYMBOLS = ('o', 'x', '+')
 
-circle.setMap(map);
-
-"""
-
-# FIXME: This generate a Xmark in cartesian frame rather than in lat/long.
-XMARK = """
-
-var lat = {lat};
-var long = {long};
-var delta = {size}/1000.0/%s/Math.sqrt(2);
-var dLat = delta * 180.0/Math.PI; 
-var dLon = delta * 180.0/Math.PI / Math.cos(Math.PI*lat/180);
-
-var coords = [
-    new google.maps.LatLng(lat - dLat, long - dLon),
-    new google.maps.LatLng(lat + dLat, long + dLon)
-];
-var linePath = new google.maps.Polyline({{
-    path: coords,
-    geodesic: true,
-    strokeColor: '{strokeColor}',
-    strokeOpacity: {strokeOpacity},
-    strokeWeight: {strokeWeight},
-}});
-linePath.setMap(map);
-
-var coords = [
-    new google.maps.LatLng(lat - dLat, long + dLon),
-    new google.maps.LatLng(lat + dLat, long - dLon)
-];
-var linePath = new google.maps.Polyline({{
-    path: coords,
-    geodesic: true,
-    strokeColor: '{strokeColor}',
-    strokeOpacity: {strokeOpacity},
-    strokeWeight: {strokeWeight},
-}});
-linePath.setMap(map);
-
-""" % EARTH_RADIUS
-
-
-# FIXME: This generate a Xmark in cartesian frame rather than in lat/long.
-CROSS = """
-
-var lat = {lat};
-var long = {long};
-var delta = {size}/1000.0/%s;
-var dLat = delta * 180.0/Math.PI; 
-var dLon = delta * 180.0/Math.PI / Math.cos(Math.PI*lat/180);
-
-var coords = [
-    new google.maps.LatLng(lat, long - dLon),
-    new google.maps.LatLng(lat, long + dLon)
-];
-var linePath = new google.maps.Polyline({{
-    path: coords,
-    geodesic: true,
-    strokeColor: '{strokeColor}',
-    strokeOpacity: {strokeOpacity},
-    strokeWeight: {strokeWeight},
-}});
-linePath.setMap(map);
-
-var coords = [
-    new google.maps.LatLng(lat - dLat, long),
-    new google.maps.LatLng(lat + dLat, long)
-];
-var linePath = new google.maps.Polyline({{
-    path: coords,
-    geodesic: true,
-    strokeColor: '{strokeColor}',
-    strokeOpacity: {strokeOpacity},
-    strokeWeight: {strokeWeight},
-}});
-linePath.setMap(map);
-
-""" % EARTH_RADIUS
 
+# Factories of the objects of the default output, emitted once per document:
+# objects take their options from the document's table of styles, merged by
+# gmplotOptions, and each symbol or circle costs a single gmplotSymbol call
+# with its parameters. A 'o' symbol is a circle of radius size, in meters;
+# 'x' and '+' are pairs of segments of length about 2 * size. Grid lines are
+# drawn by a single gmplotGrid loop over the coordinates of their ends.
+# FIXME: 'x' and '+' are drawn in a cartesian frame rather than in lat/long.
+FACTORY_RUNTIME = """
+function gmplotOptions(style, options) {
+    for (var key in style) options[key] = style[key];
+    return options;
+}
+function gmplotSegment(map, style, lat0, lng0, lat1, lng1) {
+    return new google.maps.Polyline(gmplotOptions(style, {
+        map: map, geodesic: true,
+        path: [new google.maps.LatLng(lat0, lng0), new google.maps.LatLng(lat1, lng1)]
+    }));
+}
+function gmplotGrid(map, style, coords) {
+    var lines = [];
+    for (var i = 0; i + 3 < coords.length; i += 4) {
+        lines.push(new google.maps.Polyline(gmplotOptions(style, {
+            map: map, clickable: false, geodesic: true,
+            path: [new google.maps.LatLng(coords[i], coords[i + 1]), new google.maps.LatLng(coords[i + 2], coords[i + 3])]
+        })));
+    }
+    return lines;
+}
+function gmplotSymbol(map, style, symbol, lat, lng, size) {
+    if (symbol == 'o') {
+        return [new google.maps.Circle(gmplotOptions(style, {
+            map: map, center: new google.maps.LatLng(lat, lng), radius: size
+        }))];
+    }
+    var delta = size / 1000.0 / %(earth_radius)s;
+    if (symbol == 'x') delta /= Math.sqrt(2);
+    var dLat = delta * 180.0 / Math.PI;
+    var dLon = dLat / Math.cos(Math.PI * lat / 180);
+    if (symbol == 'x') {
+        return [gmplotSegment(map, style, lat - dLat, lng - dLon, lat + dLat, lng + dLon),
+                gmplotSegment(map, style, lat - dLat, lng + dLon, lat + dLat, lng - dLon)];
+    }
+    return [gmplotSegment(map, style, lat, lng - dLon, lat, lng + dLon),
+            gmplotSegment(map, style, lat - dLat, lng, lat + dLat, lng)];
+}
+""" % {'earth_radius': EARTH_RADIUS}
 
 
-SYMBOLS = {'o': CIRCLE,
-           'x': XMARK,
-           '+': CROSS,
+# Runtime for the compact output of GoogleMapPlotter.draw(compact=True).
+# Every layer kind is shipped as {"layers": [[count, style(, symbol)], ...],
+# "coords": [lat, lng, ...](, "values": [...])}, where style indexes the
+# shared "styles" table of Maps options objects; the loops below build the
+# Maps objects from those arrays. Grid lines come as {"style": style,
+# "coords": [lat0, lng0, lat1, lng1, ...]}, the ends of each line.
+# Clustered markers come as one layer object per zoom level, of which only
+# the visible part of the current level is shown. Marker styles name their
+# icon by color, in an "icons" table holding each icon once. The objects
+# drawn are kept per kind and layer in map.gmplotLayers, for deltas (see
+# GoogleMapPlotter.delta) to update.
+COMPACT_RUNTIME = FACTORY_RUNTIME + """
+function gmplotLatLng(coords, i) {
+    return new google.maps.LatLng(coords[2 * i], coords[2 * i + 1]);
 }
+function gmplotPath(coords, start, count) {
+    var path = new Array(count);
+    for (var i = 0; i < count; i++) path[i] = gmplotLatLng(coords, start + i);
+    return path;
+}
+function gmplotLayerPath(data, l, start, count) {
+    if (data.encoded) return google.maps.geometry.encoding.decodePath(data.encoded[l]);
+    return gmplotPath(data.coords, start, count);
+}
+function gmplotEachLayer(data, styles, draw) {
+    if (!data) return;
+    var start = 0;
+    for (var l = 0; l < data.layers.length; l++) {
+        var layer = data.layers[l];
+        draw(start, layer[0], styles[layer[1]], layer[2], l);
+        start += layer[0];
+    }
+}
+function gmplotZoomRange(map, overlay, zooms) {
+    function show() {
+        var zoom = map.getZoom();
+        overlay.setMap(zoom >= zooms[0] && zoom <= zooms[1] ? map : null);
+    }
+    overlay.gmplotListener = map.addListener('zoom_changed', show);
+    show();
+}
+function gmplotClusters(map, data, styles) {
+    var markers = [];
+    function show() {
+        var level = data.levels[Math.min(Math.max(map.getZoom() - data.minZoom, 0), data.levels.length - 1)];
+        var bounds = map.getBounds();
+        var south = -90, north = 90, west = -180, east = 180;
+        if (bounds) {
+            south = bounds.getSouthWest().lat(); west = bounds.getSouthWest().lng();
+            north = bounds.getNorthEast().lat(); east = bounds.getNorthEast().lng();
+        }
+        for (var m = 0; m < markers.length; m++) markers[m].setMap(null);
+        markers = [];
+        gmplotEachLayer(level, styles, function(start, count, style) {
+            for (var i = start; i < start + count; i++) {
+                var lat = level.coords[2 * i], lng = level.coords[2 * i + 1];
+                if (lat < south || lat > north) continue;
+                if (west <= east ? (lng < west || lng > east) : (lng < west && lng > east)) continue;
+                var options = gmplotOptions(style, {map: map, position: new google.maps.LatLng(lat, lng)});
+                if (level.values && level.values[i] > 1) options.label = String(level.values[i]);
+                markers.push(new google.maps.Marker(options));
+            }
+        });
+    }
+    // Stands for the markers shown, to be taken off the map as one object.
+    return {
+        gmplotListener: map.addListener('idle', show),
+        setMap: function() {
+            for (var m = 0; m < markers.length; m++) markers[m].setMap(null);
+        }
+    };
+}
+// One function per kind of layer, drawing a layer and returning its objects.
+var gmplotDrawers = {
+    points: function(map, data, style, start, count) {
+        var objects = [];
+        for (var i = start; i < start + count; i++) {
+            objects.push(new google.maps.Marker(gmplotOptions(style, {map: map, position: gmplotLatLng(data.coords, i)})));
+        }
+        return objects;
+    },
+    paths: function(map, data, style, start, count, zooms, l) {
+        var line = new google.maps.Polyline(gmplotOptions(style, {
+            map: map, clickable: false, geodesic: true, path: gmplotLayerPath(data, l, start, count)
+        }));
+        if (zooms) gmplotZoomRange(map, line, zooms);
+        return [line];
+    },
+    circles: function(map, data, style, start, count) {
+        var objects = [];
+        for (var i = start; i < start + count; i++) {
+            objects.push(new google.maps.Circle(gmplotOptions(style, {
+                map: map, center: gmplotLatLng(data.coords, i), radius: data.values[i]
+            })));
+        }
+        return objects;
+    },
+    symbols: function(map, data, style, start, count, symbol) {
+        var objects = [];
+        for (var i = start; i < start + count; i++) {
+            objects.push.apply(objects, gmplotSymbol(map, style, symbol, data.coords[2 * i], data.coords[2 * i + 1], data.values[i]));
+        }
+        return objects;
+    },
+    shapes: function(map, data, style, start, count, zooms, l) {
+        var shape = new google.maps.Polygon(gmplotOptions(style, {
+            map: map, clickable: false, geodesic: true, paths: gmplotLayerPath(data, l, start, count)
+        }));
+        if (zooms) gmplotZoomRange(map, shape, zooms);
+        return [shape];
+    },
+    heatmaps: function(map, data, style, start, count) {
+        return [gmplotHeatmap(map, data, style, start, count)];
+    }
+};
+// Draws the layers of data with the drawer of kind, adding the objects of
+// each layer to layers, under the id of the layer.
+function gmplotDrawLayers(map, kind, data, styles, layers) {
+    gmplotEachLayer(data, styles, function(start, count, style, extra, l) {
+        var id = data.ids ? data.ids[l] : l;
+        layers[id] = (layers[id] || []).concat(gmplotDrawers[kind](map, data, style, start, count, extra, l));
+    });
+}
+// Returns the styles of data, the icons of marker styles being named by
+// color in the "icons" table of data, which holds each icon once.
+function gmplotIconStyles(data) {
+    for (var s = 0; s < data.styles.length; s++) {
+        var style = data.styles[s];
+        if (data.icons && data.icons.hasOwnProperty(style.icon)) style.icon = data.icons[style.icon];
+    }
+    return data.styles;
+}
+function gmplotDraw(map, data) {
+    var styles = gmplotIconStyles(data);
+    map.gmplotLayers = {};
+    map.gmplotVersion = data.version;
+    map.gmplotLayers.grids = data.grids ? {0: gmplotGrid(map, styles[data.grids.style], data.grids.coords)} : {};
+    if (data.clusters) map.gmplotLayers.clusters = {0: [gmplotClusters(map, data.clusters, styles)]};
+    for (var kind in gmplotDrawers) {
+        map.gmplotLayers[kind] = {};
+        gmplotDrawLayers(map, kind, data[kind], styles, map.gmplotLayers[kind]);
+    }
+}
+// Applies a delta of GoogleMapPlotter.delta() to a map drawn from the data
+// it was computed against: the objects of removed layers are taken off the
+// map, and the rows added drawn, as new layers or added to their layer.
+// Returns false, leaving the map as it is, when the delta does not follow
+// the data the map shows.
+function gmplotApplyDelta(map, delta) {
+    if (delta.from !== map.gmplotVersion) return false;
+    var styles = gmplotIconStyles(delta);
+    for (var kind in gmplotDrawers) {
+        var remove = delta.remove[kind] || [], layers = map.gmplotLayers[kind];
+        for (var r = 0; r < remove.length; r++) {
+            gmplotRemove(layers[remove[r]] || []);
+            delete layers[remove[r]];
+        }
+        gmplotDrawLayers(map, kind, delta[kind], styles, layers);
+    }
+    map.gmplotVersion = delta.to;
+    return true;
+}
+function gmplotRemove(objects) {
+    for (var o = 0; o < objects.length; o++) {
+        if (objects[o].gmplotListener) google.maps.event.removeListener(objects[o].gmplotListener);
+        objects[o].setMap(null);
+    }
+}
+// Takes every object drawn by gmplotDraw off the map.
+function gmplotClear(map) {
+    for (var kind in map.gmplotLayers) {
+        for (var id in map.gmplotLayers[kind]) gmplotRemove(map.gmplotLayers[kind][id]);
+    }
+    map.gmplotLayers = {};
+}
+// Draws the layers in view, fetched from url for the bounds and zoom level
+// of the map every time it comes to rest, in place of those drawn before.
+function gmplotServe(map, url) {
+    var requests = 0;
+    map.addListener('idle', function() {
+        var request = ++requests, bounds = map.getBounds();
+        var query = '?zoom=' + map.getZoom() + (bounds ? '&bbox=' + bounds.toUrlValue() : '');
+        fetch(url + query).then(function(response) {
+            return response.json();
+        }).then(function(data) {
+            if (request !== requests) return;
+            gmplotClear(map);
+            gmplotDraw(map, data);
+        });
+    });
+}
+// Fetches a delta from url every interval milliseconds and applies it,
+// reloading the page when the map has missed a delta.
+function gmplotPoll(map, url, interval) {
+    setInterval(function() {
+        fetch(url, {cache: 'no-store'}).then(function(response) {
+            return response.json();
+        }).then(function(delta) {
+            if (delta.to !== map.gmplotVersion && !gmplotApplyDelta(map, delta)) window.location.reload();
+        });
+    }, interval);
+}
+function gmplotHeatmap(map, data, style, start, count) {
+    var points = new Array(count);
+    for (var i = 0; i < count; i++) {
+        points[i] = {location: gmplotLatLng(data.coords, start + i), weight: data.values[start + i]};
+    }
+    var heatmap = new google.maps.visualization.HeatmapLayer({data: new google.maps.MVCArray(points)});
+    heatmap.setOptions(style);
+    heatmap.setMap(map);
+    return heatmap;
+}
+function gmplotTimeline(map, data) {
+    var slider = document.getElementById('timeline-date-selector');
+    var label = document.getElementById('timeline-selected-date');
+    var slices = {}, times = [], shown = [];
+    gmplotEachLayer(data.slices, data.styles, function(start, count, style, time) {
+        if (!slices[time]) {
+            slices[time] = [];
+            times.push(time);
+        }
+        slices[time].push([style, start, count]);
+    });
+    times.sort(function(a, b) { return a - b; });
+    function show() {
+        var time = times[slider.value];
+        for (var h = 0; h < shown.length; h++) shown[h].setMap(null);
+        shown = [];
+        for (var s = 0; s < slices[time].length; s++) {
+            var slice = slices[time][s];
+            shown.push(gmplotHeatmap(map, data.slices, slice[0], slice[1], slice[2]));
+        }
+        label.textContent = new Date(time).toISOString().slice(0, data.dateLength);
+    }
+    slider.max = times.length - 1;
+    slider.value = Math.floor(times.length / 2);
+    slider.addEventListener('input', show);
+    show();
+}
+"""
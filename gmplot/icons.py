@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+import base64
+import os
+import re
+import tempfile
+import zlib
+
+import numpy as np
+
+from gmplot.raster import png_bytes
+
+
+# Width and height of the marker icons, in pixels.
+ICON_SIZE = (21, 34)
+
+# The pin of the marker icons shipped in gmplot/markers, as two zlib
+# compressed planes of ICON_SIZE bytes: the shade each pixel scales the
+# color of the icon by (out of 255), and its alpha. The shipped icons are
+# exactly these planes applied to their color.
+PIN = (
+    'eNqt0z9IAlEcB/B3CnmC1hYpnDW0SRQN0RBNDQ22lkRbg4tgDdEgBZ0NRiRKQ0FrDtJUEYFJGDgpibYptLbUEIjSWdzrvfvn'
+    'vd87mvpOxwcO3vt9fw+hPxKKbERCjAjRuopJ6lHBMv8tNnPjN0ys4EEqoo4n2J6MZuN9BvsTFPcwm32KJYAlim2AbYotgC2K'
+    'RYBFikmASYqSwh5J0g56xOCxfqOhss2ePOZAapY9D1tjCr4Z9iHZBrqs6rjGjPlSswe2DemLmDoHOrog+AiLmya4ytXZxJ8i'
+    'hwe4wBe/gDd59CiTDjtSFhxwy2mbZp1wBP1zwjH5UI6F7bRUNSZfXbL2OK1aHalp/QpClqk4q2kCbEiCNtkF2A0ilMIwKTpx'
+    'mCZyKxwqbhHzER3R5fC7CzU4bCAkcygjFOgA6wTIleIA49pEcozljNHlbVYw2/e+DJ6bz5r8zLeJi7Y+Tg27spc02tPLmGLa'
+    'PB88ddsiabgOiqevvucDmCF4B1dkheA2xDGC89w2veMfL4c1/Mrv3T3/ChHK42seM/iMxx28a33/Ap8SZNk='
+)
+
+_SHADE, _ALPHA = np.frombuffer(zlib.decompress(base64.b64decode(PIN)), dtype=np.uint8).reshape(
+    (2, ICON_SIZE[1], ICON_SIZE[0]))
+
+_HEX_COLOR = re.compile(r'#?([0-9a-fA-F]{6}|[0-9a-fA-F]{3})')
+
+
+def color_code(color):
+    '''
+    :param color: hex code of a color, as 'RRGGBB', '#RRGGBB' or '#RGB'
+    :return: the color as 'RRGGBB', in upper case
+    '''
+    match = _HEX_COLOR.fullmatch(color) if isinstance(color, str) else None
+    if match is None:
+        raise ValueError("Expected a hex color code for a marker icon, got %r" % (color,))
+    code = match.group(1).upper()
+    return code if len(code) == 6 else ''.join(digit * 2 for digit in code)
+
+
+def icon_rgba(color):
+    '''
+    :param color: hex code of the color of the icon, as for color_code()
+    :return: (height, width, 4) uint8 RGBA array of the marker icon
+    '''
+    code = color_code(color)
+    rgb = np.array([int(code[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float64)
+    rgba = np.empty(_ALPHA.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.round(_SHADE[..., None] / 255.0 * rgb)
+    rgba[..., 3] = _ALPHA
+    return rgba
+
+
+class IconCache(object):
+    '''
+    Marker icons of any color, made on demand and kept in memory, and on
+    disk under ``directory`` when given, as ``RRGGBB.png`` files.
+
+    :param directory: directory of the PNG files of the icons, made if
+        missing; files already there are read rather than made again
+    '''
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._pngs = {}
+        self._uris = {}
+
+    def png(self, color):
+        '''
+        :return: bytes of the PNG file of the icon of ``color``
+        '''
+        code = color_code(color)
+        data = self._pngs.get(code)
+        if data is None:
+            data = self._pngs[code] = self._load(code)
+        return data
+
+    def data_uri(self, color):
+        '''
+        :return: data URI of the PNG icon of ``color``
+        '''
+        code = color_code(color)
+        uri = self._uris.get(code)
+        if uri is None:
+            uri = self._uris[code] = 'data:image/png;base64,' + base64.b64encode(self.png(code)).decode('ascii')
+        return uri
+
+    def _load(self, code):
+        if self.directory is None:
+            return png_bytes(icon_rgba(code))
+        path = os.path.join(self.directory, '%s.png' % code)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        data = png_bytes(icon_rgba(code))
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        # Written aside and renamed, as other processes may be reading it.
+        handle, temporary = tempfile.mkstemp(suffix='.png', dir=self.directory)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        return data
+
+
+# Cache of the icons of the markers drawn; set its ``directory`` to keep
+# the icons on disk across processes.
+default_cache = IconCache()
+
+
+def icon_data_uri(color):
+    '''
+    :return: data URI of the icon of ``color``, from ``default_cache``
+    '''
+    return default_cache.data_uri(color)
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+
+import cProfile
+import pstats
+import time
+import tracemalloc
+
+from collections import namedtuple
+
+
+StageStats = namedtuple('StageStats', ['name', 'seconds', 'bytes', 'items', 'peak_bytes'])
+
+
+class RenderStats(object):
+    '''
+    Measures of a draw of a map, stage by stage.
+
+    ``stages`` is the list of the StageStats(name, seconds, bytes, items,
+    peak_bytes) of the stages of the draw, in order: the writer of each kind
+    of layer, such as 'write_points' or 'write_compact_layers', between the
+    'head' and the 'tail' of the html document. ``seconds`` is the time spent
+    in the stage, ``bytes`` the size of what it wrote, ``items`` the number
+    of objects it drew (markers, paths, heatmap points...) or None, and
+    ``peak_bytes`` the peak of the memory traced during the stage, or None
+    when memory is not traced.
+
+    ``seconds`` is the wall time of the whole draw, ``paths`` the files
+    written, and ``profile`` the pstats.Stats of the draw when profiled.
+    '''
+
+    def __init__(self):
+        self.stages = []
+        self.seconds = 0.0
+        self.paths = []
+        self.profile = None
+
+    @property
+    def bytes(self):
+        return sum(stage.bytes for stage in self.stages)
+
+    @property
+    def peak_bytes(self):
+        peaks = [stage.peak_bytes for stage in self.stages if stage.peak_bytes is not None]
+        return max(peaks) if peaks else None
+
+    def as_dict(self):
+        '''
+        :return: the measures as a dict of plain values, to serialize as JSON
+        '''
+        return {'seconds': self.seconds, 'bytes': self.bytes, 'peak_bytes': self.peak_bytes,
+                'paths': list(self.paths), 'stages': [stage._asdict() for stage in self.stages]}
+
+    def __repr__(self):
+        return '<RenderStats %d stages, %.3fs, %d bytes>' % (len(self.stages), self.seconds, self.bytes)
+
+
+class Instrument(object):
+    '''
+    Collects the RenderStats of a draw, passed as ``instrument`` to
+    GoogleMapPlotter.draw(), render() or iterdraw().
+
+    The time a stage spends waiting for the consumer of the document (while
+    iterdraw() is suspended, or a file is being written) is not counted.
+
+    :param hook: function called with the StageStats of each stage as soon
+        as it is done, to report it to monitoring
+    :param memory: trace the peak memory of each stage with tracemalloc,
+        which slows the draw down
+    :param profile: profile the draw with cProfile
+    '''
+
+    def __init__(self, hook=None, memory=False, profile=False):
+        self.hook = hook
+        self.memory = memory
+        self.profile = profile
+        self.stats = RenderStats()
+        self._profiler = None
+        self._tracing = False
+        self._start = self._clock = self._paused = None
+        self._bytes = 0
+
+    def start(self):
+        self.stats = RenderStats()
+        self._start = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.begin()
+
+    def finish(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self.stats.profile = pstats.Stats(self._profiler)
+            self._profiler = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.stats.seconds = time.perf_counter() - self._start
+
+    def begin(self):
+        '''
+        Start measuring a stage.
+        '''
+        self._bytes = 0
+        if self.memory:
+            tracemalloc.reset_peak()
+        self._clock = time.perf_counter()
+
+    def pause(self):
+        self._paused = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def resume(self):
+        if self._profiler is not None:
+            self._profiler.enable()
+        self._clock += time.perf_counter() - self._paused
+
+    def count(self, text):
+        '''
+        Count ``text`` as written by the current stage, as UTF-8.
+        '''
+        self._bytes += len(text) if text.isascii() else len(text.encode('utf-8'))
+
+    def end(self, name, items=None, size=None):
+        '''
+        Record the current stage as ``name``, and start measuring the next.
+
+        :param size: bytes written by the stage, when not counted by count()
+        '''
+        seconds = time.perf_counter() - self._clock
+        peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+        stage = StageStats(name, seconds, self._bytes if size is None else size, items, peak)
+        self.stats.stages.append(stage)
+        if self.hook is not None:
+            self.hook(stage)
+        self.begin()
@@ -0,0 +1,204 @@
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+import numpy as np
+
+
+Layer = namedtuple('Layer', ['start', 'stop', 'settings'])
+
+
+def as_column(values):
+    '''
+    :param values: NumPy array, pandas Series, list, tuple, iterator or scalar
+    :return: 1-D float64 array. Inputs that already are float64 arrays (or
+        Series backed by one) are returned as views, without a copy.
+    '''
+    if not hasattr(values, '__len__') and hasattr(values, '__iter__'):
+        values = list(values)
+    return np.asarray(values, dtype=np.float64).reshape(-1)
+
+
+def as_coords(path):
+    '''
+    :param path: (n, 2) array or sequence of (lat, lng) pairs
+    :return: (n, 2) float64 array of the pairs
+    '''
+    if not hasattr(path, '__len__'):
+        path = list(path)
+    return np.asarray(path, dtype=np.float64).reshape(-1, 2)
+
+
+class LayerStore(object):
+    '''
+    Columnar storage for map layers.
+
+    Rows of every layer live in contiguous float64 columns (``lat``, ``lng``
+    and any extra columns such as ``weight`` or ``radius``) which grow
+    geometrically, so adding a layer costs one bulk copy per column rather
+    than one Python object per point. Each layer is a ``Layer`` record of the
+    row slice it occupies and its style settings.
+
+    Iterating over the store yields ``(coords, settings)`` pairs, where
+    ``coords`` is an (n, 2) array of lat/lng pairs, like the lists of tuples
+    the plotter used to keep.
+
+    Every layer also gets an id, in ``ids``, which stays the same as layers
+    before it are removed and as it is extended by merging, and every change
+    to the store bumps its ``revision``.
+    '''
+
+    def __init__(self, columns=()):
+        self.columns = ('lat', 'lng') + tuple(columns)
+        self.layers = []
+        self.ids = []
+        self.revision = 0
+        self._next_id = 0
+        self._size = 0
+        self._data = dict((name, np.empty(0)) for name in self.columns)
+
+    def add(self, settings, merge=False, **columns):
+        '''
+        :param settings: style settings shared by every row of the layer
+        :param merge: extend the last layer instead of starting a new one
+            when its settings are equal to ``settings``
+        :param columns: one sequence (or scalar, broadcast to the layer
+            length) per column of the store
+        :return: the ``Layer`` the rows were added to
+        '''
+        values = [as_column(columns[name]) for name in self.columns]
+        lengths = [len(value) for value in values]
+        # Scalars broadcast to empty columns too, making an empty layer.
+        n = 0 if 0 in lengths else max(lengths)
+        for name, value in zip(self.columns, values):
+            if len(value) not in (1, n):
+                raise ValueError("Column '%s' has %d values, expected %d" % (name, len(value), n))
+
+        self._reserve(n)
+        self.revision += 1
+        start, stop = self._size, self._size + n
+        for name, value in zip(self.columns, values):
+            self._data[name][start:stop] = value
+        self._size = stop
+
+        last = self.layers[-1] if self.layers else None
+        if merge and last is not None and last.stop == start and last.settings == settings:
+            self.layers[-1] = Layer(last.start, stop, last.settings)
+        else:
+            self.layers.append(Layer(start, stop, settings))
+            self.ids.append(self._next_id)
+            self._next_id += 1
+        return self.layers[-1]
+
+    def remove(self, layer):
+        '''
+        Remove ``layer`` and its rows, moving the rows of the layers after it
+        down in place.
+        '''
+        index = self.layers.index(layer)
+        n = layer.stop - layer.start
+        for name in self.columns:
+            column = self._data[name]
+            column[layer.start:self._size - n] = column[layer.stop:self._size]
+        self._size -= n
+        self.revision += 1
+        del self.layers[index], self.ids[index]
+        self.layers[index:] = [Layer(later.start - n, later.stop - n, later.settings) for later in self.layers[index:]]
+
+    def clear(self):
+        '''
+        Remove every layer.
+        '''
+        self.layers, self.ids, self._size = [], [], 0
+        self.revision += 1
+
+    def _reserve(self, n):
+        capacity = len(self._data['lat'])
+        if self._size + n <= capacity:
+            return
+        capacity = max(2 * capacity, self._size + n, 16)
+        for name in self.columns:
+            column = np.empty(capacity)
+            column[:self._size] = self._data[name][:self._size]
+            self._data[name] = column
+
+    def column(self, name, layer=None):
+        '''
+        :return: view of column ``name``, restricted to ``layer`` if given.
+        '''
+        data = self._data[name][:self._size]
+        if layer is None:
+            return data
+        return data[layer.start:layer.stop]
+
+    def rows(self, layer):
+        '''
+        :return: iterator of tuples of the column values of each row of ``layer``.
+        '''
+        return zip(*(self.column(name, layer).tolist() for name in self.columns))
+
+    def coords(self, layer):
+        '''
+        :return: (n, 2) array of the lat/lng pairs of ``layer``.
+        '''
+        return np.column_stack((self.column('lat', layer), self.column('lng', layer)))
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self.layers)
+
+    def __iter__(self):
+        for layer in self.layers:
+            yield self.coords(layer), layer.settings
+
+
+def layer_changes(store, drawn):
+    '''
+    Compare a store to the layers it had when it was drawn.
+
+    :param drawn: dict of the number of rows of each layer drawn, by id
+    :return: (removed, added) where ``removed`` is the sorted list of the ids
+        of the layers removed since, and ``added`` a LayerStore of the rows
+        added since, one layer per new or extended layer, whose ``ids`` are
+        those of the layers of ``store`` the rows belong to
+    '''
+    removed = sorted(set(drawn) - set(store.ids))
+    added = LayerStore(columns=store.columns[2:])
+    for key, layer in zip(store.ids, store.layers):
+        rows = Layer(layer.start + drawn.get(key, 0), layer.stop, layer.settings)
+        if rows.start < rows.stop:
+            added.add(layer.settings, **dict((name, store.column(name, rows)) for name in store.columns))
+            added.ids[-1] = key
+    return removed, added
+
+
+class PointStore(LayerStore):
+    '''
+    ``LayerStore`` for markers, indexed by row.
+
+    Consecutive markers sharing a color and title are merged into one layer,
+    while indexing and iteration return ``(lat, lng, color, title)`` tuples
+    with the color as a hex string without the leading ``#``.
+    '''
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('point index out of range')
+        for layer in self.layers:
+            if layer.start <= index < layer.stop:
+                return (self._data['lat'][index], self._data['lng'][index],
+                        layer.settings['color'][1:], layer.settings['title'])
+
+    def __iter__(self):
+        for layer in self.layers:
+            color, title = layer.settings['color'][1:], layer.settings['title']
+            for lat, lng in zip(self.column('lat', layer).tolist(), self.column('lng', layer).tolist()):
+                yield lat, lng, color, title
@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+from gmplot.layers import as_column
+
+
+def _chunk_counts(values):
+    '''Number of 5-bit chunks needed to write each non-negative value.'''
+    counts = np.ones(len(values), dtype=np.int64)
+    rest = values >> 5
+    while rest.any():
+        counts += rest > 0
+        rest >>= 5
+    return counts
+
+
+def encode_polylines(lats, lngs, stops, precision=5):
+    '''
+    Encode several paths with Google's encoded polyline algorithm.
+
+    All the vertices are encoded at once: coordinates are rounded to
+    integers, turned into deltas from the previous vertex of their path,
+    zig-zag encoded and split into 5-bit chunks in one array, whose
+    characters are then cut into one string per path.
+
+    :param lats: latitudes of the vertices of every path, one after the other
+    :param lngs: longitudes of the vertices of every path
+    :param stops: index past the last vertex of each path
+    :param precision: number of decimals kept. The Maps JavaScript API
+        decodes with the default of 5 (about a meter).
+    :return: list of the encoded strings, one per path
+    '''
+    lats, lngs = as_column(lats), as_column(lngs)
+    stops = np.asarray(stops, dtype=np.int64).reshape(-1)
+    coords = np.column_stack((lats, lngs)) * 10 ** precision
+    values = (np.sign(coords) * np.floor(np.abs(coords) + 0.5)).astype(np.int64)
+
+    starts = np.r_[0, stops[:-1]]
+    deltas = np.diff(values, axis=0, prepend=0)
+    first = starts[starts < len(values)]
+    deltas[first] = values[first]
+    deltas = deltas.reshape(-1)
+    deltas = (deltas << 1) ^ (deltas >> 63)
+
+    counts = _chunk_counts(deltas)
+    width = int(counts.max()) if len(counts) else 1
+    shifts = 5 * np.arange(width)
+    chunks = (deltas[:, None] >> shifts) & 31
+    chunks |= np.where(np.arange(width) < counts[:, None] - 1, 0x20, 0)
+    text = (chunks[np.arange(width) < counts[:, None]] + 63).astype(np.uint8).tobytes().decode('ascii')
+
+    offsets = np.r_[0, np.cumsum(counts)][2 * np.r_[starts, stops[-1:]]]
+    return [text[start:stop] for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def encode_polyline(lats, lngs, precision=5):
+    '''
+    :return: the path as a string in Google's encoded polyline format
+    '''
+    return encode_polylines(lats, lngs, [len(as_column(lats))], precision)[0]
+
+
+def decode_polyline(text, precision=5):
+    '''
+    Decode a string in Google's encoded polyline format.
+
+    :return: (lats, lngs) arrays of the vertices
+    '''
+    if not text:
+        return np.empty(0), np.empty(0)
+    chunks = np.frombuffer(text.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if chunks.size and chunks[-1] & 0x20:
+        raise ValueError('Truncated encoded polyline')
+    last = (chunks & 0x20) == 0
+    value = np.cumsum(np.r_[0, last[:-1]])
+    position = np.arange(len(chunks)) - np.r_[0, np.flatnonzero(last) + 1][value]
+    values = np.bincount(value, weights=(chunks & 31) << (5 * position)).astype(np.int64)
+    values = (values >> 1) ^ -(values & 1)
+    if len(values) % 2:
+        raise ValueError('Encoded polyline has an odd number of values')
+    coords = np.cumsum(values.reshape(-1, 2), axis=0) / float(10 ** precision)
+    return coords[:, 0], coords[:, 1]
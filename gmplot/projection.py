@@ -0,0 +1,81 @@
+from __future__ import absolute_import
+
+import math
+
+import numpy as np
+
+from gmplot.layers import as_column
+
+
+TILE_SIZE = 256
+MAX_LATITUDE = 85.0511287798
+EARTH_CIRCUMFERENCE = 40075016.686  # in meters, at the equator
+EARTH_RADIUS = EARTH_CIRCUMFERENCE / (2 * math.pi)
+
+
+def world_coordinates(lats, lngs):
+    '''
+    Project latitudes and longitudes to Web Mercator world coordinates, as
+    used by Google Maps: x grows eastwards and y southwards, both from 0 to 1
+    over the whole map.
+
+    :return: (x, y) arrays
+    '''
+    lats = np.clip(as_column(lats), -MAX_LATITUDE, MAX_LATITUDE)
+    lngs = as_column(lngs)
+    x = (lngs + 180.0) / 360.0
+    sin = np.sin(np.radians(lats))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return x, y
+
+
+def latlng(x, y):
+    '''
+    Inverse of world_coordinates.
+
+    :return: (lats, lngs) arrays
+    '''
+    x, y = as_column(x), as_column(y)
+    return np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y)))), x * 360.0 - 180.0
+
+
+def distances(lat, lng, lats, lngs):
+    '''
+    :return: great-circle distances, in meters, from (lat, lng) to each of
+        the points (haversine formula, on a sphere of the equatorial radius)
+    '''
+    lat, lng = math.radians(lat), math.radians(lng)
+    lats, lngs = np.radians(as_column(lats)), np.radians(as_column(lngs))
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def viewport_bounds(lat, lng, zoom, width, height):
+    '''
+    :param width: width of the map, in pixels
+    :param height: height of the map, in pixels
+    :return: (south, west, north, east) bounds of a map of that size
+        centered on (lat, lng) at ``zoom``
+    '''
+    size = float(TILE_SIZE * 2 ** zoom)
+    x, y = world_coordinates(lat, lng)
+    north, south = latlng([0, 0], np.clip([y[0] - height / 2.0 / size, y[0] + height / 2.0 / size], 0, 1))[0].tolist()
+    if width >= size:
+        return south, -180.0, north, 180.0
+    span = width / 2.0 * 360.0 / size
+    west, east = (lng - span + 180.0) % 360.0 - 180.0, (lng + span + 180.0) % 360.0 - 180.0
+    return south, west, north, east
+
+
+def meters_per_pixel(lat, zoom):
+    '''
+    :return: ground size of a screen pixel at latitude ``lat`` and ``zoom``.
+    '''
+    return EARTH_CIRCUMFERENCE * math.cos(math.radians(lat)) / (TILE_SIZE * 2 ** zoom)
+
+
+def degrees_per_pixel(zoom):
+    '''
+    :return: longitude span of a screen pixel at ``zoom``.
+    '''
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+from gmplot.colors import colormap
+from gmplot.layers import as_column
+from gmplot.projection import TILE_SIZE, latlng, world_coordinates
+
+
+SCALES = {
+    'linear': lambda values: values,
+    'sqrt': np.sqrt,
+    'log': np.log1p,
+}
+
+
+def sample_path(x, y, scale):
+    '''
+    Sample a path about once per pixel along each of its segments.
+
+    :param x: world x coordinates of the vertices of the path
+    :param y: world y coordinates of the vertices of the path
+    :param scale: size of the world, in pixels
+    :return: (x, y) arrays of world coordinates of the samples
+    '''
+    if len(x) < 2:
+        return x, y
+    dx, dy = np.diff(x), np.diff(y)
+    samples = np.maximum(np.ceil(np.hypot(dx, dy) * scale), 1).astype(np.int64)
+    segment = np.repeat(np.arange(len(dx)), samples)
+    fraction = (np.arange(samples.sum()) - np.repeat(np.cumsum(samples) - samples, samples)) / samples[segment]
+    return np.r_[x[segment] + dx[segment] * fraction, x[-1]], np.r_[y[segment] + dy[segment] * fraction, y[-1]]
+
+
+def scaling(scale):
+    '''
+    :param scale: 'linear', 'sqrt' or 'log'
+    :return: function scaling an array of densities
+    '''
+    if scale not in SCALES:
+        raise ValueError("Unknown scale '%s', expected one of %s" % (scale, ', '.join(sorted(SCALES))))
+    return SCALES[scale]
+
+
+def shade(density, colors='hot', scale='log', vmax=None, opacity=0.8):
+    '''
+    :param density: 2D array of densities
+    :param colors: colormap, as for gmplot.colors.colormap()
+    :param scale: 'linear', 'sqrt' or 'log' scaling of the density before it
+        is mapped to colors
+    :param vmax: density mapped to the last color, by default the highest
+        density; pixels without density are transparent
+    :param opacity: opacity of the pixels with some density
+    :return: (height, width, 4) uint8 RGBA array
+    '''
+    scaled = scaling(scale)
+    table = colors if isinstance(colors, np.ndarray) else colormap(colors)
+    high = scaled(float(vmax if vmax is not None else density.max()))
+    # Only the pixels with some density are shaded, the others being transparent.
+    filled = density > 0
+    levels = scaled(density[filled]) / high if high > 0 else np.zeros(np.count_nonzero(filled))
+    index = np.clip(levels * (len(table) - 1), 0, len(table) - 1).round().astype(np.int64)
+    rgba = np.zeros(density.shape + (4,), dtype=np.uint8)
+    rgba[filled, :3] = table[index]
+    rgba[filled, 3] = int(round(opacity * 255))
+    return rgba
+
+
+class Raster(object):
+    '''
+    Grid of pixels laid over the map in Web Mercator, such that each pixel is
+    a pixel of the map at ``zoom``.
+
+    :param bounds: (south, west, north, east) bounds of the raster
+    :param zoom: zoom level the pixels are sized for
+    :param max_size: largest width or height of the raster, in pixels: when
+        ``bounds`` would span more pixels at ``zoom``, pixels are larger
+    '''
+
+    def __init__(self, bounds, zoom, max_size=2048):
+        south, west, north, east = bounds
+        if not (south < north and west < east):
+            raise ValueError("Expected bounds of positive size, got %r" % (bounds,))
+        (self.left, self.right), (self.bottom, self.top) = world_coordinates([south, north], [west, east])
+        self.scale = TILE_SIZE * 2 ** zoom
+        spans = max(self.right - self.left, self.bottom - self.top) * self.scale
+        if spans > max_size:
+            self.scale *= max_size / spans
+        self.width = max(int(np.ceil((self.right - self.left) * self.scale)), 1)
+        self.height = max(int(np.ceil((self.bottom - self.top) * self.scale)), 1)
+        self.density = np.zeros((self.height, self.width))
+
+    @property
+    def bounds(self):
+        '''
+        :return: (south, west, north, east) bounds of the pixels of the
+            raster, which cover the bounds it was made for
+        '''
+        lats, lngs = latlng([self.left, self.left + self.width / self.scale],
+                            [self.top + self.height / self.scale, self.top])
+        return lats[0], lngs[0], lats[1], lngs[1]
+
+    def add_points(self, lats, lngs, weights=1):
+        '''
+        Add the weights of points to the density of the pixels they fall in.
+        Points outside the raster are left out.
+        '''
+        return self._add(*world_coordinates(lats, lngs), weights=weights)
+
+    def _add(self, x, y, weights=1):
+        weights = np.broadcast_to(as_column(weights), x.shape)
+        column = np.floor((x - self.left) * self.scale).astype(np.int64)
+        row = np.floor((y - self.top) * self.scale).astype(np.int64)
+        inside = (column >= 0) & (column < self.width) & (row >= 0) & (row < self.height)
+        self.density += np.bincount(row[inside] * self.width + column[inside], weights[inside],
+                                    self.width * self.height).reshape(self.height, self.width)
+        return self
+
+    def add_path(self, lats, lngs, weight=1):
+        '''
+        Add a path, sampled about once per pixel along each of its segments,
+        each sample weighing ``weight``.
+        '''
+        x, y = world_coordinates(lats, lngs)
+        return self._add(*sample_path(x, y, self.scale), weights=weight)
+
+    def image(self, colors='hot', scale='log', vmax=None, opacity=0.8):
+        '''
+        :return: (height, width, 4) uint8 RGBA array of the density, shaded
+            as by shade()
+        '''
+        return shade(self.density, colors, scale, vmax, opacity)
+
+
+def png_bytes(rgba):
+    '''
+    Encode an image as PNG, with zlib and struct alone.
+
+    :param rgba: (height, width, 4) uint8 array
+    :return: bytes of the PNG file
+    '''
+    height, width = rgba.shape[:2]
+    # Every row starts with its filter type, 0 (none).
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) + chunk(b'IEND', b''))
+
+
+class RasterImage(object):
+    '''
+    PNG image of a raster, drawn as a ground overlay. The image is written
+    next to the html file when the map is drawn to a file, and embedded as a
+    data URI otherwise.
+    '''
+
+    def __init__(self, rgba):
+        self.rgba = rgba
+
+    def png(self):
+        return png_bytes(self.rgba)
+
+    def data_uri(self):
+        return 'data:image/png;base64,' + base64.b64encode(self.png()).decode('ascii')
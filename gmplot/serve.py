@@ -0,0 +1,190 @@
+from __future__ import absolute_import
+
+import copy
+import gzip
+import hashlib
+import io
+import re
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+DATA_PATH = '/data.json'
+
+# Responses shorter than this are not worth compressing.
+MIN_GZIP_SIZE = 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_viewport(query):
+    '''
+    :param query: query string, such as ``bbox=37.1,-122.5,37.9,-121.8&zoom=11``,
+        ``bbox`` being south,west,north,east as by LatLngBounds.toUrlValue()
+    :return: (bbox, zoom) tuple, each None when missing
+    '''
+    params = parse_qs(query)
+    try:
+        bbox = [float(value) for value in params['bbox'][0].split(',')] if 'bbox' in params else None
+        zoom = int(params['zoom'][0]) if 'zoom' in params else None
+    except ValueError:
+        raise BadRequest("Expected bbox=south,west,north,east and an integer zoom, got %r" % query)
+    if bbox is not None and len(bbox) != 4:
+        raise BadRequest("Expected bbox=south,west,north,east, got %r" % query)
+    if bbox is not None and not (all(-90 <= lat <= 90 for lat in bbox[::2]) and
+                                 all(-180 <= lng <= 180 for lng in bbox[1::2])):
+        raise BadRequest("Expected latitudes in [-90, 90] and longitudes in [-180, 180], got %r" % query)
+    return bbox, zoom
+
+
+def parse_range(header, size):
+    '''
+    :param header: value of a Range header, of a single byte range
+    :return: (start, stop) of the bytes requested, or None when the header
+        is not a single byte range, which is then answered in full
+    '''
+    match = re.match(r'^bytes=(\d*)-(\d*)$', header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        return max(size - int(end), 0), size
+    return int(start), min(int(end) + 1, size) if end else size
+
+
+class MapRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Serves the map of ``server.gmap``: the html page at ``/``, which fetches
+    the layers in view from ``/data.json?bbox=...&zoom=...`` as the map
+    moves. Responses carry an ETag, are compressed with gzip when the client
+    accepts it, and byte ranges of them can be requested.
+    '''
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def respond(self, body):
+        url = urlsplit(self.path)
+        try:
+            if url.path in ('/', '/index.html'):
+                content, content_type = self.server.page(), 'text/html; charset=utf-8'
+            elif url.path == DATA_PATH:
+                bbox, zoom = parse_viewport(url.query)
+                content, content_type = self.server.data(bbox, zoom), 'application/json'
+            else:
+                self.send_error(404)
+                return
+        except BadRequest as e:
+            self.send_error(400, str(e))
+            return
+        content = content.encode('utf-8')
+
+        headers = {'Content-Type': content_type, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding',
+                   'Accept-Ranges': 'bytes'}
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and len(content) >= MIN_GZIP_SIZE:
+            content = gzip_bytes(content)
+            headers['Content-Encoding'] = 'gzip'
+        headers['ETag'] = '"%s"' % hashlib.sha1(content).hexdigest()
+        if headers['ETag'] in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', headers['ETag'])
+            self.end_headers()
+            return
+
+        status, requested = 200, parse_range(self.headers.get('Range', ''), len(content))
+        if requested is not None:
+            start, stop = requested
+            if start >= stop:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % len(content))
+                self.end_headers()
+                return
+            status, headers['Content-Range'] = 206, 'bytes %d-%d/%d' % (start, stop - 1, len(content))
+            content = content[start:stop]
+        headers['Content-Length'] = str(len(content))
+
+        self.send_response(status)
+        for name in sorted(headers):
+            self.send_header(name, headers[name])
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def gzip_bytes(content):
+    # mtime=0 keeps the output, and so its ETag, the same from one request to the next.
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+        f.write(content)
+    return buffer.getvalue()
+
+
+class MapServer(ThreadingHTTPServer):
+    '''
+    HTTP server of a GoogleMapPlotter's map, see MapRequestHandler.
+
+    :param gmap: the GoogleMapPlotter to serve. Layers added to it while it
+        is served show up as the map is moved.
+    :param address: (host, port) to listen on; port 0 picks a free port
+    :param encoded: send paths and polygons as encoded polylines
+    :param quiet: do not log requests
+    '''
+
+    def __init__(self, gmap, address=('127.0.0.1', 8000), encoded=False, quiet=False):
+        ThreadingHTTPServer.__init__(self, address, MapRequestHandler)
+        self.gmap = gmap
+        self.encoded = encoded
+        self.quiet = quiet
+
+    def page(self):
+        '''
+        :return: html page of the map, without its layers
+        '''
+        return ''.join(self.gmap._chunks(lambda f: self.gmap._write_document(
+            f, compact=True, encoded=self.encoded, data_url=DATA_PATH.lstrip('/'))))
+
+    def data(self, bbox=None, zoom=None):
+        '''
+        :param bbox: (south, west, north, east) bounds of the view, or None
+            for every layer
+        :param zoom: zoom level of the view, if known
+        :return: JSON text of the layers in view, in the compact format
+        '''
+        # Writing marks the plotter drawn: write a copy, so that serving
+        # neither moves the version deltas are based on nor races requests.
+        gmap = copy.copy(self.gmap) if bbox is None else self.gmap.crop(bbox, zoom)
+        f = io.StringIO()
+        gmap.write_compact_json(f, self.encoded)
+        return f.getvalue()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+
+
+def serve(gmap, host='127.0.0.1', port=8000, encoded=False, quiet=False):
+    '''
+    Serve the map of ``gmap`` until interrupted, fetching the layers in view
+    of the page as it is moved rather than sending every layer at once.
+
+    :return: after a KeyboardInterrupt
+    '''
+    server = MapServer(gmap, (host, port), encoded, quiet)
+    print("Serving the map at %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
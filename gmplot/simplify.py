@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+import math
+
+import numpy as np
+
+from gmplot.layers import as_column
+from gmplot.projection import EARTH_CIRCUMFERENCE, TILE_SIZE, world_coordinates
+
+
+def _segment_distances(x, y, ax, ay, bx, by):
+    '''Distances from the points (x, y) to the segments (a, b).'''
+    dx, dy = bx - ax, by - ay
+    length = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length > 0, ((x - ax) * dx + (y - ay) * dy) / length, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(x - (ax + t * dx), y - (ay + t * dy))
+
+
+def _runs(groups):
+    '''Start offsets of the runs of equal values in ``groups``.'''
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+
+def douglas_peucker(x, y, tolerance):
+    '''
+    Douglas-Peucker line simplification.
+
+    Rather than recursing segment by segment, every pending segment is split
+    at once in each pass: distances of all their interior points are
+    computed together and the farthest point of each run is kept, so the
+    work is a few array operations per level of the recursion.
+
+    :param x: x coordinates of the vertices
+    :param y: y coordinates of the vertices, in the same unit as ``x``
+    :param tolerance: largest distance a dropped vertex may lie from the
+        simplified line
+    :return: boolean mask of the vertices to keep
+    '''
+    x, y = as_column(x), as_column(y)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[[0, -1][:len(x)]] = True
+    points = np.arange(1, len(x) - 1)
+    while len(points):
+        anchors = np.flatnonzero(keep)
+        segment = np.searchsorted(anchors, points) - 1
+        a, b = anchors[segment], anchors[segment + 1]
+        distance = _segment_distances(x[points], y[points], x[a], y[a], x[b], y[b])
+
+        starts = _runs(segment)
+        run = np.cumsum(np.r_[False, segment[1:] != segment[:-1]])
+        farthest = np.maximum.reduceat(distance, starts)
+        split = (farthest > tolerance)[run]
+        if not split.any():
+            break
+        candidates = np.flatnonzero(split & (distance == farthest[run]))
+        keep[points[candidates[_runs(run[candidates])]]] = True
+        points = points[split & ~keep[points]]
+    return keep
+
+
+def visvalingam(x, y, tolerance):
+    '''
+    Visvalingam-Whyatt line simplification.
+
+    Vertices are dropped in passes: each pass drops, at once, every vertex
+    whose triangle with its neighbours has an area below ``tolerance ** 2``
+    and is smaller than both neighbouring triangles, then areas are
+    recomputed for the vertices left.
+
+    :param x: x coordinates of the vertices
+    :param y: y coordinates of the vertices, in the same unit as ``x``
+    :param tolerance: the area threshold is the square of this length
+    :return: boolean mask of the vertices to keep
+    '''
+    x, y = as_column(x), as_column(y)
+    threshold = tolerance * tolerance
+    kept = np.arange(len(x))
+    while len(kept) > 2:
+        px, py = x[kept], y[kept]
+        area = np.abs((px[:-2] - px[2:]) * (py[1:-1] - py[2:]) - (px[1:-1] - px[2:]) * (py[:-2] - py[2:])) / 2
+        padded = np.r_[np.inf, area, np.inf]
+        # Ties are broken towards the first vertex, so neighbours are never
+        # dropped in the same pass.
+        drop = (area < threshold) & (area < padded[:-2]) & (area <= padded[2:])
+        if not drop.any():
+            break
+        kept = kept[~np.r_[False, drop, False]]
+    keep = np.zeros(len(x), dtype=bool)
+    keep[kept] = True
+    return keep
+
+
+METHODS = {
+    'douglas-peucker': douglas_peucker,
+    'visvalingam': visvalingam,
+}
+
+
+def simplify(lats, lngs, tolerance=1.0, zoom=None, method='douglas-peucker'):
+    '''
+    Simplify a path, dropping the vertices that do not change its shape by
+    more than ``tolerance``.
+
+    The path is simplified in Web Mercator coordinates, as it is drawn.
+
+    :param lats: latitudes of the vertices
+    :param lngs: longitudes of the vertices
+    :param tolerance: in screen pixels at ``zoom`` when a zoom level is
+        given; otherwise in meters on the ground (at the path's mean
+        latitude)
+    :param zoom: zoom level the path will be looked at
+    :param method: 'douglas-peucker' or 'visvalingam'
+    :return: (lats, lngs) arrays of the vertices kept
+    '''
+    try:
+        reducer = METHODS[method]
+    except KeyError:
+        raise ValueError("Unknown simplification method '%s', expected one of %s" % (method, sorted(METHODS)))
+    lats, lngs = as_column(lats), as_column(lngs)
+    if len(lats) < 3:
+        return lats, lngs
+    x, y = world_coordinates(lats, lngs)
+    if zoom is not None:
+        tolerance = tolerance / float(TILE_SIZE * 2 ** zoom)
+    else:
+        tolerance = tolerance / (EARTH_CIRCUMFERENCE * math.cos(math.radians(np.mean(lats))))
+    keep = reducer(x, y, tolerance)
+    return lats[keep], lngs[keep]
+
+
+def simplify_levels(lats, lngs, zooms, tolerance=1.0, method='douglas-peucker'):
+    '''
+    Simplify a path for several zoom levels.
+
+    :param zooms: increasing zoom levels, one per level of detail. The level
+        made for ``zooms[i]`` is meant to be shown from that zoom up to the
+        next one; the first level is also shown below it and the last level
+        up to the deepest zoom (22).
+    :param tolerance: in screen pixels
+    :return: list of (lats, lngs, (min_zoom, max_zoom)) tuples
+    '''
+    zooms = sorted(zooms)
+    ranges = zip([0] + zooms[1:], [zoom - 1 for zoom in zooms[1:]] + [22])
+    return [simplify(lats, lngs, tolerance, zoom, method) + (visible,) for zoom, visible in zip(zooms, ranges)]
@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+
+import csv
+import io
+import itertools
+import os
+
+import numpy as np
+
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
+
+CHUNK_ROWS = 1 << 20
+
+
+def csv_chunks(path, columns, chunk_size=CHUNK_ROWS, delimiter=',', dates=()):
+    '''
+    Read columns of a CSV file, ``chunk_size`` rows at a time.
+
+    :param columns: names of the columns, as in the header row, or their
+        indices. Their values must be numbers.
+    :param dates: those of ``columns`` holding timestamps, either ISO 8601
+        dates and times, such as ``2020-01-05T12:00:00``, or numbers
+    :return: generator of tuples of arrays, one per column: float64 arrays,
+        and datetime64 arrays for the columns of ``dates`` holding dates
+    '''
+    with io.open(path, newline='') as f:
+        header = next(csv.reader([f.readline()], delimiter=delimiter))
+        indices = [column if isinstance(column, int) else header.index(column) for column in columns]
+        dated = [column in dates for column in columns]
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            if not any(dated):
+                data = np.loadtxt(lines, delimiter=delimiter, usecols=indices, ndmin=2, quotechar='"')
+                yield tuple(data.T)
+                continue
+            data = np.loadtxt(lines, delimiter=delimiter, usecols=indices, ndmin=2, quotechar='"', dtype=str)
+            yield tuple(_timestamps(values) if date else values.astype(np.float64)
+                        for values, date in zip(data.T, dated))
+
+
+def _timestamps(values):
+    try:
+        return values.astype(np.float64)
+    except ValueError:
+        return values.astype('datetime64[ms]')
+
+
+def parquet_chunks(path, columns, chunk_size=CHUNK_ROWS):
+    '''
+    Read columns of a Parquet file, ``chunk_size`` rows at a time.
+
+    :return: generator of tuples of arrays, one per column
+    '''
+    if parquet is None:
+        raise ImportError("Reading Parquet files requires the 'pyarrow' package")
+    for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(columns)):
+        yield tuple(batch.column(i).to_numpy(zero_copy_only=False) for i in range(len(columns)))
+
+
+def array_chunks(data, columns, chunk_size=CHUNK_ROWS):
+    '''
+    Slice columns of an array, ``chunk_size`` rows at a time. With a
+    ``numpy.memmap``, only the rows of the current chunk are read from disk.
+
+    :param data: 2-D array (columns are then indices), structured array, or
+        mapping of names to arrays (a dict, a pandas DataFrame...)
+    :return: generator of tuples of arrays, one per column
+    '''
+    if isinstance(data, np.ndarray) and data.dtype.names is None:
+        columns = [data[:, column] for column in columns]
+    else:
+        columns = [data[column] for column in columns]
+    for start in range(0, len(columns[0]), chunk_size):
+        yield tuple(np.asarray(column[start:start + chunk_size]) for column in columns)
+
+
+def read_chunks(source, columns, chunk_size=CHUNK_ROWS, dates=()):
+    '''
+    Read columns from a CSV (``.csv``, ``.tsv``), Parquet (``.parquet``,
+    ``.pq``) or NumPy (``.npy``, memory-mapped) file, or from an array.
+
+    :param dates: columns of timestamps, parsed from CSV files as for
+        csv_chunks()
+    :return: generator of tuples of arrays, one per column
+    '''
+    if hasattr(source, '__fspath__'):
+        source = os.fspath(source)
+    if not isinstance(source, str):
+        return array_chunks(source, columns, chunk_size)
+    extension = os.path.splitext(source)[1].lower()
+    if extension in ('.csv', '.tsv', '.txt'):
+        return csv_chunks(source, columns, chunk_size, '\t' if extension == '.tsv' else ',', dates)
+    if extension in ('.parquet', '.pq'):
+        return parquet_chunks(source, columns, chunk_size)
+    if extension == '.npy':
+        return array_chunks(np.load(source, mmap_mode='r'), columns, chunk_size)
+    raise ValueError("Unknown file type '%s', expected a CSV, Parquet or .npy file" % extension)
+
+
+def as_seconds(values):
+    '''
+    :return: float64 array of seconds since the epoch, from datetime64 values
+        or numbers already in seconds
+    '''
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ms]').astype(np.int64) / 1000.0
+    return values.astype(np.float64)
+
+
+class PointSource(object):
+    '''
+    Weighted points read from a file or array in chunks, so that sources
+    larger than memory can be aggregated or written out piece by piece.
+
+    Iterating over a source reads it again from the start and yields
+    ``(lats, lngs, weights, times)`` tuples of arrays, ``times`` being
+    seconds since the epoch, or None without a ``time`` column.
+
+    :param source: path of a CSV, Parquet or .npy file, or an array (see
+        ``read_chunks``)
+    :param lat: name or index of the latitude column
+    :param lng: name or index of the longitude column
+    :param weight: name or index of the weight column; without one, every
+        point weighs 1
+    :param time: name or index of a column of timestamps
+    :param chunk_size: number of rows per chunk
+    '''
+
+    def __init__(self, source, lat='lat', lng='lng', weight=None, time=None, chunk_size=CHUNK_ROWS):
+        self.source = source
+        self.columns = [column for column in (lat, lng, weight, time) if column is not None]
+        self.weighted = weight is not None
+        self.timed = time is not None
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        dates = self.columns[-1:] if self.timed else ()
+        for chunk in read_chunks(self.source, self.columns, self.chunk_size, dates):
+            lats, lngs = np.asarray(chunk[0], dtype=np.float64), np.asarray(chunk[1], dtype=np.float64)
+            weights = np.asarray(chunk[2], dtype=np.float64) if self.weighted else np.ones(len(lats))
+            times = as_seconds(chunk[-1]) if self.timed else None
+            yield lats, lngs, weights, times
@@ -0,0 +1,278 @@
+from __future__ import absolute_import
+
+import math
+import threading
+
+import numpy as np
+
+from gmplot.layers import as_column
+from gmplot.projection import EARTH_RADIUS, distances
+
+
+POINTS_PER_CELL = 16
+
+
+def _ranges(starts, stops):
+    '''
+    :return: array of the concatenated ranges ``[start, stop)``
+    '''
+    lengths = stops - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def bbox_mask(lats, lngs, bbox):
+    '''
+    :param bbox: (south, west, north, east) bounds, in degrees. With west
+        greater than east, the box crosses the antimeridian.
+    :return: boolean array of the points inside ``bbox``
+    '''
+    south, west, north, east = bbox
+    mask = (lats >= south) & (lats <= north)
+    if west <= east:
+        return mask & (lngs >= west) & (lngs <= east)
+    return mask & ((lngs >= west) | (lngs <= east))
+
+
+def wrap_lngs(west, east):
+    '''
+    :return: (west, east) longitudes brought into [-180, 180], spanning the
+        whole circle when ``west`` is more than 360 degrees west of ``east``
+    '''
+    if east - west >= 360:
+        return -180.0, 180.0
+    if not -180 <= west <= 180:
+        west = (west + 180.0) % 360.0 - 180.0
+    if not -180 <= east <= 180:
+        east = (east + 180.0) % 360.0 - 180.0
+    return west, east
+
+
+def radius_bbox(lat, lng, radius):
+    '''
+    :param radius: radius of a circle around (lat, lng), in meters
+    :return: (south, west, north, east) bounds of the circle
+    '''
+    span = math.degrees(radius / EARTH_RADIUS)
+    south, north = lat - span, lat + span
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    span /= math.cos(math.radians(max(abs(south), abs(north))))
+    if span >= 180:
+        return south, -180.0, north, 180.0
+    return south, (lng - span + 180.0) % 360.0 - 180.0, north, (lng + span + 180.0) % 360.0 - 180.0
+
+
+class GridIndex(object):
+    '''
+    Index of points on a uniform grid of square cells, in degrees.
+
+    Points are sorted by cell, rows of cells first, so that the points of a
+    row of cells crossed by a query are one contiguous slice of the sorted
+    order, found by binary search. The points of the cells crossed are then
+    tested against the query bounds, in one vectorized pass.
+
+    :param lats: latitudes of the points
+    :param lngs: longitudes of the points
+    :param cell_size: size of a cell, in degrees. Defaults to a size holding
+        about ``POINTS_PER_CELL`` points per cell, were they evenly spread.
+    '''
+
+    def __init__(self, lats, lngs, cell_size=None):
+        self.lats, self.lngs = as_column(lats), as_column(lngs)
+        if cell_size is None:
+            cell_size = self._default_cell_size()
+        if not cell_size > 0:
+            raise ValueError("Cell size must be positive, got %r" % cell_size)
+        self.cell_size = float(cell_size)
+        self.width = int(np.ceil(360.0 / self.cell_size)) + 1
+        columns, rows = self.cells(self.lats, self.lngs)
+        keys = rows * self.width + columns
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def _default_cell_size(self):
+        if not len(self.lats):
+            return 1.0
+        extent = max(np.ptp(self.lats), np.ptp(self.lngs))
+        cells = np.ceil(np.sqrt(len(self.lats) / float(POINTS_PER_CELL)))
+        return min(max(extent / cells, 1e-6), 360.0)
+
+    def cells(self, lats, lngs):
+        '''
+        :return: (columns, rows) arrays of the cell of each point
+        '''
+        column = np.floor((np.clip(as_column(lngs), -180, 180) + 180.0) / self.cell_size)
+        row = np.floor((np.clip(as_column(lats), -90, 90) + 90.0) / self.cell_size)
+        return column.astype(np.int64), row.astype(np.int64)
+
+    def bbox(self, south, west, north, east):
+        '''
+        :return: sorted array of the indices of the points inside the bounds,
+            which cross the antimeridian when ``west`` is greater than ``east``.
+            Longitudes beyond [-180, 180] are wrapped into it.
+        '''
+        west, east = wrap_lngs(west, east)
+        if west > east:
+            return np.union1d(self.bbox(south, west, north, 180.0), self.bbox(south, -180.0, north, east))
+        if not len(self.keys) or south > north:
+            return np.empty(0, dtype=np.int64)
+        (left, right), (bottom, top) = self.cells([south, north], [west, east])
+        first, last = self.keys[0] // self.width, self.keys[-1] // self.width
+        rows = np.arange(max(bottom, first), min(top, last) + 1)
+        starts = np.searchsorted(self.keys, rows * self.width + left, 'left')
+        stops = np.searchsorted(self.keys, rows * self.width + right, 'right')
+        candidates = self.order[_ranges(starts, stops)]
+        mask = bbox_mask(self.lats[candidates], self.lngs[candidates], (south, west, north, east))
+        return np.sort(candidates[mask])
+
+    def radius(self, lat, lng, radius):
+        '''
+        :param radius: in meters
+        :return: sorted array of the indices of the points within ``radius``
+            of (lat, lng)
+        '''
+        candidates = self.bbox(*radius_bbox(lat, lng, radius))
+        return candidates[distances(lat, lng, self.lats[candidates], self.lngs[candidates]) <= radius]
+
+    def __len__(self):
+        return len(self.lats)
+
+
+def layer_bounds(store):
+    '''
+    :return: (south, west, north, east) arrays of the bounds of each layer of
+        ``store``, NaN for empty layers
+    '''
+    bounds = np.full((4, len(store.layers)), np.nan)
+    filled = [l for l, layer in enumerate(store.layers) if layer.stop > layer.start]
+    if filled:
+        starts = [store.layers[l].start for l in filled]
+        for row, (name, reducer) in enumerate([('lat', np.minimum), ('lng', np.minimum),
+                                               ('lat', np.maximum), ('lng', np.maximum)]):
+            bounds[row, filled] = reducer.reduceat(store.column(name), starts)
+    return bounds
+
+
+def select_rows(store, indices):
+    '''
+    :param indices: sorted array of row indices of ``store``
+    :return: store of the same class holding the rows, in layers of the same
+        settings and ids
+    '''
+    selected = store.__class__(columns=store.columns[2:])
+    stops = np.array([layer.stop for layer in store.layers], dtype=np.int64)
+    bounds = np.searchsorted(indices, stops)
+    start = 0
+    for key, layer, stop in zip(store.ids, store.layers, bounds.tolist()):
+        if stop > start:
+            rows = indices[start:stop]
+            selected.add(layer.settings, **dict((name, store.column(name)[rows]) for name in store.columns))
+            selected.ids[-1] = key
+        start = stop
+    return selected
+
+
+def select_layers(store, mask):
+    '''
+    :param mask: boolean array, one value per layer of ``store``
+    :return: store of the same class holding the layers selected by
+        ``mask``, with the same ids
+    '''
+    selected = store.__class__(columns=store.columns[2:])
+    for key, layer, keep in zip(store.ids, store.layers, mask):
+        if keep:
+            selected.add(layer.settings, **dict((name, store.column(name, layer)) for name in store.columns))
+            selected.ids[-1] = key
+    return selected
+
+
+def intersects(bounds, bbox):
+    '''
+    :param bounds: (south, west, north, east) arrays, as from layer_bounds
+    :return: boolean array of the bounds that intersect ``bbox``
+    '''
+    south, west, north, east = bbox
+    lat = (bounds[2] >= south) & (bounds[0] <= north)
+    if west <= east:
+        return lat & (bounds[3] >= west) & (bounds[1] <= east)
+    return lat & ((bounds[3] >= west) | (bounds[1] <= east))
+
+
+class BoundedSource(object):
+    '''
+    PointSource whose chunks only keep the points inside ``bbox``.
+    '''
+
+    def __init__(self, source, bbox):
+        self.source = source
+        self.bbox = bbox
+
+    def __iter__(self):
+        for lats, lngs, weights, times in self.source:
+            mask = bbox_mask(lats, lngs, self.bbox)
+            yield lats[mask], lngs[mask], weights[mask], None if times is None else times[mask]
+
+
+class StoreIndex(object):
+    '''
+    Spatial index over a LayerStore: its rows are indexed on a GridIndex, and
+    its layers by their bounds. The index is rebuilt as the store changes.
+
+    Rows are queried for stores of points (markers, circles, heatmaps...),
+    whole layers for stores of paths and polygons.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.revision = None
+        self._lock = threading.Lock()
+
+    def _update(self):
+        with self._lock:
+            if self.revision != self.store.revision:
+                self.grid = GridIndex(self.store.column('lat'), self.store.column('lng'))
+                self.bounds = layer_bounds(self.store)
+                self.revision = self.store.revision
+
+    def rows(self, bbox):
+        '''
+        :param bbox: (south, west, north, east) bounds
+        :return: store of the rows inside ``bbox``
+        '''
+        self._update()
+        return select_rows(self.store, self.grid.bbox(*bbox))
+
+    def layers(self, bbox, zoom=None):
+        '''
+        :return: store of the layers intersecting ``bbox`` and, when
+            ``zoom`` is given, shown at that zoom level
+        '''
+        self._update()
+        mask = intersects(self.bounds, bbox)
+        if zoom is not None:
+            mask &= np.array([not layer.settings.get('zooms') or
+                              layer.settings['zooms'][0] <= zoom <= layer.settings['zooms'][1]
+                              for layer in self.store.layers], dtype=bool)
+        return select_layers(self.store, mask)
+
+    def rows_near(self, lat, lng, radius):
+        '''
+        :param radius: in meters
+        :return: store of the rows within ``radius`` of (lat, lng)
+        '''
+        self._update()
+        return select_rows(self.store, self.grid.radius(lat, lng, radius))
+
+    def layers_near(self, lat, lng, radius):
+        '''
+        :param radius: in meters
+        :return: store of the layers with a vertex within ``radius`` of (lat, lng)
+        '''
+        self._update()
+        mask = intersects(self.bounds, radius_bbox(lat, lng, radius))
+        for l in np.flatnonzero(mask):
+            layer = self.store.layers[l]
+            lats, lngs = self.store.column('lat', layer), self.store.column('lng', layer)
+            mask[l] = distances(lat, lng, lats, lngs).min() <= radius
+        return select_layers(self.store, mask)
@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+
+import json
+
+
+def intern_settings(pool, settings):
+    '''
+    :param pool: dict of the settings interned so far, by their items
+    :return: the settings of ``pool`` equal to ``settings``, which are added
+        to it if missing, so that layers of the same style share one dict.
+        Settings with unhashable values, such as heatmap gradients, are
+        returned as they are.
+    '''
+    try:
+        return pool.setdefault(tuple(sorted(settings.items())), settings)
+    except TypeError:
+        return settings
+
+
+class StyleTable(object):
+    '''
+    Table of the distinct Maps options objects of the layers of a document,
+    which layers refer to by index: layers of the same style share an entry,
+    written once.
+
+    The options of each settings dict are serialized once per table, which
+    keeps the settings it has seen alive so that their ids stay theirs.
+    '''
+
+    def __init__(self):
+        self._indexes = {}
+        self._layers = {}
+
+    def index(self, options, settings):
+        '''
+        :param options: function of the settings of a layer returning its
+            Maps options object, such as GoogleMapPlotter._polyline_options
+        :return: index in the table of the options of ``settings``
+        '''
+        key = (options, id(settings))
+        entry = self._layers.get(key)
+        if entry is None:
+            text = json.dumps(options(settings), sort_keys=True)
+            entry = self._layers[key] = (self._indexes.setdefault(text, len(self._indexes)), settings)
+        return entry[0]
+
+    def json(self):
+        '''
+        :return: JSON text of the array of the options objects, in index order
+        '''
+        return '[%s]' % ','.join(sorted(self._indexes, key=self._indexes.get))
+
+    def __len__(self):
+        return len(self._indexes)
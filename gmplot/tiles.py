@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gmplot import colors, raster
+from gmplot.layers import as_column
+from gmplot.projection import TILE_SIZE, world_coordinates
+
+
+MAX_ZOOM = 22
+
+# Tiles handed to a worker process at a time.
+TILES_PER_TASK = 16
+
+
+def tile_pixels(x, y, weights, zoom):
+    '''
+    Sum the weights of points into the pixels of the tiles at ``zoom``.
+
+    :param x: world x coordinates of the points
+    :param y: world y coordinates of the points
+    :return: (keys, values) arrays of the pixels of positive density, sorted
+        by key. The tile of a pixel is ``keys >> 16``, as ``y * 2 ** zoom + x``,
+        and its position in the tile ``keys & 0xFFFF``, as ``row * 256 + column``.
+    '''
+    tiles = 2 ** zoom
+    size = TILE_SIZE * tiles
+    column = np.floor(x * size).astype(np.int64)
+    row = np.floor(y * size).astype(np.int64)
+    inside = (column >= 0) & (column < size) & (row >= 0) & (row < size)
+    column, row, weights = column[inside], row[inside], weights[inside]
+    keys = ((row // TILE_SIZE * tiles + column // TILE_SIZE) << 16) | (row % TILE_SIZE << 8) | (column % TILE_SIZE)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    values = np.bincount(inverse.reshape(-1), weights, len(keys))
+    positive = values > 0
+    return keys[positive], values[positive]
+
+
+def render_tile(task):
+    '''
+    Write the PNG image of a tile, in a worker process.
+
+    :param task: (path, pixels, values, table, scale, vmax, opacity) tuple,
+        ``pixels`` being the positions in the tile of the pixels of density
+        ``values`` and ``table`` the colormap
+    :return: path of the PNG file written
+    '''
+    path, pixels, values, table, scale, vmax, opacity = task
+    density = np.bincount(pixels, values, TILE_SIZE * TILE_SIZE).reshape(TILE_SIZE, TILE_SIZE)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Made by another worker in the meantime.
+            if not os.path.isdir(directory):
+                raise
+    with open(path, 'wb') as f:
+        f.write(raster.png_bytes(raster.shade(density, table, scale, vmax, opacity)))
+    return path
+
+
+def tile_tasks(directory, x, y, weights, vertices, zoom, table, scale, vmax, opacity):
+    '''
+    :param vertices: list of (x, y) arrays of world coordinates of the
+        vertices of paths
+    :return: list of the render_tile tasks of the tiles holding data at
+        ``zoom``, one per tile
+    '''
+    size = TILE_SIZE * 2 ** zoom
+    samples = [raster.sample_path(path_x, path_y, size) for path_x, path_y in vertices]
+    x = np.concatenate([x] + [sample[0] for sample in samples])
+    y = np.concatenate([y] + [sample[1] for sample in samples])
+    weights = np.concatenate([weights] + [np.ones(len(sample[0])) for sample in samples])
+    keys, values = tile_pixels(x, y, weights, zoom)
+    if not len(keys):
+        return []
+    if vmax is None:
+        vmax = values.max()
+    tiles = keys >> 16
+    bounds = np.r_[0, np.flatnonzero(np.diff(tiles)) + 1, len(keys)]
+    pixels = (keys & 0xFFFF).astype(np.uint16)
+    tasks = []
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        tile_y, tile_x = divmod(int(tiles[start]), 2 ** zoom)
+        path = os.path.join(directory, str(zoom), str(tile_x), '%d.png' % tile_y)
+        tasks.append((path, pixels[start:stop], values[start:stop], table, scale, vmax, opacity))
+    return tasks
+
+
+def write_tiles(directory, lats=(), lngs=(), weights=1, paths=(), zooms=range(0, 13), workers=None,
+                colormap='hot', scale='log', vmax=None, opacity=0.8):
+    '''
+    Write the z/x/y PNG tile pyramid of the density of points and paths, as
+    served to a google.maps.ImageMapType. Tiles without data are not written.
+
+    Colors are scaled to the highest pixel density of each zoom level, so
+    that the tiles of a zoom level match each other.
+
+    :param directory: directory the tiles are written under, as
+        ``directory/z/x/y.png``
+    :param lats: latitudes of the points
+    :param lngs: longitudes of the points
+    :param weights: weight of each point, or a single weight for all
+    :param paths: sequence of (lats, lngs) pairs of paths
+    :param zooms: zoom levels to write the tiles of
+    :param workers: number of worker processes rendering the tiles, by
+        default one per CPU; with 1, tiles are rendered in this process
+    :param colormap: colormap, as for gmplot.colors.colormap()
+    :param scale: 'linear', 'sqrt' or 'log' scaling of the density
+    :param vmax: density of the last color at every zoom level, rather than
+        the highest density of each
+    :param opacity: opacity of the pixels with some density
+    :return: sorted list of the paths of the tiles written
+    '''
+    zooms = sorted(set(int(zoom) for zoom in zooms))
+    if zooms and not (0 <= zooms[0] and zooms[-1] <= MAX_ZOOM):
+        raise ValueError("Expected zoom levels from 0 to %d, got %r" % (MAX_ZOOM, zooms))
+    x, y = world_coordinates(lats, lngs)
+    weights = np.array(np.broadcast_to(as_column(weights), x.shape), dtype=np.float64)
+    vertices = [world_coordinates(path_lats, path_lngs) for path_lats, path_lngs in paths]
+    table = colors.colormap(colormap)
+    raster.scaling(scale)
+
+    written = []
+    if workers == 1:
+        for zoom in zooms:
+            written.extend(render_tile(task) for task in
+                           tile_tasks(directory, x, y, weights, vertices, zoom, table, scale, vmax, opacity))
+        return sorted(written)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for zoom in zooms:
+            tasks = tile_tasks(directory, x, y, weights, vertices, zoom, table, scale, vmax, opacity)
+            written.extend(executor.map(render_tile, tasks, chunksize=TILES_PER_TASK))
+    return sorted(written)
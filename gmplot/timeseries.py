@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+
+import re
+
+import numpy as np
+
+
+UNITS = ('Y', 'M', 'W', 'D', 'h', 'm', 's')
+
+# Length of the ISO 8601 date prefix that identifies a slice of each unit.
+DATE_LENGTHS = {'Y': 4, 'M': 7, 'W': 10, 'D': 10, 'h': 13, 'm': 16, 's': 19}
+
+
+def parse_freq(freq):
+    '''
+    :param freq: length of a time slice, as a NumPy datetime unit with an
+        optional multiple: 'M' (months), '3M', 'W', 'D', '6h', '15m'...
+    :return: (multiple, unit) tuple
+    '''
+    match = re.match(r'^(\d*)([A-Za-z])$', str(freq))
+    if not match or match.group(2) not in UNITS:
+        raise ValueError("Unknown frequency %r, expected a multiple of one of %s" % (freq, ', '.join(UNITS)))
+    return int(match.group(1) or 1), match.group(2)
+
+
+def as_datetimes(timestamps):
+    '''
+    :param timestamps: datetime64 values, datetime objects, ISO 8601 strings
+        or numbers of seconds since the epoch
+    :return: datetime64[ms] array
+    '''
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype.kind in 'iuf':
+        return (timestamps.astype(np.float64) * 1000).astype(np.int64).astype('datetime64[ms]')
+    return timestamps.astype('datetime64[ms]')
+
+
+def time_bins(timestamps, freq='M'):
+    '''
+    Bin timestamps into slices of ``freq``, aligned on the calendar (UTC);
+    weeks start on Mondays.
+
+    :return: (starts, inverse) where ``starts`` is the sorted array of the
+        start of each slice holding timestamps, in milliseconds since the
+        epoch, and ``inverse`` the index in it of the slice of each timestamp
+    '''
+    multiple, unit = parse_freq(freq)
+    times = as_datetimes(timestamps)
+    if unit == 'W':
+        # 1970-01-01 is a Thursday: count weeks from the Monday before.
+        bins = (times.astype('datetime64[D]').astype(np.int64) + 3) // (7 * multiple)
+        starts = bins * 7 * multiple - 3
+        unit = 'D'
+    else:
+        bins = times.astype('datetime64[%s]' % unit).astype(np.int64) // multiple
+        starts = bins * multiple
+    _, index, inverse = np.unique(bins, return_index=True, return_inverse=True)
+    starts = starts[index].astype('datetime64[%s]' % unit).astype('datetime64[ms]').astype(np.int64)
+    return starts, inverse.reshape(-1)
+
+
+def slices(timestamps, freq='M'):
+    '''
+    Group the indices of timestamps by time slice.
+
+    :return: list of (start, indices) tuples in time order, ``start`` in
+        milliseconds since the epoch
+    '''
+    starts, inverse = time_bins(timestamps, freq)
+    order = np.argsort(inverse, kind='stable')
+    stops = np.cumsum(np.bincount(inverse, minlength=len(starts)))
+    return list(zip(starts.tolist(), np.split(order, stops[:-1])))
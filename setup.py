@@ -16,10 +16,15 @@ setup(
     long_description=read('README.rst'),
     license='MIT',
     keywords='python wrapper google maps',
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks']),
     include_package_data=True,
     package_data = {
         'gmplot': ['markers/*.png'],
     },
-    install_requires=['requests'],
+    python_requires='>=3.9',
+    install_requires=['numpy', 'requests'],
+    extras_require={
+        'brotli': ['brotli'],
+        'parquet': ['pyarrow'],
+    },
 )
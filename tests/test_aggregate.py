@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.aggregate import GridAggregator, aggregate_points
+
+
+class TestAggregatePoints(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.lats = 37.7 + rng.normal(scale=0.05, size=20000)
+        self.lngs = -122.4 + rng.normal(scale=0.05, size=20000)
+        self.weights = rng.uniform(0, 2, 20000)
+
+    def test_weights_are_summed_per_cell(self):
+        lats, lngs, weights = aggregate_points([1.1, 1.2, 1.9, -5], [2.1, 2.4, 2.2, 3], [1, 2, 4, 8], cell_size=1)
+        np.testing.assert_allclose([1.4, -5], lats)
+        np.testing.assert_allclose([6.7 / 3, 3], lngs)
+        self.assertEqual([7, 8], weights.tolist())
+
+    def test_points_stay_in_their_cell(self):
+        lats, lngs, weights = aggregate_points(self.lats, self.lngs, self.weights, zoom=8, radius=20)
+        self.assertLess(len(lats), len(self.lats) / 4)
+        self.assertAlmostEqual(self.weights.sum(), weights.sum())
+        aggregator = GridAggregator(5, 8).add(self.lats, self.lngs)
+        columns, rows = aggregator.cells(lats, lngs)
+        np.testing.assert_array_equal(aggregator.keys, (columns << 32) | rows)
+
+    def test_batches_match_a_single_pass(self):
+        aggregator = GridAggregator(0.01)
+        for start in range(0, 20000, 3000):
+            aggregator.add(self.lats[start:start + 3000], self.lngs[start:start + 3000],
+                           self.weights[start:start + 3000])
+        aggregator.add([], [])
+        expected = aggregate_points(self.lats, self.lngs, self.weights, cell_size=0.01)
+        for batched, single in zip(aggregator.result(), expected):
+            np.testing.assert_allclose(single, batched)
+
+    def test_sparse_cells_are_grouped_by_sorting(self):
+        lats, lngs, weights = aggregate_points([-80, 80, 80], [-170, 170, 170], 1, zoom=20, radius=4)
+        self.assertEqual([1, 2], weights.tolist())
+
+    def test_cell_size_is_validated(self):
+        with self.assertRaises(ValueError):
+            GridAggregator(0)
+        with self.assertRaises(ValueError):
+            aggregate_points([1], [2])
+
+
+class TestAggregatedHeatmap(unittest.TestCase):
+
+    def test_heatmap_stores_occupied_cells(self):
+        gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        lats = np.repeat([37.4, 37.5], 500)
+        gmap.heatmap(lats, lats - 160, 0.5, aggregate=True)
+        gmap.heatmap(lats, lats - 160, 0.5, aggregate=1)
+        self.assertEqual([0, 2], [layer.start for layer in gmap.heatmap_points.layers])
+        self.assertEqual([250, 250, 500], gmap.heatmap_points.column('weight').tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
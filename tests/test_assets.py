@@ -0,0 +1,98 @@
+import gzip
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import gmplot
+from gmplot import assets
+
+
+class TestWriteAsset(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hashed_name_depends_on_content(self):
+        path = os.path.join(self.tmpdir, 'data.js')
+        first, = assets.write_asset(path, ['var a', ' = 1;'], hashed=True)
+        second, = assets.write_asset(path, ['var a = 2;'], hashed=True)
+        self.assertRegex(os.path.basename(first), r'^data\.[0-9a-f]{16}\.js$')
+        self.assertNotEqual(first, second)
+        self.assertEqual([first], assets.write_asset(path, ['var a = 1;'], hashed=True))
+
+    def test_gzip_copy_is_reproducible(self):
+        path = os.path.join(self.tmpdir, 'map.html')
+        plain, compressed = assets.write_asset(path, [u'<html>é</html>'], compress=('gzip',))
+        with open(compressed, 'rb') as f:
+            first = f.read()
+        self.assertEqual(u'<html>é</html>'.encode('utf-8'), gzip.decompress(first))
+        assets.compress_file(plain, 'gzip')
+        with open(compressed, 'rb') as f:
+            self.assertEqual(first, f.read())
+
+    @unittest.skipUnless(assets.brotli, 'brotli is not installed')
+    def test_brotli_copy(self):
+        plain, compressed = assets.write_asset(os.path.join(self.tmpdir, 'a.js'), ['x' * 100000], compress='br')
+        with open(compressed, 'rb') as f:
+            self.assertEqual(b'x' * 100000, assets.brotli.decompress(f.read()))
+
+    def test_failed_write_leaves_no_file(self):
+        def chunks():
+            yield 'var a'
+            raise RuntimeError('drawing failed')
+
+        path = os.path.join(self.tmpdir, 'data.js')
+        with self.assertRaises(RuntimeError):
+            assets.write_asset(path, chunks())
+        self.assertEqual([], os.listdir(self.tmpdir))
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            assets.write_asset(os.path.join(self.tmpdir, 'a.js'), [], compress=('zip',))
+
+
+class TestExternalDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.gmap = gmplot.GoogleMapPlotter(0, 0, 3)
+        self.gmap.scatter([1, 2], [3, 4], 'r')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_data_goes_to_referenced_script(self):
+        path = os.path.join(self.tmpdir, 'map.html')
+        written = self.gmap.draw(path, external=True, compress='gzip', hashed=True)
+        html, html_gz, data, data_gz = written
+        self.assertEqual(path, html)
+        self.assertEqual(data + '.gz', data_gz)
+        with open(html) as f:
+            page = f.read()
+        with open(data) as f:
+            script = f.read()
+        self.assertIn('src="%s"' % os.path.basename(data), page)
+        self.assertNotIn('var gmplotData', page)
+        self.assertIn('gmplotDraw(map, gmplotData);', page)
+        self.assertTrue(script.startswith('var gmplotData = {'))
+
+    def test_paths_may_be_path_objects(self):
+        path = pathlib.Path(self.tmpdir, 'map.html')
+        written = self.gmap.draw(path, external=True, compress='gzip')
+        self.assertEqual([str(path), str(path) + '.gz', os.path.join(self.tmpdir, 'map.data.js'),
+                          os.path.join(self.tmpdir, 'map.data.js.gz')], written)
+        self.assertEqual(sorted(written), sorted(os.path.join(self.tmpdir, name) for name in os.listdir(self.tmpdir)))
+
+    def test_streams_cannot_hold_external_data(self):
+        with self.assertRaises(ValueError):
+            self.gmap.draw(io.StringIO(), external=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot import batch
+from gmplot.color_dicts import mpl_color_map
+
+
+def build_map():
+    gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+    gmap.scatter([37.4, 37.5], [-122.1, -122.2], 'red', marker=False, size=40)
+    return gmap
+
+
+def build_broken_map():
+    raise RuntimeError('no data for this customer')
+
+
+class TestRenderMany(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        self.gmap.plot(37.4 + rng.normal(0, 0.1, 500), -122.1 + rng.normal(0, 0.1, 500), 'blue')
+        self.gmap.heatmap(37.4 + rng.normal(0, 0.1, 500), -122.1 + rng.normal(0, 0.1, 500), 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir, name)) as f:
+            return f.read()
+
+    def test_maps_are_drawn_in_order_with_failures_reported(self):
+        specs = [('a', self.gmap), ('b', build_broken_map), ('c', build_map)]
+        results = gmplot.render_many(specs, workers=1, out_dir=self.tmpdir, compact=True)
+        self.assertEqual(['a', 'b', 'c'], [result.name for result in results])
+        self.assertEqual([os.path.join(self.tmpdir, 'a.html')], results[0].paths)
+        self.assertIsNone(results[0].error)
+        self.assertIn('RuntimeError: no data for this customer', results[1].error)
+        self.assertEqual([], results[1].paths)
+        self.assertTrue(all(result.seconds >= 0 for result in results))
+        self.assertEqual(self.gmap.render(compact=True), self.read('a.html'))
+        self.assertEqual(build_map().render(compact=True), self.read('c.html'))
+
+    def test_worker_processes_draw_the_same_maps(self):
+        default, batch.MIN_SHARED_SIZE = batch.MIN_SHARED_SIZE, 0
+        try:
+            specs = [('map%d' % i, self.gmap) for i in range(3)] + [('broken', build_broken_map)]
+            results = gmplot.render_many(specs, workers=2, out_dir=self.tmpdir, encoded=True)
+        finally:
+            batch.MIN_SHARED_SIZE = default
+        self.assertEqual([None, None, None], [result.error for result in results[:3]])
+        self.assertIn('RuntimeError', results[3].error)
+        expected = self.gmap.render(encoded=True)
+        for i in range(3):
+            self.assertEqual(expected, self.read('map%d.html' % i))
+
+    def test_layers_are_shared_rather_than_pickled(self):
+        default, batch.MIN_SHARED_SIZE = batch.MIN_SHARED_SIZE, 0
+        try:
+            shared, block = batch.share_layers(self.gmap)
+        finally:
+            batch.MIN_SHARED_SIZE = default
+        try:
+            self.assertLess(len(pickle.dumps(shared)), len(pickle.dumps(self.gmap)) // 4)
+            attached = batch.attach_layers(pickle.loads(pickle.dumps(shared)))
+            self.assertEqual(self.gmap.render(compact=True), attached.render(compact=True))
+        finally:
+            block.close()
+            block.unlink()
+        # Small plotters are pickled as they are.
+        self.assertEqual((self.gmap, None), batch.share_layers(self.gmap))
+
+    def test_color_tables_are_not_pickled(self):
+        copied = pickle.loads(pickle.dumps(self.gmap))
+        self.assertIs(mpl_color_map, copied.color_dict)
+        self.assertNotIn('color_dict', self.gmap.__getstate__())
+
+
+if __name__ == '__main__':
+    unittest.main()
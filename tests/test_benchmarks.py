@@ -0,0 +1,26 @@
+import unittest
+
+from benchmarks.render import CASES, compare, measure
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_every_case_is_measured(self):
+        for case in sorted(CASES):
+            for mode in ('default', 'compact'):
+                result = measure(case, 50, mode, repeat=1)
+                self.assertEqual((case, 50, mode), (result['case'], result['size'], result['mode']))
+                self.assertGreater(result['output_bytes'], 0)
+                self.assertGreater(result['peak_bytes'], 0)
+                self.assertGreaterEqual(result['draw_seconds'], 0)
+
+    def test_regressions_are_reported(self):
+        before = [{'case': 'plot', 'size': 10, 'mode': 'default', 'ingest_seconds': 1.0, 'draw_seconds': 0.001,
+                   'peak_bytes': 100, 'output_bytes': 100}]
+        after = [dict(before[0], ingest_seconds=2.0, draw_seconds=0.002, output_bytes=110),
+                 dict(before[0], size=20)]
+        self.assertEqual([('plot', 10, 'default', 'ingest_seconds', 1.0, 2.0)], compare(after, before))
+
+
+if __name__ == '__main__':
+    unittest.main()
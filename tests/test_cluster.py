@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.cluster import cluster_levels
+from tests.test_draw import compact_data
+
+
+class TestClusterLevels(unittest.TestCase):
+
+    def test_counts_are_conserved_and_shrink_with_zoom(self):
+        rng = np.random.RandomState(0)
+        levels = cluster_levels(rng.uniform(30, 45, 10000), rng.uniform(-120, -70, 10000), 2, 12)
+        self.assertEqual(list(range(2, 13)), sorted(levels))
+        sizes = [len(levels[zoom][2]) for zoom in range(2, 13)]
+        self.assertEqual(sorted(sizes), sizes)
+        for lats, lngs, counts in levels.values():
+            self.assertEqual(10000, counts.sum())
+
+    def test_nearby_points_merge_at_low_zoom_only(self):
+        levels = cluster_levels([37.0, 37.0001, 10.0], [-121.5, -121.5001, 10.0], 0, 18)
+        lats, lngs, counts = levels[4]
+        self.assertEqual([1, 2], sorted(counts))
+        self.assertAlmostEqual(37.00005, lats[np.argmax(counts)])
+        self.assertEqual(3, len(levels[18][2]))
+
+    def test_zoom_range_is_validated(self):
+        with self.assertRaises(ValueError):
+            cluster_levels([], [], 5, 4)
+
+
+class TestClusteredDraw(unittest.TestCase):
+
+    def test_levels_are_written_per_zoom(self):
+        gmap = gmplot.GoogleMapPlotter(0, 0, 3)
+        gmap.scatter([1, 1.00001, 2], [3, 3.00001, 4], 'r')
+        gmap.cluster_markers(max_zoom=10, min_zoom=8)
+        data = compact_data(gmap.render(compact=True))
+        clusters = data['clusters']
+        self.assertEqual(8, clusters['minZoom'])
+        self.assertEqual(4, len(clusters['levels']))
+        self.assertEqual([2, 1], sorted(clusters['levels'][0]['values'], reverse=True))
+        self.assertNotIn('values', clusters['levels'][-1])
+        self.assertNotIn('points', data)
+        self.assertIn('gmplotDraw(map, gmplotClusters);', gmap.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.colors import color_groups, colormap, hex_codes, normalize
+
+
+class TestColors(unittest.TestCase):
+
+    def test_values_are_normalized(self):
+        np.testing.assert_allclose([0, 0.5, 1], normalize([2, 3, 4]))
+        np.testing.assert_allclose([0, 0.5, 1, 1], normalize([1, 10, 100, 1000], vmax=100, norm='log'))
+        np.testing.assert_allclose([0, 0.5, 1], normalize([0, 1, 4], norm='sqrt'))
+        np.testing.assert_allclose([0, 0], normalize([5, 5]))
+        for values, norm in (([0, 1], 'log'), ([-1, 1], 'sqrt'), ([1, np.nan], 'linear'), ([1], 'cubic')):
+            with self.assertRaises(ValueError):
+                normalize(values, norm=norm)
+
+    def test_numbers_are_grouped_by_color_level(self):
+        palette, groups = color_groups([0, 10, 5, 10, 0], None, cmap=['#000000', '#ffffff'])
+        self.assertEqual(['#000000', '#808080', '#FFFFFF'], palette)
+        self.assertEqual([[0, 4], [2], [1, 3]], [rows.tolist() for rows in groups])
+
+    def test_names_are_resolved_once(self):
+        resolved = []
+
+        def resolve(name):
+            resolved.append(name)
+            return name.upper()
+
+        palette, groups = color_groups(['b', 'r', 'b', 'b'], resolve)
+        self.assertEqual(['B', 'R'], palette)
+        self.assertEqual([[0, 2, 3], [1]], [rows.tolist() for rows in groups])
+        self.assertEqual(['b', 'r'], resolved)
+
+    def test_hex_codes(self):
+        self.assertEqual(['#FF0080'], hex_codes(colormap(['#ff0080'], 1)))
+
+
+class TestScatterColors(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+
+    def test_points_are_drawn_in_a_layer_per_color(self):
+        self.gmap.scatter([1, 2, 3, 4], [5, 6, 7, 8], ['r', 'plum', 'r', '#00FF00'])
+        self.assertEqual([('#00FF00', [4]), ('#DDA0DD', [2]), ('#FF0000', [1, 3])],
+                         [(layer.settings['color'], self.gmap.points.column('lat', layer).tolist())
+                          for layer in self.gmap.points.layers])
+
+    def test_sizes_follow_their_points(self):
+        self.gmap.scatter([1, 2, 3], [4, 5, 6], [3.0, 1.0, 2.0], size=[30, 10, 20], marker=False,
+                          colormap=['black', 'white'])
+        symbols = self.gmap.symbols
+        self.assertEqual(['#000000', '#808080', '#FFFFFF'], [layer.settings['color'] for layer in symbols.layers])
+        self.assertEqual([2, 3, 1], symbols.column('lat').tolist())
+        self.assertEqual([10, 20, 30], symbols.column('size').tolist())
+
+    def test_one_color_per_point_is_expected(self):
+        with self.assertRaises(ValueError):
+            self.gmap.scatter([1, 2, 3], [4, 5, 6], ['r', 'b'])
+
+    def test_color_names_are_cached(self):
+        self.gmap.marker(1, 2, 'plum')
+        self.gmap.color_dict = {}
+        self.gmap.html_color_codes = {}
+        self.assertEqual('#DDA0DD', self.gmap._color('plum'))
+        self.assertEqual('#DDA0DD', self.gmap.points.layers[0].settings['color'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import unittest
+
+import gmplot
+from tests.test_draw import compact_data
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        self.gmap.scatter([37.4, 37.5], [-122.1, -122.2], 'red')
+        self.gmap.plot([37.4, 37.5], [-122.1, -122.2], 'blue')
+        self.gmap.heatmap([37.4], [-122.1], 1)
+        self.data = compact_data(self.gmap.render(compact=True))
+
+    def test_layers_carry_ids_and_data_a_version(self):
+        self.assertEqual([0], self.data['points']['ids'])
+        self.assertEqual([0], self.data['paths']['ids'])
+        self.assertEqual(1, self.data['version'])
+        # Drawing the same layers again keeps the version.
+        self.assertEqual(1, compact_data(self.gmap.render(compact=True))['version'])
+
+    def test_delta_holds_rows_added_and_layers_removed(self):
+        self.gmap.scatter([37.6], [-122.3], 'red')
+        self.gmap.paths.remove(self.gmap.paths.layers[0])
+        self.gmap.plot([37.4, 37.6], [-122.1, -122.3], 'green')
+        delta = json.loads(self.gmap.delta())
+        self.assertEqual((1, 2), (delta['from'], delta['to']))
+        self.assertEqual({'layers': [[1, 0]], 'ids': [0], 'coords': [37.6, -122.3]}, delta['points'])
+        self.assertEqual([1], delta['paths']['ids'])
+        self.assertEqual({'paths': [0]}, delta['remove'])
+        self.assertEqual('#008000', delta['styles'][delta['paths']['layers'][0][1]]['strokeColor'])
+        self.assertNotIn('heatmaps', delta)
+
+        delta = json.loads(self.gmap.delta())
+        self.assertEqual((2, 3, {}), (delta['from'], delta['to'], delta['remove']))
+        self.assertNotIn('points', delta)
+        self.assertEqual(3, compact_data(self.gmap.render(compact=True))['version'])
+
+    def test_delta_needs_a_compact_draw(self):
+        gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        gmap.render()
+        with self.assertRaises(ValueError):
+            gmap.delta()
+
+    def test_clustered_markers_are_not_updated(self):
+        self.gmap.cluster_markers()
+        self.gmap.render(compact=True)
+        self.gmap.marker(37.6, -122.3)
+        with self.assertRaises(ValueError):
+            self.gmap.delta()
+
+    def test_live_updates_poll_the_deltas(self):
+        self.gmap.live_updates('/map/delta.json', interval=5)
+        self.assertIn('gmplotPoll(map, "/map/delta.json", 5000);', self.gmap.render(compact=True))
+        with self.assertRaises(ValueError):
+            self.gmap.render()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+
+
+def compact_data(html):
+    return json.loads(re.search(r'var gmplotData = (\{.*?\});\n', html, re.S).group(1))
+
+
+class TestCompactDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def draw(self, **kwargs):
+        path = os.path.join(self.tmpdir, 'map.html')
+        self.gmap.draw(path, **kwargs)
+        with open(path) as f:
+            return f.read()
+
+    def test_layers_are_serialized_as_flat_arrays(self):
+        self.gmap.scatter([37.5, 37.25], [-122.125, -122.0], 'r')
+        self.gmap.scatter([1.5], [2.5], 'b', size=10, marker=False, symbol='+')
+        self.gmap.heatmap([1, 2], [3, 4], [0.5, 1])
+        data = compact_data(self.draw(compact=True))
+        self.assertEqual([37.5, -122.125, 37.25, -122.0], data['points']['coords'])
+        self.assertEqual([[2, 0]], data['points']['layers'])
+        self.assertEqual([[1, 1, '+']], data['symbols']['layers'])
+        self.assertEqual([10], data['symbols']['values'])
+        self.assertEqual([0.5, 1], data['heatmaps']['values'])
+        self.assertEqual('#0000FF', data['styles'][1]['strokeColor'])
+
+    def test_identical_styles_share_one_entry(self):
+        for offset in range(3):
+            self.gmap.plot([offset, offset + 1], [0, 1], 'plum', edge_width=2)
+        data = compact_data(self.draw(compact=True))
+        self.assertEqual([[2, 0]] * 3, data['paths']['layers'])
+        self.assertEqual([{'strokeColor': '#DDA0DD', 'strokeOpacity': 1.0, 'strokeWeight': 2}], data['styles'])
+
+    def test_compact_output_is_smaller(self):
+        lats = np.linspace(37, 38, 2000)
+        self.gmap.scatter(lats, lats - 160, 'r')
+        self.assertLess(len(self.draw(compact=True)) * 5, len(self.draw()))
+
+    def test_invalid_symbol_raises(self):
+        self.gmap.scatter([1], [2], marker=False, symbol='?')
+        with self.assertRaises(gmplot.gmplot.InvalidSymbolError):
+            self.draw(compact=True)
+        with self.assertRaises(gmplot.gmplot.InvalidSymbolError):
+            self.draw()
+
+
+class TestSymbolDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+
+    def test_symbols_are_calls_of_one_factory(self):
+        self.gmap.scatter([37.5, 37.25], [-122.125, -122.0], 'r', size=40, marker=False, symbol='x')
+        self.gmap.circle(37.4, -122.1, 100.5, 'b', face_alpha=0.5)
+        html = self.gmap.render()
+        self.assertEqual(1, html.count('function gmplotSymbol('))
+        self.assertEqual(2, html.count('var symbolStyle = '))
+        self.assertIn("gmplotSymbol(map, symbolStyle, 'x', 37.5, -122.125, 40);\n", html)
+        self.assertIn("gmplotSymbol(map, symbolStyle, 'x', 37.25, -122, 40);\n", html)
+        self.assertIn("gmplotSymbol(map, symbolStyle, 'o', 37.4, -122.1, 100.5);\n", html)
+        self.assertIn('"fillOpacity": 0.5', html)
+
+    def test_factory_is_left_out_without_symbols(self):
+        self.gmap.scatter([37.5], [-122.125], 'r')
+        self.assertNotIn('gmplotSymbol', self.gmap.render())
+
+
+class TestGridDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        self.gmap.grid(37.0, 37.35, 0.1, -122.2, -122.0, 0.1)
+
+    def test_lines_are_one_array(self):
+        html = self.gmap.render()
+        self.assertEqual(1, html.count('gmplotGrid(map, gridStyle, ['))
+        self.assertNotIn('PolylineCoordinates', html)
+        self.assertIn('gmplotGrid(map, gridStyle, [37.05,-122.15,37.05,-121.95,37.15,-122.15,37.15,-121.95,', html)
+        self.assertEqual((5, 2, 2), self.gmap.grids.shape)
+        self.assertEqual([[37.05, -122.15], [37.4, -122.15]], self.gmap.grids[3].round(6).tolist())
+
+    def test_compact_lines_are_one_array(self):
+        data = compact_data(self.gmap.render(compact=True))
+        self.assertEqual(20, len(data['grids']['coords']))
+        self.assertEqual('#000000', data['styles'][data['grids']['style']]['strokeColor'])
+
+    def test_spacings_are_validated(self):
+        for setting in [(37.0, 37.3, 0, -122.2, -122.0, 0.1), (37.0, 37.3, 0.1, -122.2, -122.0, -1),
+                        (37.0, 37.3, float('nan'), -122.2, -122.0, 0.1), (37.3, 37.0, 0.1, -122.2, -122.0, 0.1),
+                        (0, 90, 1e-6, 0, 1, 1)]:
+            with self.assertRaises(ValueError):
+                self.gmap.grid(*setting)
+
+
+class TestStreamingDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        lats = np.linspace(37, 38, 5000)
+        self.gmap.scatter(lats, lats - 160, 'r')
+        self.gmap.plot(lats, lats - 160, 'b')
+        self.gmap.heatmap(lats, lats - 160, 1)
+
+    def test_render_matches_drawn_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'map.html')
+            self.gmap.draw(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), self.gmap.render())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_draw_to_text_and_binary_streams(self):
+        html = self.gmap.render(compact=True)
+        text = io.StringIO()
+        self.gmap.draw(text, compact=True)
+        self.assertEqual(html, text.getvalue())
+        raw = io.BytesIO()
+        with gzip.GzipFile(fileobj=raw, mode='wb') as stream:
+            self.gmap.draw(stream, compact=True)
+        self.assertEqual(html, gzip.decompress(raw.getvalue()).decode('utf-8'))
+
+    def test_iterdraw_yields_bounded_chunks(self):
+        for compact in (False, True):
+            chunks = list(self.gmap.iterdraw(compact, chunk_size=4096))
+            self.assertGreater(len(chunks), 3)
+            self.assertEqual({4096}, set(len(chunk) for chunk in chunks[:-1]))
+            self.assertLessEqual(len(chunks[-1]), 4096)
+            self.assertEqual(self.gmap.render(compact), ''.join(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from gmplot.formatting import format_array, format_rows
+
+
+class TestFormatRows(unittest.TestCase):
+
+    def test_matches_percent_formatting(self):
+        values = np.concatenate([
+            np.random.RandomState(0).uniform(-180, 180, 5000),
+            [0.0, -0.0, -1e-9, 0.0078125, -0.0078125, 9.9999995, 1e20, 123456.5, np.nan, np.inf, -np.inf],
+        ])
+        for precision in (0, 3, 6):
+            expected = ''.join('%.*f;' % (precision, value) for value in values.tolist())
+            self.assertEqual(expected, ''.join(format_rows('%f;', values, precision=precision)))
+
+    def test_rows_combine_columns_and_literals(self):
+        text = ''.join(format_rows('new google.maps.LatLng(%f, %f),\n', [1, -2.5], (37.5, 122)))
+        self.assertEqual('new google.maps.LatLng(1.000000, 37.500000),\n'
+                         'new google.maps.LatLng(-2.500000, 122.000000),\n', text)
+
+    def test_template_must_match_columns(self):
+        with self.assertRaises(ValueError):
+            list(format_rows('%f, %f', [1]))
+
+
+class TestFormatArray(unittest.TestCase):
+
+    def test_interleaves_columns_and_trims_zeros(self):
+        text = ''.join(format_array([1, -2.5, 0.1234567], [37.5, 0, -0.0000001]))
+        self.assertEqual('1,37.5,-2.5,0,0.123457,-0', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
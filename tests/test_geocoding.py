@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import gmplot
+from gmplot.geocoding import (GazetteerBackend, GeocodeCache, GeocodeError, Geocoder, GoogleBackend,
+                              RateLimiter)
+
+
+PLACES = {'stanford, ca': (37.4275, -122.1697), 'paris': (48.8566, 2.3522)}
+
+
+class FakeGeocodingHandler(BaseHTTPRequestHandler):
+    '''
+    Answers like the Google Geocoding API, from PLACES.
+    '''
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.server.requests.append(query)
+        address = query['address'][0].lower()
+        if address == 'denied':
+            answer = {'status': 'REQUEST_DENIED', 'error_message': 'The provided API key is invalid.'}
+        elif address in PLACES:
+            lat, lng = PLACES[address]
+            answer = {'status': 'OK', 'results': [{'geometry': {'location': {'lat': lat, 'lng': lng}}}]}
+        else:
+            answer = {'status': 'ZERO_RESULTS', 'results': []}
+        body = json.dumps(answer).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingBackend(object):
+
+    name = 'counting'
+    rate = None
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        return PLACES.get(address.lower())
+
+
+class TestGoogleBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeocodingHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.backend = GoogleBackend('KEY', url='http://127.0.0.1:%d/geocode/json' % self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_results(self):
+        self.assertEqual((37.4275, -122.1697), self.backend.geocode('Stanford, CA'))
+        self.assertIsNone(self.backend.geocode('Atlantis'))
+        self.assertEqual(['KEY'], self.server.requests[0]['key'])
+        with self.assertRaises(GeocodeError):
+            self.backend.geocode('denied')
+
+    def test_plotter_from_geocode(self):
+        gmap = gmplot.GoogleMapPlotter.from_geocode('Paris', 11, geocoder=Geocoder(self.backend))
+        self.assertEqual((48.8566, 2.3522), tuple(gmap.center))
+        self.assertEqual(11, gmap.zoom)
+
+    def test_batch_looks_each_address_up_once(self):
+        geocoder = Geocoder(self.backend, workers=4)
+        addresses = ['Paris', 'Stanford, CA', 'paris', 'Atlantis', 'Paris']
+        expected = [PLACES['paris'], PLACES['stanford, ca'], PLACES['paris'], None, PLACES['paris']]
+        self.assertEqual(expected, geocoder.geocode_many(addresses))
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(expected, geocoder.geocode_many(addresses))
+        self.assertEqual(4, len(self.server.requests))
+
+
+class TestGazetteerBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'places.csv')
+        with open(self.path, 'w') as f:
+            f.write('name,latitude,longitude\n"Stanford,  CA",37.4275,-122.1697\nParis,48.8566,2.3522\n')
+
+    def test_addresses_are_matched_normalized(self):
+        geocoder = Geocoder(GazetteerBackend(self.path, 'name', 'latitude', 'longitude'))
+        self.assertEqual(PLACES['stanford, ca'], geocoder.geocode(' stanford,   CA'))
+        self.assertEqual([PLACES['paris'], None], geocoder.geocode_many(['PARIS', 'Atlantis']))
+        with self.assertRaises(GeocodeError):
+            geocoder.geocode('Atlantis')
+
+
+class TestGeocodeCache(unittest.TestCase):
+
+    def test_results_persist_on_disk(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'geocodes.sqlite')
+        backend = CountingBackend()
+        cache = GeocodeCache(path)
+        Geocoder(backend, cache).geocode_many(['Paris', 'Atlantis'])
+        cache.close()
+        cache = GeocodeCache(path)
+        self.addCleanup(cache.close)
+        self.assertEqual([PLACES['paris'], None], Geocoder(backend, cache).geocode_many(['Paris', 'Atlantis']))
+        self.assertEqual(['Paris', 'Atlantis'], backend.calls)
+
+    def test_expired_entries_are_looked_up_again(self):
+        backend, cache = CountingBackend(), GeocodeCache(ttl=-1)
+        geocoder = Geocoder(backend, cache)
+        geocoder.geocode('Paris')
+        geocoder.geocode('Paris')
+        self.assertEqual(2, len(backend.calls))
+        self.assertEqual(1, cache.evict())
+        self.assertEqual(0, len(cache))
+
+    def test_oldest_entries_are_evicted(self):
+        cache = GeocodeCache(size=2)
+        for key in 'abc':
+            cache.put(key, (1.0, 2.0))
+            time.sleep(0.001)
+        self.assertEqual(2, len(cache))
+        self.assertEqual((False, None), cache.get('a'))
+        self.assertEqual((True, (1.0, 2.0)), cache.get('c'))
+
+    def test_cache_keeps_to_its_size(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'geocodes.sqlite')
+        cache = GeocodeCache(path, size=5)
+        geocoder = Geocoder(CountingBackend(), cache)
+        for i in range(20):
+            geocoder.geocode_many(['Paris', 'Stanford, CA', 'Place %d' % i])
+            self.assertLessEqual(len(cache), 5)
+        cache.close()
+        cache = GeocodeCache(path, size=2)
+        self.addCleanup(cache.close)
+        self.assertEqual(2, len(cache))
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_calls_are_spaced_out(self):
+        limiter = RateLimiter(100)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait) for _ in range(11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.095)
+
+
+if __name__ == '__main__':
+    unittest.main()
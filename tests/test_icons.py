@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import gmplot
+from gmplot.icons import ICON_SIZE, IconCache, color_code, icon_rgba
+from tests.test_draw import compact_data
+from tests.test_raster import decode_png
+
+
+class TestIcons(unittest.TestCase):
+
+    def test_color_codes(self):
+        self.assertEqual('FF0000', color_code('#ff0000'))
+        self.assertEqual('AABBCC', color_code('#abc'))
+        self.assertEqual('12AB34', color_code('12ab34'))
+        for color in ('red', '#12345', '#FF0000\n', None):
+            with self.assertRaises(ValueError):
+                color_code(color)
+
+    def test_icons_are_shaded_in_their_color(self):
+        rgba = icon_rgba('#FF0000')
+        self.assertEqual((ICON_SIZE[1], ICON_SIZE[0], 4), rgba.shape)
+        self.assertEqual(0, rgba[..., 1:3].max())
+        self.assertEqual(255, rgba[..., 0].max())
+        self.assertEqual(0, rgba[0, 0, 3])
+        self.assertEqual(255, rgba[10, 10, 3])
+
+    def test_icons_are_cached_in_memory(self):
+        cache = IconCache()
+        self.assertIs(cache.data_uri('#00ff00'), cache.data_uri('00FF00'))
+        self.assertTrue(cache.data_uri('00FF00').startswith('data:image/png;base64,'))
+        self.assertEqual(icon_rgba('00FF00').tolist(), decode_png(cache.png('00FF00')).tolist())
+
+    def test_icons_are_cached_on_disk(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'icons', '123456.png')
+        data = IconCache(os.path.join(directory, 'icons')).png('#123456')
+        with open(path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        with open(path, 'wb') as f:
+            f.write(b'cached')
+        self.assertEqual(b'cached', IconCache(os.path.join(directory, 'icons')).png('#123456'))
+
+
+class TestMarkerIcons(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        self.gmap.marker(37.4, -122.1, '#123456')
+        self.gmap.marker(37.5, -122.2, '#123456')
+        self.gmap.marker(37.6, -122.3, 'r')
+
+    def test_markers_share_one_icon_per_color(self):
+        html = self.gmap.render()
+        self.assertEqual(2, html.count('data:image/png;base64,'))
+        self.assertEqual(2, html.count('new google.maps.MarkerImage(gmplotIcons["123456"])'))
+        self.assertIn('var gmplotIcons = {"123456": "data:image/png;base64,', html)
+        self.assertNotIn('markers/', html)
+
+    def test_compact_styles_name_the_icons_of_one_table(self):
+        for i in range(200):
+            self.gmap.marker(37.4, -122.1, '#123456', title='marker %d' % i)
+        data = compact_data(self.gmap.render(compact=True))
+        self.assertEqual(['123456', 'FF0000'], sorted(data['icons']))
+        self.assertEqual('123456', data['styles'][0]['icon'])
+        self.gmap.marker(37.7, -122.4, 'b')
+        self.assertEqual(1, self.gmap.delta().count('data:image/png;base64,'))
+        for clustered in (False, True):
+            if clustered:
+                self.gmap.cluster_markers()
+            for compact in (False, True):
+                self.assertEqual(3, self.gmap.render(compact=compact).count('data:image/png;base64,'))
+
+    def test_custom_icons_are_kept(self):
+        self.gmap.coloricon = 'http://example.com/pins/%s.png'
+        html = self.gmap.render()
+        self.assertIn('"123456": "http://example.com/pins/123456.png"', html)
+        self.assertNotIn('data:image/png', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.instrument import Instrument, RenderStats
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 12)
+        self.gmap.scatter(37.4 + rng.normal(0, 0.1, 500), -122.1 + rng.normal(0, 0.1, 500), 'r', marker=False)
+        self.gmap.plot([37.4, 37.5], [-122.1, -122.2], 'b')
+        self.gmap.marker(37.4, -122.1)
+        self.gmap.marker(37.5, -122.1)
+
+    def test_stages_are_reported_to_the_hook(self):
+        stages = []
+        instrument = Instrument(hook=stages.append)
+        html = self.gmap.render(instrument=instrument)
+        self.assertEqual(stages, instrument.stats.stages)
+        names = [stage.name for stage in stages]
+        self.assertEqual(['head', 'write_grids', 'write_points', 'write_paths', 'write_circles', 'write_symbols',
+                          'write_shapes', 'write_heatmap', 'tail'], names)
+        items = dict((stage.name, stage.items) for stage in stages)
+        self.assertEqual((2, 1, 500, None), (items['write_points'], items['write_paths'],
+                                             items['write_symbols'], items['head']))
+        self.assertEqual(len(html.encode('utf-8')), instrument.stats.bytes)
+        self.assertTrue(all(stage.seconds >= 0 and stage.peak_bytes is None for stage in stages))
+
+    def test_draw_returns_the_stats(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'map.html')
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = self.gmap.draw(path, external=True, instrument=Instrument(memory=True, profile=True))
+        self.assertIsInstance(stats, RenderStats)
+        self.assertEqual([path, os.path.join(directory, 'map.data.js')], stats.paths)
+        self.assertEqual(['write_compact_data', 'head', 'write_compact_draw', 'tail'],
+                         [stage.name for stage in stats.stages])
+        self.assertEqual(503, stats.stages[0].items)
+        self.assertEqual(sum(os.path.getsize(written) for written in stats.paths), stats.bytes)
+        self.assertGreater(stats.peak_bytes, 0)
+        self.assertGreaterEqual(stats.seconds, sum(stage.seconds for stage in stats.stages))
+        self.assertTrue(any('write_compact_json' in function[2] for function in stats.profile.stats))
+        self.assertEqual(stats.bytes, stats.as_dict()['bytes'])
+
+    def test_instrument_may_be_true(self):
+        html = self.gmap.render()
+        self.assertEqual(html, self.gmap.render(instrument=True))
+        self.assertEqual(html, ''.join(self.gmap.iterdraw(instrument=True)))
+        self.assertEqual(html, self.gmap.render(instrument=False))
+
+    def test_timeline_dictionary_is_counted_as_slices(self):
+        self.gmap.heatmap_points = {'1609459200000': [{'Latitude': 37.4, 'Longitude': -122.1, 'weight': 2}] * 3}
+        for compact in (False, True):
+            instrument = Instrument()
+            self.gmap.render(compact, instrument=instrument)
+            items = dict((stage.name, stage.items) for stage in instrument.stats.stages)
+            self.assertEqual(3, items['write_timeline'])
+            if compact:
+                self.assertEqual(503, items['write_compact_layers'])
+
+    def test_time_spent_by_the_consumer_is_not_counted(self):
+        instrument = Instrument()
+        for _ in self.gmap.iterdraw(chunk_size=100, instrument=instrument):
+            sum(range(20000))
+        stats = instrument.stats
+        self.assertGreater(stats.seconds, sum(stage.seconds for stage in stats.stages))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.layers import LayerStore, layer_changes
+
+
+class TestLayerStore(unittest.TestCase):
+
+    def test_add_keeps_columns_contiguous(self):
+        store = LayerStore(columns=('weight',))
+        store.add({'a': 1}, lat=[1, 2], lng=(3, 4), weight=np.array([0.5, 0.25]))
+        store.add({'a': 2}, lat=np.arange(3.0), lng=np.zeros(3), weight=1)
+        self.assertEqual(2, len(store))
+        self.assertEqual(5, store.size)
+        np.testing.assert_array_equal([1, 2, 0, 1, 2], store.column('lat'))
+        np.testing.assert_array_equal([1, 1, 1], store.column('weight', store.layers[1]))
+
+    def test_add_rejects_mismatched_lengths(self):
+        store = LayerStore()
+        with self.assertRaises(ValueError):
+            store.add({}, lat=[1, 2, 3], lng=[1, 2])
+
+    def test_scalars_broadcast_to_empty_columns(self):
+        store = LayerStore(columns=('weight',))
+        layer = store.add({}, lat=[], lng=np.array([]), weight=1)
+        self.assertEqual((0, 0, 0), (layer.start, layer.stop, store.size))
+        with self.assertRaises(ValueError):
+            store.add({}, lat=[], lng=[1, 2], weight=1)
+
+    def test_merge_extends_last_layer_with_equal_settings(self):
+        store = LayerStore()
+        store.add({'a': 1}, merge=True, lat=1, lng=2)
+        store.add({'a': 1}, merge=True, lat=3, lng=4)
+        store.add({'a': 2}, merge=True, lat=5, lng=6)
+        self.assertEqual([(0, 2), (2, 3)], [(layer.start, layer.stop) for layer in store.layers])
+
+    def test_remove_keeps_ids_of_other_layers(self):
+        store = LayerStore(columns=('weight',))
+        for n in (1, 2, 3):
+            store.add({'n': n}, lat=[n] * n, lng=0, weight=n)
+        store.remove(store.layers[1])
+        self.assertEqual([0, 2], store.ids)
+        self.assertEqual([(0, 1), (1, 4)], [(layer.start, layer.stop) for layer in store.layers])
+        np.testing.assert_array_equal([1, 3, 3, 3], store.column('weight'))
+        store.clear()
+        store.add({}, lat=1, lng=2, weight=3)
+        self.assertEqual(([3], 1), (store.ids, store.size))
+
+    def test_layer_changes(self):
+        store = LayerStore()
+        store.add({'a': 1}, merge=True, lat=[1, 2], lng=0)
+        store.add({'a': 2}, lat=3, lng=0)
+        drawn = {0: 2, 1: 1}
+        store.add({'a': 2}, merge=True, lat=[4, 5], lng=0)
+        store.remove(store.layers[0])
+        store.add({'a': 3}, lat=6, lng=0)
+        removed, added = layer_changes(store, drawn)
+        self.assertEqual([0], removed)
+        self.assertEqual([1, 2], added.ids)
+        np.testing.assert_array_equal([4, 5, 6], added.column('lat'))
+        self.assertEqual([{'a': 2}, {'a': 3}], [layer.settings for layer in added.layers])
+
+    def test_iteration_yields_coordinate_pairs(self):
+        store = LayerStore()
+        store.add('settings', lat=[1, 2], lng=[3, 4])
+        (coords, settings), = list(store)
+        np.testing.assert_array_equal([[1, 3], [2, 4]], coords)
+        self.assertEqual('settings', settings)
+
+
+class TestPlotterStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(0, 0, 0)
+
+    def test_scatter_markers_share_one_layer(self):
+        self.gmap.scatter(np.linspace(0, 1, 1000), np.linspace(1, 2, 1000), 'r')
+        self.assertEqual(1, len(self.gmap.points.layers))
+        self.assertEqual((1.0, 2.0, 'FF0000', 'no implementation'), self.gmap.points[-1])
+
+    def test_scatter_symbols_share_one_layer(self):
+        self.gmap.scatter([1, 2, 3], [4, 5, 6], 'b', size=10, marker=False, symbol='x')
+        layer, = self.gmap.symbols.layers
+        self.assertEqual('x', layer.settings['symbol'])
+        np.testing.assert_array_equal([10, 10, 10], self.gmap.symbols.column('size'))
+
+    def test_empty_scatter(self):
+        self.gmap.scatter([], [], 'b', marker=False)
+        self.gmap.scatter([], [], 'r')
+        self.assertEqual((0, 0), (self.gmap.symbols.size, self.gmap.points.size))
+        self.assertNotIn('gmplotSymbol(map, symbolStyle', self.gmap.render())
+        self.gmap.render(compact=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import re
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.polyline import decode_polyline, encode_polyline, encode_polylines
+from tests.test_draw import compact_data
+
+
+class TestEncodedPolyline(unittest.TestCase):
+
+    def test_reference_example(self):
+        # Example from Google's documentation of the format.
+        lats, lngs = [38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]
+        self.assertEqual('_p~iF~ps|U_ulLnnqC_mqNvxq`@', encode_polyline(lats, lngs))
+        decoded = decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        np.testing.assert_allclose([lats, lngs], decoded)
+
+    def test_round_trip(self):
+        random = np.random.RandomState(0)
+        lats, lngs = random.uniform(-85, 85, 5000), random.uniform(-180, 180, 5000)
+        for precision in (5, 6):
+            decoded_lats, decoded_lngs = decode_polyline(encode_polyline(lats, lngs, precision), precision)
+            self.assertLessEqual(np.abs(decoded_lats - lats).max(), 0.5 * 10 ** -precision + 1e-12)
+            self.assertLessEqual(np.abs(decoded_lngs - lngs).max(), 0.5 * 10 ** -precision + 1e-12)
+        self.assertEqual('', encode_polyline([], []))
+        decoded_lats, decoded_lngs = decode_polyline(encode_polyline([], []))
+        self.assertEqual((np.float64, 0, 0), (decoded_lats.dtype, len(decoded_lats), len(decoded_lngs)))
+
+    def test_paths_are_encoded_independently(self):
+        lats, lngs = [1, 2, 3, 4, 5], [-1, -2, -3, -4, -5]
+        encoded = encode_polylines(lats, lngs, [2, 2, 5])
+        self.assertEqual([encode_polyline(lats[:2], lngs[:2]), '', encode_polyline(lats[2:], lngs[2:])], encoded)
+        self.assertEqual('', encode_polyline([], []))
+
+    def test_truncated_input_raises(self):
+        with self.assertRaises(ValueError):
+            decode_polyline('_p~iF~ps|U_')
+
+
+class TestEncodedDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        random = np.random.RandomState(1)
+        self.lats, self.lngs = 37 + random.rand(1000), -122 + random.rand(1000)
+        self.gmap.plot(self.lats, self.lngs, 'r')
+        self.gmap.polygon([37, 37.1, 37.2], [-122, -122.1, -122])
+
+    def test_legacy_output_decodes_paths(self):
+        html = self.gmap.render(encoded=True)
+        self.assertIn('libraries=visualization,geometry', html)
+        self.assertNotIn('new google.maps.LatLng(%f' % self.lats[0], html)
+        encoded = [json.loads(match) for match in re.findall(r'decodePath\((".*?")\)', html)]
+        np.testing.assert_allclose([self.lats, self.lngs], decode_polyline(encoded[0]), atol=5e-6)
+        self.assertLess(len(html) * 3, len(self.gmap.render()))
+
+    def test_compact_output_decodes_paths(self):
+        data = compact_data(self.gmap.render(compact=True, encoded=True))
+        self.assertNotIn('coords', data['paths'])
+        self.assertEqual([encode_polyline(self.lats, self.lngs)], data['paths']['encoded'])
+        self.assertEqual([encode_polyline([37, 37.1, 37.2], [-122, -122.1, -122])], data['shapes']['encoded'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+import gmplot
+from gmplot.colors import colormap
+from gmplot.raster import Raster, png_bytes
+
+
+def decode_png(data):
+    width, height = struct.unpack('>II', data[16:24])
+    idat = data[33 + 8:-12]
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width * 4 + 1)
+    return rows[:, 1:].reshape(height, width, 4)
+
+
+class TestRaster(unittest.TestCase):
+
+    def test_points_add_their_weights_to_their_pixel(self):
+        raster = Raster((37.0, -122.5, 37.5, -122.0), 10)
+        raster.add_points([37.2, 37.2, 37.3, 38.0], [-122.2, -122.2, -122.1, -122.1], [1, 2, 4, 8])
+        self.assertEqual(7, raster.density.sum())
+        self.assertEqual([4, 3], sorted(raster.density[raster.density > 0].tolist(), reverse=True))
+
+    def test_size_is_limited(self):
+        raster = Raster((30.0, -130.0, 50.0, -100.0), 12, max_size=500)
+        self.assertEqual(500, max(raster.width, raster.height))
+        south, west, north, east = raster.bounds
+        self.assertAlmostEqual(-130.0, west)
+        self.assertAlmostEqual(50.0, north)
+        self.assertLessEqual(south, 30.0)
+        self.assertGreaterEqual(east, -100.0)
+
+    def test_paths_are_sampled_once_per_pixel(self):
+        raster = Raster((37.0, -122.5, 37.5, -122.0), 10)
+        raster.add_path([37.25, 37.25], [-122.45, -122.05])
+        # A horizontal path covers each pixel it crosses once or twice.
+        covered = raster.density[raster.density > 0]
+        self.assertEqual(1, np.count_nonzero(raster.density.sum(axis=1)))
+        self.assertGreaterEqual(len(covered), 0.79 * raster.width)
+        self.assertLessEqual(covered.max(), 2)
+
+    def test_image_is_transparent_without_density(self):
+        raster = Raster((37.0, -122.5, 37.5, -122.0), 8)
+        raster.add_points([37.2, 37.3], [-122.2, -122.1], [1, 10])
+        rgba = raster.image(['#000000', '#ffffff'], scale='linear', opacity=0.5)
+        self.assertEqual(2, np.count_nonzero(rgba[..., 3]))
+        self.assertEqual({0, 128}, set(rgba[..., 3].ravel().tolist()))
+        self.assertEqual([255, 255, 255], rgba[raster.density == 10][0, :3].tolist())
+        with self.assertRaises(ValueError):
+            raster.image(scale='cubic')
+        with self.assertRaises(ValueError):
+            colormap('rainbow')
+
+    def test_png_decodes_to_the_image(self):
+        rgba = np.random.RandomState(0).randint(0, 256, (5, 7, 4)).astype(np.uint8)
+        data = png_bytes(rgba)
+        self.assertEqual(b'\x89PNG\r\n\x1a\n', data[:8])
+        np.testing.assert_array_equal(rgba, decode_png(data))
+
+
+class TestDensityOverlay(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        rng = np.random.RandomState(1)
+        self.gmap.density_overlay(37.4 + rng.normal(0, 0.05, 1000), -122.1 + rng.normal(0, 0.05, 1000),
+                                  paths=[([37.3, 37.5], [-122.3, -122.0])], colormap=['red', 'blue'])
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_overlay_is_embedded_when_rendered(self):
+        html = self.gmap.render()
+        self.assertIn("'data:image/png;base64,", html)
+        self.assertIn('new google.maps.GroundOverlay(', html)
+
+    def test_overlay_is_written_next_to_the_html_file(self):
+        path = os.path.join(self.tmpdir, 'map.html')
+        written = self.gmap.draw(path)
+        png = os.path.join(self.tmpdir, 'map.overlay0.png')
+        self.assertEqual([path, png], written)
+        with open(path) as f:
+            html = f.read()
+        self.assertIn("'map.overlay0.png'", html)
+        self.assertNotIn('data:image/png', html)
+        with open(png, 'rb') as f:
+            rgba = decode_png(f.read())
+        # Colors run from red to blue.
+        opaque = rgba[rgba[..., 3] > 0].astype(int)
+        self.assertTrue(len(opaque))
+        self.assertEqual({0}, set(opaque[:, 1].tolist()))
+        self.assertEqual({255}, set((opaque[:, 0] + opaque[:, 2]).tolist()))
+
+    def test_file_names_do_not_outlive_a_cropped_draw(self):
+        path = os.path.join(self.tmpdir, 'map.html')
+        self.gmap.draw(path, crop=True)
+        with open(path) as f:
+            self.assertIn("'map.overlay0.png'", f.read())
+        html = self.gmap.render()
+        self.assertNotIn('map.overlay0.png', html)
+        self.assertIn("'data:image/png;base64,", html)
+
+
+if __name__ == '__main__':
+    unittest.main()
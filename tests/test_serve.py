@@ -0,0 +1,87 @@
+import gzip
+import json
+import threading
+import unittest
+
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+import gmplot
+from gmplot.serve import MapServer, parse_range
+
+
+class TestMapServer(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 12)
+        self.gmap.scatter(37.4 + rng.normal(0, 0.1, 2000), -122.1 + rng.normal(0, 0.1, 2000), 'red')
+        self.gmap.plot([37.4, 37.5], [-122.1, -122.2], 'blue')
+        self.gmap.plot([10, 11], [10, 11], 'blue')
+        self.server = MapServer(self.gmap, ('127.0.0.1', 0), quiet=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def get(self, path, **headers):
+        response = urlopen(Request(self.server.url + path.lstrip('/'), headers=headers))
+        return response.status, response.headers, response.read()
+
+    def test_page_fetches_the_layers_in_view(self):
+        status, headers, body = self.get('/')
+        self.assertEqual(200, status)
+        self.assertIn(b'gmplotServe(map, "data.json");', body)
+        self.assertNotIn(b'var gmplotData', body)
+
+    def test_data_is_cropped_to_the_bbox(self):
+        status, headers, body = self.get('/data.json?bbox=37.35,-122.15,37.45,-122.05&zoom=12')
+        data = json.loads(body.decode('utf-8'))
+        lats, lngs = data['points']['coords'][::2], data['points']['coords'][1::2]
+        self.assertTrue(0 < len(lats) < 2000)
+        self.assertTrue(all(37.35 <= lat <= 37.45 for lat in lats) and all(-122.15 <= lng <= -122.05 for lng in lngs))
+        self.assertEqual([0], data['paths']['ids'])
+        data = json.loads(self.get('/data.json')[2].decode('utf-8'))
+        self.assertEqual(4000, len(data['points']['coords']))
+
+    def test_serving_does_not_mark_the_map_drawn(self):
+        self.gmap.render(compact=True)
+        version, drawn = self.gmap._version, self.gmap._drawn
+        self.gmap.plot([12, 13], [12, 13], 'red')
+        for path in ('/data.json', '/data.json?bbox=37,-123,38,-122'):
+            self.get(path)
+        self.assertEqual((version, drawn), (self.gmap._version, self.gmap._drawn))
+        self.assertIn('"to": %d' % (version + 1), self.gmap.delta())
+
+    def test_gzip_and_etag(self):
+        status, headers, body = self.get('/data.json?bbox=37,-123,38,-122', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertIn('"points"', gzip.decompress(body).decode('utf-8'))
+        with self.assertRaises(HTTPError) as raised:
+            self.get('/data.json?bbox=37,-123,38,-122', **{'Accept-Encoding': 'gzip', 'If-None-Match': headers['ETag']})
+        self.assertEqual(304, raised.exception.code)
+
+    def test_byte_ranges(self):
+        status, headers, body = self.get('/data.json', Range='bytes=2-9')
+        self.assertEqual(206, status)
+        self.assertEqual(b'"points"', body)
+        self.assertTrue(headers['Content-Range'].startswith('bytes 2-9/'))
+        self.assertEqual((95, 100), parse_range('bytes=-5', 100))
+        self.assertEqual((90, 100), parse_range('bytes=90-', 100))
+        self.assertIsNone(parse_range('bytes=1-2,4-5', 100))
+
+    def test_bad_requests(self):
+        for path in ('/data.json?bbox=1,2,3', '/data.json?zoom=x', '/missing', '/data.json?bbox=0,10,1,-200',
+                     '/data.json?bbox=nan,10,1,20', '/data.json?bbox=0,10,91,20', '/data.json?bbox=0,inf,1,20'):
+            with self.assertRaises(HTTPError) as raised:
+                self.get(path)
+            self.assertEqual(404 if path == '/missing' else 400, raised.exception.code)
+
+
+if __name__ == '__main__':
+    unittest.main()
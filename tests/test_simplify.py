@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.simplify import douglas_peucker, simplify, simplify_levels, visvalingam
+from tests.test_draw import compact_data
+
+
+def recursive_douglas_peucker(x, y, tolerance, first, last, keep):
+    keep[first] = keep[last] = True
+    if last - first < 2:
+        return
+    ax, ay, bx, by = x[first], y[first], x[last], y[last]
+    inner = np.arange(first + 1, last)
+    t = np.clip(((x[inner] - ax) * (bx - ax) + (y[inner] - ay) * (by - ay)) / ((bx - ax) ** 2 + (by - ay) ** 2), 0, 1)
+    distance = np.hypot(x[inner] - ax - t * (bx - ax), y[inner] - ay - t * (by - ay))
+    if distance.max() > tolerance:
+        split = inner[np.argmax(distance)]
+        recursive_douglas_peucker(x, y, tolerance, first, split, keep)
+        recursive_douglas_peucker(x, y, tolerance, split, last, keep)
+
+
+class TestSimplify(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.x = np.cumsum(random.normal(size=3000))
+        self.y = np.cumsum(random.normal(size=3000))
+
+    def test_douglas_peucker_matches_recursive_version(self):
+        for tolerance in (0.5, 5, 50):
+            expected = np.zeros(len(self.x), dtype=bool)
+            recursive_douglas_peucker(self.x, self.y, tolerance, 0, len(self.x) - 1, expected)
+            np.testing.assert_array_equal(expected, douglas_peucker(self.x, self.y, tolerance))
+
+    def test_visvalingam_drops_flat_vertices(self):
+        keep = visvalingam([0, 1, 2, 3, 3, 3], [0, 0.01, 0, 0, 1, 2], 0.5)
+        self.assertEqual([True, False, False, True, False, True], keep.tolist())
+        self.assertLess(visvalingam(self.x, self.y, 5).sum(), visvalingam(self.x, self.y, 1).sum())
+
+    def test_short_paths_are_kept(self):
+        self.assertEqual([], douglas_peucker([], [], 1).tolist())
+        self.assertEqual([True], douglas_peucker([1], [2], 1).tolist())
+        self.assertEqual(([1.0, 2.0], [3.0, 4.0]), tuple(c.tolist() for c in simplify([1, 2], [3, 4])))
+
+    def test_tolerance_in_pixels_and_meters(self):
+        lngs = np.linspace(-122, -121, 101)
+        lats = 37 + 1e-6 * (-1) ** np.arange(101)
+        self.assertEqual(2, len(simplify(lats, lngs, 1, zoom=10)[0]))
+        self.assertEqual(101, len(simplify(lats, lngs, 0.01, zoom=20)[0]))
+        self.assertEqual(2, len(simplify(lats, lngs, 1)[0]))
+        self.assertEqual(101, len(simplify(lats, lngs, 0.01)[0]))
+        with self.assertRaises(ValueError):
+            simplify(lats, lngs, method='nearest')
+
+    def test_levels_cover_every_zoom(self):
+        lats, lngs = 37 + self.y * 1e-4, -122 + self.x * 1e-4
+        levels = simplify_levels(lats, lngs, [12, 4, 8])
+        self.assertEqual([(0, 7), (8, 11), (12, 22)], [zooms for _, _, zooms in levels])
+        sizes = [len(level_lats) for level_lats, _, _ in levels]
+        self.assertEqual(sorted(sizes), sizes)
+
+
+class TestSimplifiedDraw(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        self.lngs = np.linspace(-122.5, -122, 500)
+        self.lats = 37.4 + 1e-6 * (-1) ** np.arange(500)
+
+    def test_plot_and_polygon_store_simplified_paths(self):
+        self.gmap.plot(self.lats, self.lngs, 'r', simplify=True)
+        self.gmap.polygon(self.lats, self.lngs, 'b', simplify=10.0, simplify_method='visvalingam')
+        self.assertEqual(2, self.gmap.paths.size)
+        self.assertLess(self.gmap.shapes.size, 100)
+
+    def test_levels_of_detail_are_drawn_per_zoom(self):
+        self.gmap.plot(self.lats, self.lngs, 'r', simplify=[5, 21])
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'map.html')
+            self.gmap.draw(path)
+            with open(path) as f:
+                html = f.read()
+            self.assertIn('gmplotZoomRange(map, Path, [0, 20]);', html)
+            self.assertIn('gmplotZoomRange(map, Path, [21, 22]);', html)
+            self.gmap.draw(path, compact=True)
+            with open(path) as f:
+                data = compact_data(f.read())
+            self.assertEqual([[2, 0, [0, 20]], [500, 0, [21, 22]]], data['paths']['layers'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
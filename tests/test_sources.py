@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.sources import PointSource, csv_chunks, parquet, read_chunks
+from tests.test_draw import compact_data
+
+
+class SourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.lats = 37.7 + rng.normal(scale=0.05, size=1000)
+        self.lngs = -122.4 + rng.normal(scale=0.05, size=1000)
+        self.weights = rng.uniform(0, 2, 1000)
+        self.csv = os.path.join(self.tmpdir, 'events.csv')
+        with open(self.csv, 'w') as f:
+            f.write('id,"lat",lng,weight\n')
+            for row in zip(range(1000), self.lats.tolist(), self.lngs.tolist(), self.weights.tolist()):
+                f.write('%d,%r,%r,%r\n' % row)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertChunks(self, chunks, sizes):
+        chunks = list(chunks)
+        self.assertEqual(sizes, [len(chunk[0]) for chunk in chunks])
+        np.testing.assert_array_equal(self.lats, np.concatenate([chunk[0] for chunk in chunks]))
+        np.testing.assert_array_equal(self.weights, np.concatenate([chunk[-1] for chunk in chunks]))
+
+
+class TestSources(SourceTestCase):
+
+    def test_csv_columns_by_name_or_index(self):
+        self.assertChunks(csv_chunks(self.csv, ['lat', 'weight'], 400), [400, 400, 200])
+        self.assertChunks(csv_chunks(self.csv, [1, 3], 1000), [1000])
+
+    def test_memory_mapped_and_in_memory_arrays(self):
+        path = os.path.join(self.tmpdir, 'events.npy')
+        np.save(path, np.column_stack((self.lats, self.lngs, self.weights)))
+        self.assertChunks(read_chunks(path, [0, 2], 300), [300, 300, 300, 100])
+        self.assertChunks(read_chunks({'lat': self.lats, 'w': self.weights}, ['lat', 'w'], 999), [999, 1])
+
+    def test_unknown_file_type_raises(self):
+        with self.assertRaises(ValueError):
+            read_chunks('events.json', ['lat'])
+
+    @unittest.skipIf(parquet is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow
+        path = os.path.join(self.tmpdir, 'events.parquet')
+        parquet.write_table(pyarrow.table({'lat': self.lats, 'lng': self.lngs, 'weight': self.weights}), path)
+        self.assertChunks(read_chunks(path, ['lat', 'weight'], 600), [600, 400])
+
+    def test_point_source_defaults_weights_and_reads_times(self):
+        times = np.datetime64('2020-01-31T12:00') + np.arange(3) * np.timedelta64(1, 'D')
+        source = PointSource({'lat': [1, 2, 3], 'lng': [4, 5, 6], 'at': times}, time='at')
+        (lats, lngs, weights, seconds), = list(source)
+        self.assertEqual([1, 1, 1], weights.tolist())
+        self.assertEqual(1580472000 + 86400, seconds[1])
+
+
+class TestHeatmapFromSource(SourceTestCase):
+
+    def test_aggregated_source_matches_heatmap(self):
+        expected = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        expected.heatmap(self.lats, self.lngs, self.weights, radius=20, aggregate=True)
+        gmap = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        gmap.heatmap_from_source(self.csv, weight='weight', chunk_size=128, radius=20)
+        for name in ('lat', 'lng', 'weight'):
+            np.testing.assert_allclose(expected.heatmap_points.column(name), gmap.heatmap_points.column(name))
+        self.assertEqual(expected.heatmap_points.layers[0].settings, gmap.heatmap_points.layers[0].settings)
+
+    def test_streamed_source_matches_heatmap(self):
+        expected = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        expected.heatmap(self.lats[:10], self.lngs[:10], 1)
+        expected.heatmap(self.lats, self.lngs, self.weights, opacity=0.5)
+        gmap = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        gmap.heatmap(self.lats[:10], self.lngs[:10], 1)
+        gmap.heatmap_from_source(self.csv, weight='weight', aggregate=False, chunk_size=128, opacity=0.5)
+        self.assertEqual(10, gmap.heatmap_points.size)
+        self.assertEqual(expected.render(), gmap.render())
+        expected, data = compact_data(expected.render(compact=True)), compact_data(gmap.render(compact=True))
+        # Layers drawn from sources have no ids, as deltas do not update them.
+        self.assertEqual([0, 1], expected['heatmaps'].pop('ids'))
+        self.assertEqual(expected, data)
+
+    def test_timeline_from_iso_dated_csv(self):
+        path = os.path.join(self.tmpdir, 'dated.csv')
+        with open(path, 'w') as f:
+            f.write('lat,lng,time\n')
+            for i, (lat, lng) in enumerate(zip(self.lats[:100].tolist(), self.lngs[:100].tolist())):
+                f.write('%r,%r,2020-%02d-05T%02d:00:00\n' % (lat, lng, 1 + i // 50, i % 24))
+        times, = next(csv_chunks(path, ['time'], dates=['time']))
+        self.assertEqual(np.datetime64('2020-01-05T01:00:00', 'ms'), times[1])
+        gmap = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        gmap.heatmap_from_source(path, time='time', chunk_size=30)
+        january = np.datetime64('2020-01', 'ms').astype(np.int64)
+        slices = gmap.heatmap_slices
+        self.assertEqual([january, january + 31 * 86400000], [layer.settings['time'] for layer in slices.layers])
+        self.assertAlmostEqual(100, slices.column('weight').sum())
+
+    def test_timeline_by_month(self):
+        times = np.datetime64('2021-01-20') + np.arange(1000) * np.timedelta64(1, 'h')
+        gmap = gmplot.GoogleMapPlotter(37.7, -122.4, 11)
+        gmap.heatmap_from_source({'lat': self.lats, 'lng': self.lngs, 'time': times}, time='time', chunk_size=300)
+        january = np.datetime64('2021-01', 'ms').astype(np.int64)
+        slices = gmap.heatmap_slices
+        self.assertEqual([january, january + 31 * 86400000], [layer.settings['time'] for layer in slices.layers][:2])
+        self.assertEqual(3, len(slices.layers))
+        self.assertAlmostEqual(12 * 24, slices.column('weight', slices.layers[0]).sum())
+        self.assertIn('gmplotTimeline(map, gmplotTimelineData);', gmap.render())
+        with self.assertRaises(ValueError):
+            gmap.heatmap_from_source(self.csv, time='id', aggregate=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.projection import distances, viewport_bounds
+from gmplot.spatial import GridIndex, StoreIndex, bbox_mask, radius_bbox
+from tests.test_draw import compact_data
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.lats = rng.uniform(-80, 80, 20000)
+        self.lngs = rng.uniform(-180, 180, 20000)
+        self.index = GridIndex(self.lats, self.lngs)
+
+    def test_bbox_matches_a_scan(self):
+        for bbox in [(10, 20, 30, 60), (-5.5, -179, 5.5, -170), (-90, -180, 90, 180), (40, 10, 41, 10.5)]:
+            expected = np.flatnonzero(bbox_mask(self.lats, self.lngs, bbox))
+            np.testing.assert_array_equal(expected, self.index.bbox(*bbox))
+
+    def test_bbox_crossing_the_antimeridian(self):
+        indices = self.index.bbox(-10, 170, 10, -170)
+        self.assertTrue(len(indices))
+        self.assertTrue(np.all(np.abs(self.lngs[indices]) >= 170))
+        self.assertEqual(len(indices), len(self.index.bbox(-10, 170, 10, 180)) + len(self.index.bbox(-10, -180, 10, -170)))
+
+    def test_bbox_longitudes_are_wrapped(self):
+        np.testing.assert_array_equal(self.index.bbox(0, 10, 1, 160), self.index.bbox(0, 10, 1, -200))
+        np.testing.assert_array_equal(self.index.bbox(0, 160, 1, 10), self.index.bbox(0, -200, 1, 10))
+        self.assertEqual(len(self.index.bbox(0, -180, 1, 180)), len(self.index.bbox(0, -200, 1, 200)))
+
+    def test_radius_matches_a_scan(self):
+        for lat, lng, radius in [(10, 20, 500000), (0, 179.5, 300000), (79, 0, 1000000), (5, 5, 10)]:
+            expected = np.flatnonzero(distances(lat, lng, self.lats, self.lngs) <= radius)
+            np.testing.assert_array_equal(expected, self.index.radius(lat, lng, radius))
+
+    def test_radius_bbox(self):
+        south, west, north, east = radius_bbox(0, 179.5, 111319.5)
+        self.assertAlmostEqual(-1, south, places=6)
+        self.assertAlmostEqual(1, north, places=6)
+        self.assertAlmostEqual(178.5, west, places=3)
+        self.assertAlmostEqual(-179.5, east, places=3)
+        self.assertEqual((-180, 180), radius_bbox(89.5, 0, 100000)[1::2])
+
+    def test_empty_index_and_empty_bbox(self):
+        self.assertEqual(0, len(GridIndex([], []).bbox(-90, -180, 90, 180)))
+        self.assertEqual(0, len(self.index.bbox(10, 0, -10, 1)))
+        with self.assertRaises(ValueError):
+            GridIndex([1], [2], cell_size=0)
+
+
+class TestStoreIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+
+    def test_rows_keep_their_layer(self):
+        self.gmap.scatter([1, 2, 3], [1, 2, 3], 'red')
+        self.gmap.scatter([1.5, 2.5], [1.5, 2.5], 'blue')
+        rows = StoreIndex(self.gmap.points).rows((1.2, 1.2, 2.6, 2.6))
+        self.assertEqual([(2.0, 2.0, 'FF0000', 'no implementation'), (1.5, 1.5, '0000FF', 'no implementation'),
+                          (2.5, 2.5, '0000FF', 'no implementation')], list(rows))
+        self.assertEqual([0, 1], rows.ids)
+
+    def test_layers_crossing_the_bbox_at_a_zoom(self):
+        self.gmap.plot([0, 10], [0, 10], 'red')
+        self.gmap.plot([20, 30], [20, 30], 'red')
+        self.gmap.plot(np.linspace(0, 10, 50), np.linspace(0, 10, 50), 'blue', simplify=[4, 8])
+        index = StoreIndex(self.gmap.paths)
+        self.assertEqual([0, 2, 3], index.layers((4, 4, 5, 5)).ids)
+        self.assertEqual([0, 2], index.layers((4, 4, 5, 5), zoom=3).ids)
+        self.gmap.paths.remove(self.gmap.paths.layers[0])
+        self.assertEqual([1], index.layers((25, 25, 26, 26)).ids)
+
+
+class TestQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+        self.gmap.scatter([37.428, 37.429, 37.5], [-122.145, -122.15, -122.145], 'red')
+        self.gmap.heatmap([37.428, 38], [-122.145, -122], 1)
+        self.gmap.plot([37.42, 37.43], [-122.14, -122.15], 'blue')
+        self.gmap.plot([37.6, 37.7], [-122.3, -122.2], 'green')
+
+    def test_viewport_is_centered_on_the_map(self):
+        south, west, north, east = self.gmap.viewport()
+        self.assertAlmostEqual(37.428, (south + north) / 2, places=3)
+        self.assertAlmostEqual(-122.145, (west + east) / 2)
+        self.assertAlmostEqual(1280 * 360 / 256 / 2 ** 16, east - west)
+        self.assertEqual((-180, 180), viewport_bounds(0, 0, 1, 1280, 800)[1::2])
+        self.assertGreater(*viewport_bounds(10, 179, 5, 1280, 800)[1::2])
+
+    def test_query_by_bbox_or_circle(self):
+        self.assertEqual(2, self.gmap.query('points', bbox=(37.4, -122.2, 37.45, -122.1)).size)
+        self.assertEqual(1, self.gmap.query('points', near=(37.428, -122.145, 100)).size)
+        self.assertEqual([1], self.gmap.query('paths', near=(37.7, -122.2, 10)).ids)
+        self.assertEqual([0, 1], self.gmap.query('paths', bbox=(37, -123, 38, -122)).ids)
+        with self.assertRaises(ValueError):
+            self.gmap.query('points')
+        with self.assertRaises(ValueError):
+            self.gmap.query('ground_overlays', bbox=(0, 0, 1, 1))
+
+    def test_draw_crops_to_the_viewport(self):
+        html = self.gmap.render(crop=True)
+        self.assertEqual(2, html.count('new google.maps.Marker('))
+        self.assertIn('#0000FF', html)
+        self.assertNotIn('#008000', html)
+        self.assertIn('37.428', html)
+        self.assertNotIn('new google.maps.LatLng(38', html)
+        self.assertEqual(3, len(self.gmap.points))
+        data = compact_data(self.gmap.render(compact=True, crop=(37.45, -122.2, 38, -121.9)))
+        self.assertEqual([37.5, -122.145], data['points']['coords'])
+        self.assertEqual([38, -122], data['heatmaps']['coords'])
+        self.assertEqual([1], data['paths']['ids'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import re
+import unittest
+
+import gmplot
+from gmplot.styles import StyleTable, intern_settings
+
+
+class TestStyleTable(unittest.TestCase):
+
+    def test_equal_options_share_an_index(self):
+        styles = StyleTable()
+        options = lambda settings: {'strokeColor': settings['color']}
+        self.assertEqual(0, styles.index(options, {'color': '#FF0000', 'closed': None}))
+        self.assertEqual(1, styles.index(options, {'color': '#0000FF'}))
+        self.assertEqual(0, styles.index(options, {'color': '#FF0000'}))
+        self.assertEqual(2, len(styles))
+        self.assertEqual('[{"strokeColor": "#FF0000"},{"strokeColor": "#0000FF"}]', styles.json())
+
+    def test_settings_are_interned(self):
+        pool = {}
+        first = intern_settings(pool, {'color': '#FF0000', 'edge_width': 2})
+        self.assertIs(first, intern_settings(pool, {'edge_width': 2, 'color': '#FF0000'}))
+        gradient = {'gradient': [(0, 0, 0, 0)]}
+        self.assertIs(gradient, intern_settings(pool, gradient))
+        self.assertEqual(1, len(pool))
+
+
+class TestPlotterStyles(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 16)
+
+    def test_layers_of_a_style_share_their_settings(self):
+        for _ in range(3):
+            self.gmap.scatter([37.4], [-122.1], 'r', marker=False, symbol='x', edge_width=2)
+            self.gmap.plot([37.4, 37.5], [-122.1, -122.2], 'plum')
+        self.gmap.plot([37.4, 37.5], [-122.1, -122.2], 'plum', simplify=[10, 12])
+        symbols, paths = self.gmap.symbols.layers, self.gmap.paths.layers
+        self.assertTrue(all(layer.settings is symbols[0].settings for layer in symbols))
+        self.assertTrue(all(layer.settings is paths[0].settings for layer in paths[:3]))
+        self.assertEqual('x', symbols[0].settings['symbol'])
+        self.assertNotIn('symbol', self.gmap._process_kwargs({'color': 'r', 'edge_width': 2}))
+
+    def test_objects_refer_to_one_style_table(self):
+        for offset in range(3):
+            self.gmap.plot([offset, offset + 1], [0, 1], 'plum', edge_width=2)
+            self.gmap.polygon([offset, offset + 1, offset], [0, 1, 1], 'plum', edge_width=2)
+            self.gmap.circle(offset, 0, 100, 'plum', edge_width=2)
+        html = self.gmap.render()
+        self.assertEqual(3, html.count('new google.maps.Polyline(gmplotOptions(gmplotStyles[0], {'))
+        self.assertEqual(3, html.count('var symbolStyle = gmplotStyles[1];'))
+        self.assertEqual(3, html.count('new google.maps.Polygon(gmplotOptions(gmplotStyles[2], {'))
+        table = re.search(r'var gmplotStyles = (\[.*\]);', html).group(1)
+        self.assertEqual(1, html.count('var gmplotStyles = '))
+        self.assertEqual(3, table.count('"strokeColor": "#DDA0DD"'))
+        self.assertEqual(1, html.count('function gmplotOptions('))
+
+    def test_maps_without_styled_objects_have_no_table(self):
+        self.gmap.scatter([37.4], [-122.1], 'r')
+        html = self.gmap.render()
+        self.assertNotIn('gmplotStyles', html)
+        self.assertNotIn('gmplotOptions', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.projection import world_coordinates
+from gmplot.tiles import tile_pixels, write_tiles
+from tests.test_raster import decode_png
+
+
+class TestTiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def tiles(self, written):
+        return sorted(os.path.relpath(path, self.tmpdir).replace(os.sep, '/') for path in written)
+
+    def test_pixels_are_keyed_by_tile(self):
+        x, y = np.array([0.1, 0.1, 0.9, 0.6]), np.array([0.2, 0.2, 0.9, 0.1])
+        keys, values = tile_pixels(x, y, np.array([1.0, 2.0, 0.0, 4.0]), 1)
+        # The point of zero weight is left out.
+        self.assertEqual([0, 1], (keys >> 16).tolist())
+        self.assertEqual([3, 4], values.tolist())
+        self.assertEqual([(102 << 8) | 51, (51 << 8) | 51], (keys & 0xFFFF).tolist())
+
+    def test_only_tiles_with_data_are_written(self):
+        written = write_tiles(self.tmpdir, [37.7, -33.9], [-122.4, 151.2], zooms=[0, 1, 2], workers=1)
+        self.assertEqual(['0/0/0.png', '1/0/0.png', '1/1/1.png', '2/0/1.png', '2/3/2.png'], self.tiles(written))
+
+    def test_tile_pixels_hold_the_points(self):
+        write_tiles(self.tmpdir, [37.7, 37.7, 37.71], [-122.4, -122.4, -122.39], zooms=[10], workers=1,
+                    colormap=['#000000', '#ffffff'], scale='linear', opacity=1)
+        x, y = world_coordinates([37.7], [-122.4])
+        column, row = int(x[0] * 256 * 2 ** 10), int(y[0] * 256 * 2 ** 10)
+        path = os.path.join(self.tmpdir, '10', str(column // 256), '%d.png' % (row // 256))
+        with open(path, 'rb') as f:
+            rgba = decode_png(f.read())
+        self.assertEqual([255, 255, 255, 255], rgba[row % 256, column % 256].tolist())
+        self.assertEqual(2, np.count_nonzero(rgba[..., 3]))
+
+    def test_paths_cross_tiles(self):
+        written = write_tiles(self.tmpdir, paths=[([10.0, 10.0], [-170.0, 170.0])], zooms=[2], workers=1)
+        self.assertEqual(['2/%d/1.png' % x for x in range(4)], self.tiles(written))
+
+    def test_worker_processes_write_the_same_tiles(self):
+        rng = np.random.RandomState(0)
+        lats, lngs = rng.uniform(-60, 60, 2000), rng.uniform(-180, 180, 2000)
+        serial = write_tiles(os.path.join(self.tmpdir, 'serial'), lats, lngs, zooms=[3], workers=1)
+        pooled = write_tiles(os.path.join(self.tmpdir, 'pooled'), lats, lngs, zooms=[3], workers=2)
+        self.assertEqual([os.path.relpath(path, os.path.join(self.tmpdir, 'serial')) for path in serial],
+                         [os.path.relpath(path, os.path.join(self.tmpdir, 'pooled')) for path in pooled])
+        for a, b in zip(serial, pooled):
+            with open(a, 'rb') as f, open(b, 'rb') as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_arguments_are_validated(self):
+        with self.assertRaises(ValueError):
+            write_tiles(self.tmpdir, [0], [0], zooms=[23])
+        with self.assertRaises(ValueError):
+            write_tiles(self.tmpdir, [0], [0], scale='cubic')
+
+    def test_tiles_are_drawn_as_an_image_map_type(self):
+        gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        tiles = os.path.join(self.tmpdir, 'tiles')
+        written = gmap.tile_overlay(tiles, [37.4, 37.5], [-122.1, -122.2], zooms=range(4, 7), workers=1)
+        self.assertEqual(3, len(written))
+        html = gmap.render()
+        self.assertIn('map.overlayMapTypes.push(new google.maps.ImageMapType({', html)
+        self.assertIn('if (zoom < 4 || zoom > 6 ||', html)
+        self.assertIn('"%s/{z}/{x}/{y}.png"' % tiles.replace(os.sep, '/'), html)
+
+
+if __name__ == '__main__':
+    unittest.main()
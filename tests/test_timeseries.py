@@ -0,0 +1,118 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gmplot
+from gmplot.timeseries import parse_freq, slices, time_bins
+
+
+def ms(date):
+    return int(np.datetime64(date, 'ms').astype(np.int64))
+
+
+class TestTimeBins(unittest.TestCase):
+
+    def test_bins_are_aligned_on_the_calendar(self):
+        times = ['2021-03-31T23:59', '2021-01-02', '2021-02-15', '2021-01-31']
+        starts, inverse = time_bins(times, 'M')
+        self.assertEqual([ms('2021-01'), ms('2021-02'), ms('2021-03')], starts.tolist())
+        self.assertEqual([2, 0, 1, 0], inverse.tolist())
+        starts, _ = time_bins(times, '2M')
+        self.assertEqual([ms('2021-01'), ms('2021-03')], starts.tolist())
+
+    def test_weeks_start_on_mondays(self):
+        # 2021-01-04 was a Monday.
+        starts, inverse = time_bins(['2021-01-03', '2021-01-04', '2021-01-10T23:00'], 'W')
+        self.assertEqual([ms('2020-12-28'), ms('2021-01-04')], starts.tolist())
+        self.assertEqual([0, 1, 1], inverse.tolist())
+
+    def test_numbers_are_seconds(self):
+        starts, _ = time_bins([3600 * 7.5, 3600 * 13], '6h')
+        self.assertEqual([6 * 3600000, 12 * 3600000], starts.tolist())
+
+    def test_slices_group_indices_in_time_order(self):
+        groups = slices(['2021-02-01', '2021-01-01', '2021-02-03', '2021-01-05'], 'M')
+        self.assertEqual([ms('2021-01'), ms('2021-02')], [start for start, _ in groups])
+        self.assertEqual([[1, 3], [0, 2]], [indices.tolist() for _, indices in groups])
+
+    def test_frequency_is_validated(self):
+        self.assertEqual((15, 'm'), parse_freq('15m'))
+        for freq in ('', 'Q', '2MM', 'month'):
+            with self.assertRaises(ValueError):
+                parse_freq(freq)
+
+
+class TestHeatmapTimeseries(unittest.TestCase):
+
+    def setUp(self):
+        self.gmap = gmplot.GoogleMapPlotter(37.428, -122.145, 10)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_points_are_stored_per_slice(self):
+        times = np.datetime64('2021-01-01') + np.arange(10) * np.timedelta64(1, 'D')
+        self.gmap.heatmap_timeseries(np.arange(10), np.arange(10), 2, times, freq='W', radius=20)
+        slices = self.gmap.heatmap_slices
+        # 2021-01-01 was a Friday.
+        self.assertEqual([ms('2020-12-28'), ms('2021-01-04')], [layer.settings['time'] for layer in slices.layers])
+        self.assertEqual([0, 3, 10], [layer.start for layer in slices.layers] + [slices.size])
+        self.assertEqual([3, 4, 5, 6, 7, 8, 9], slices.column('lat', slices.layers[1]).tolist())
+        self.assertEqual(20, slices.layers[0].settings['radius'])
+
+    def test_slices_can_be_aggregated(self):
+        lats = np.repeat([37.4, 37.5], 100)
+        times = np.tile(['2021-01-01', '2021-06-01'], 100)
+        self.gmap.heatmap_timeseries(lats, lats - 160, 0.5, times, aggregate=True)
+        self.assertEqual(4, self.gmap.heatmap_slices.size)
+        self.assertEqual([25] * 4, self.gmap.heatmap_slices.column('weight').tolist())
+
+    def test_timeline_is_drawn_by_the_runtime(self):
+        self.gmap.heatmap([37.4], [-122.1], 1)
+        self.gmap.heatmap_timeseries([37.4, 37.5], [-122.1, -122.2], [1, 2], [0, 86400 * 40])
+        for compact in (False, True):
+            html = self.gmap.render(compact=compact)
+            self.assertIn('function gmplotTimeline(', html)
+            self.assertIn('"layers": [[1,0,0],[1,0,%d]]' % ms('1970-02'), html)
+            self.assertIn('"dateLength": 7', html)
+            self.assertIn('<input id="timeline-date-selector"', html)
+        path = os.path.join(self.tmpdir, 'map.html')
+        written = self.gmap.draw(path, external=True)
+        with open(written[1]) as f:
+            self.assertIn('var gmplotTimelineData = ', f.read())
+        with open(path) as f:
+            self.assertNotIn('var gmplotTimelineData = ', f.read())
+
+    def test_timeline_dictionary_is_drawn(self):
+        self.gmap.heatmap_points = {
+            str(ms('2021-01-02')): [{'Latitude': 37.4, 'Longitude': -122.1, 'weight': 2}],
+            str(ms('2020-12-25')): [{'Latitude': 37.5, 'Longitude': -122.2, 'weight': 1}],
+        }
+        html = self.gmap.render()
+        self.assertIn('"layers": [[1,0,%d],[1,0,%d]]' % (ms('2020-12-25'), ms('2021-01-02')), html)
+        self.assertIn('label="2020"', html)
+
+    def test_empty_timeline_dictionary(self):
+        self.gmap.heatmap_points = {}
+        for compact in (False, True):
+            html = self.gmap.render(compact=compact)
+            self.assertNotIn('gmplotTimeline(map, gmplotTimelineData)', html)
+            self.assertNotIn('timeline-date-selector"', html)
+        f = io.StringIO()
+        self.gmap.write_timeline_data(f)
+        self.assertIn('"slices": {"layers": []', f.getvalue())
+
+    def test_maps_without_timeline_have_no_timeline_code(self):
+        self.gmap.heatmap([37.4], [-122.1], 1)
+        html = self.gmap.render()
+        self.assertNotIn('timeline', html.lower())
+        self.assertNotIn('function gmplotTimeline(', html)
+
+
+if __name__ == '__main__':
+    unittest.main()